@@ -0,0 +1,173 @@
+# admin.py
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from app.models import LoopLag, TaskDump
+
+# Longest profile a single request may take
+MAX_PROFILE_SECONDS = 60.0
+
+LAG_INTERVAL = float(os.getenv("BROWSERSTATION_LAG_INTERVAL", "0.5"))
+LAG_WINDOW = 600  # samples kept for percentiles
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _cpu_ns(native_id: int) -> Optional[int]:
+    """Nanoseconds a thread has spent on CPU, None where /proc isn't available"""
+    try:
+        with open(f"/proc/self/task/{native_id}/schedstat") as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def sample(seconds: float, interval: float = 0.005, mode: str = "wall") -> str:
+    """
+    Sampling profile of every thread in the process.
+
+    Runs in the calling thread, which is left out of the samples, so call it
+    off the event loop. Only reads interpreter frames; nothing is patched.
+
+    Args:
+        seconds: How long to sample
+        interval: Seconds between samples
+        mode: "wall" counts every sample, "cpu" only samples of threads that
+            ran on CPU since the previous one
+
+    Returns:
+        str: Folded stacks ("thread;outer;...;inner count" lines), as read by
+            flamegraph.pl, speedscope and inferno
+    """
+    me = threading.get_ident()
+    counts = Counter()
+    cpu = {}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        threads = {t.ident: t for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            thread = threads.get(ident)
+            name = thread.name if thread else str(ident)
+            if mode == "cpu" and thread is not None and thread.native_id is not None:
+                used = _cpu_ns(thread.native_id)
+                previous, cpu[ident] = cpu.get(ident), used
+                if used is not None and (previous is None or used == previous):
+                    continue
+            counts[f"{name};{_stack(frame)}"] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class Relay:
+    """Counters for one proxied CDP connection"""
+
+    def __init__(self, browser_id: str, path: str, chrome_ws, node_id: Optional[str] = None):
+        self.browser_id = browser_id
+        self.path = path
+        self.chrome_ws = chrome_ws
+        self.node_id = node_id
+        self.started_at = time.time()
+        self.to_chrome = 0        # messages
+        self.to_client = 0
+        self.bytes_to_chrome = 0
+        self.bytes_to_client = 0
+        self.in_flight = 0        # messages received on one side, not yet sent on the other
+        self.cache = None         # RelayCache, when the CDP cache is on
+
+    def info(self) -> dict:
+        transport = getattr(self.chrome_ws, "transport", None)
+        return {
+            "browser_id": self.browser_id,
+            "path": self.path,
+            "age": round(time.time() - self.started_at, 3),
+            "to_chrome": self.to_chrome,
+            "to_client": self.to_client,
+            "bytes_to_chrome": self.bytes_to_chrome,
+            "bytes_to_client": self.bytes_to_client,
+            "in_flight": self.in_flight,
+            "chrome_write_buffer": transport.get_write_buffer_size() if transport is not None else None,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+
+relays: Dict[int, Relay] = {}
+
+
+@contextmanager
+def track_relay(browser_id: str, path: str, chrome_ws, node_id: Optional[str] = None):
+    relay = Relay(browser_id, path, chrome_ws, node_id)
+    relays[id(relay)] = relay
+    try:
+        yield relay
+    finally:
+        relays.pop(id(relay), None)
+
+
+def dump_tasks() -> TaskDump:
+    """Every task on the running loop with where it is suspended, and the open relays"""
+    tasks = []
+    for task in asyncio.all_tasks():
+        stack = task.get_stack(limit=1)
+        coro = task.get_coro()
+        tasks.append({
+            "name": task.get_name(),
+            "coro": getattr(coro, "__qualname__", repr(coro)),
+            "done": task.done(),
+            "at": f"{_frame_label(stack[-1])} line {stack[-1].f_lineno}" if stack else None,
+        })
+    tasks.sort(key=lambda t: t["coro"])
+    return TaskDump(tasks=tasks, relays=[relay.info() for relay in relays.values()])
+
+
+class LagMonitor:
+    """Measures how late the event loop wakes a sleeping task"""
+
+    def __init__(self, interval: float = LAG_INTERVAL, window: int = LAG_WINDOW):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def stats(self) -> LoopLag:
+        ordered = sorted(self.samples)
+        n = len(ordered)
+
+        def percentile(p):
+            return ordered[min(n - 1, int(p * n))] if n else 0.0
+
+        return LoopLag(
+            interval=self.interval,
+            samples=n,
+            last=self.samples[-1] if n else 0.0,
+            mean=sum(ordered) / n if n else 0.0,
+            p50=percentile(0.5),
+            p99=percentile(0.99),
+            max=ordered[-1] if n else 0.0,
+        )
+
+
+lag_monitor = LagMonitor()
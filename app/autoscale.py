@@ -0,0 +1,75 @@
+# autoscale.py
+import os
+import asyncio
+import logging
+from collections import Counter
+
+import ray
+
+from app.models import Demand
+
+logger = logging.getLogger(__name__)
+
+# Custom resource each BrowserActor holds; worker nodes advertise one unit per
+# browser they can host, so the autoscaler sizes the cluster in browsers
+BROWSER_RESOURCE = "browser"
+
+# Free browser slots to keep ahead of demand, 0 leaves scaling to pending actors
+HEADROOM = int(os.getenv("BROWSERSTATION_HEADROOM", "0"))
+INTERVAL = float(os.getenv("BROWSERSTATION_AUTOSCALE_INTERVAL", "10"))
+
+# list_actors returns 100 entries unless told otherwise
+MAX_ACTORS = 10_000
+
+
+def plan(live: int, pending: int, headroom: int) -> int:
+    """Browser slots the cluster should be able to hold"""
+    return live + pending + headroom
+
+
+def demand(headroom: int = HEADROOM) -> Demand:
+    """
+    Current demand for browser slots.
+
+    Args:
+        headroom: Free slots to keep for bursts
+    """
+    # Imported on first use, the state API adds a noticeable share of the API's cold start
+    from ray.util.state import list_actors
+
+    alive = list_actors(filters=[("class_name", "=", "BrowserActor"), ("state", "=", "ALIVE")], limit=MAX_ACTORS)
+    pending = list_actors(filters=[("class_name", "=", "BrowserActor"), ("state", "=", "PENDING_CREATION")], limit=MAX_ACTORS)
+    capacity = int(ray.cluster_resources().get(BROWSER_RESOURCE, 0))
+    available = int(ray.available_resources().get(BROWSER_RESOURCE, 0))
+    target = plan(len(alive), len(pending), headroom)
+
+    return Demand(
+        live=len(alive),
+        pending=len(pending),
+        capacity=capacity,
+        available=available,
+        headroom=headroom,
+        deficit=max(0, target - capacity),
+        target=target,
+        sessions_per_node=dict(Counter(actor.node_id for actor in alive)),
+    )
+
+
+async def autoscale_loop(headroom: int = HEADROOM, interval: float = INTERVAL):
+    """
+    Keep the Ray autoscaler's resource request at the planned target.
+
+    request_resources sets a standing floor on cluster size that accounts for
+    resources already in use, so each call replaces the previous one. Scale-down
+    is left to the autoscaler: it only removes idle nodes, and a node holding a
+    BrowserActor's `browser` resource is never idle.
+    """
+    from ray.autoscaler.sdk import request_resources
+
+    while True:
+        try:
+            current = await asyncio.to_thread(demand, headroom)
+            request_resources(bundles=[{BROWSER_RESOURCE: 1}] * current.target)
+        except Exception as e:
+            logger.warning(f"Autoscale update failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,200 @@
+# cache.py
+import os
+import re
+import time
+import struct
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("BROWSERSTATION_CACHE_DIR", "/var/cache/browserstation/http")
+CACHE_SIZE = int(os.getenv("BROWSERSTATION_CACHE_SIZE", str(2 * 1024 ** 3)))
+MAX_ENTRY_SIZE = int(os.getenv("BROWSERSTATION_CACHE_MAX_ENTRY", str(10 * 1024 ** 2)))
+MAX_AGE = int(os.getenv("BROWSERSTATION_CACHE_MAX_AGE", str(24 * 3600)))
+
+SWEEP_INTERVAL = 60.0
+
+_MAX_AGE = re.compile(r"(?<![-\w])max-age=(\d+)")
+_S_MAXAGE = re.compile(r"s-maxage=(\d+)")
+
+# Request headers that make a request personal: responses to it may only be
+# shared when they are marked public
+CREDENTIAL_HEADERS = {"authorization", "cookie"}
+
+# Vary on these keeps a response out of the cache. Cookies are added by the
+# network stack after Fetch sees the request, so they can't be part of a key.
+_UNCACHEABLE_VARY = {"*", "cookie", "authorization"}
+
+# Bodies are stored decoded and served without Content-Encoding, so the
+# encoding a request accepted doesn't select a variant
+_IGNORED_VARY = {"accept-encoding"}
+
+# Headers that describe the wire encoding, which no longer applies to the
+# decoded body Chrome hands back from Fetch.getResponseBody
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+
+
+def _values(headers: List[dict]) -> Dict[str, str]:
+    return {h["name"].lower(): h["value"] for h in headers}
+
+
+def vary(headers: List[dict]) -> List[str]:
+    """Request headers, lowercased and sorted, that select among variants of a response"""
+    names = {name.strip().lower() for name in _values(headers).get("vary", "").split(",") if name.strip()}
+    return sorted(names - _IGNORED_VARY)
+
+
+def public(headers: List[dict]) -> bool:
+    return "public" in _values(headers).get("cache-control", "").lower()
+
+
+def freshness(headers: List[dict], credentialed: bool = False) -> int:
+    """
+    Seconds a response may be served from the shared cache, 0 if it must not be.
+
+    Follows the rules for shared caches: responses to requests with
+    credentials are only stored when marked public, s-maxage wins over
+    max-age, and responses varying on cookies or credentials are not stored.
+
+    Args:
+        headers: CDP header entries [{"name", "value"}]
+        credentialed: Whether the request carried, or would carry, Authorization or cookies
+    """
+    values = _values(headers)
+    if "set-cookie" in values or _UNCACHEABLE_VARY.intersection(vary(headers)):
+        return 0
+    cache_control = values.get("cache-control", "").lower()
+    if any(d in cache_control for d in ("no-store", "no-cache", "private")):
+        return 0
+    if credentialed and "public" not in cache_control:
+        return 0
+    m = _S_MAXAGE.search(cache_control) or _MAX_AGE.search(cache_control)
+    return min(int(m.group(1)), MAX_AGE) if m else 0
+
+
+def variant_key(url: str, names: List[str], request_headers: Dict[str, str]) -> str:
+    """Cache key of the variant of `url` selected by the request's values of the Vary'd headers"""
+    if not names:
+        return url
+    values = {name.lower(): value for name, value in request_headers.items()}
+    return url + "".join(f"\n{name}: {values.get(name, '')}" for name in names)
+
+
+class NodeCache:
+    """
+    HTTP response cache on a directory shared by every browser on the node.
+
+    Entries are single files named by the key hash: a length-prefixed JSON
+    header followed by the body. Writes go through a temp file and rename, so
+    concurrent readers in other actors never see partial entries.
+
+    The key is the URL, plus the request's values of the headers the
+    response varies on. For those responses the URL's own file holds just
+    the list of Vary'd headers, which a lookup reads first to build the key.
+    """
+
+    def __init__(self, path: str = CACHE_DIR, max_size: int = CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._last_sweep = 0.0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(key.encode()).hexdigest())
+
+    def _read(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        path = self._file(key)
+        with open(path, "rb") as f:
+            (size,) = struct.unpack(">I", f.read(4))
+            meta = orjson.loads(f.read(size))
+            if meta["key"] != key:
+                return None
+            if meta["expires"] < time.time():
+                os.unlink(path)
+                return None
+            body = f.read()
+        os.utime(path)  # mtime doubles as last use for the sweep
+        return meta, body
+
+    def _write(self, key: str, meta: dict, body: bytes = b"") -> bool:
+        data = orjson.dumps({"key": key, **meta})
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(struct.pack(">I", len(data)) + data + body)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Cache write for {meta.get('url', key)} failed: {e}")
+            return False
+        return True
+
+    def get(self, url: str, request_headers: Dict[str, str], credentialed: bool = False) -> Optional[Tuple[int, List[dict], bytes]]:
+        """
+        Return (status, headers, body) for a fresh entry, None otherwise.
+
+        Args:
+            url: Request URL
+            request_headers: Request headers, to select the variant
+            credentialed: Only serve responses that were marked public
+        """
+        try:
+            entry = self._read(url)
+            if entry is not None and entry[0].get("vary"):
+                entry = self._read(variant_key(url, entry[0]["vary"], request_headers))
+            if entry is None:
+                return None
+            meta, body = entry
+            if credentialed and not meta.get("public"):
+                return None
+            return meta["status"], meta["headers"], body
+        except (OSError, ValueError, KeyError, struct.error):
+            return None
+
+    def put(self, url: str, request_headers: Dict[str, str], status: int, headers: List[dict], body: bytes, max_age: int) -> bool:
+        """Store a response as the variant selected by the request, returns False if it wasn't stored"""
+        if len(body) > MAX_ENTRY_SIZE:
+            return False
+        expires = time.time() + max_age
+        names = vary(headers)
+        if names and not self._write(url, {"url": url, "vary": names, "expires": expires}):
+            return False
+        meta = {
+            "url": url,
+            "status": status,
+            "headers": [h for h in headers if h["name"].lower() not in _DROP_HEADERS],
+            "public": public(headers),
+            "expires": expires,
+        }
+        if not self._write(variant_key(url, names, request_headers), meta, body):
+            return False
+
+        if time.time() - self._last_sweep > SWEEP_INTERVAL:
+            self.sweep()
+        return True
+
+    def sweep(self):
+        """Evict least recently used entries until the directory is under 90% of max_size"""
+        self._last_sweep = time.time()
+        entries = []
+        for entry in os.scandir(self.path):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size * 0.9:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,269 @@
+# cdp.py
+import re
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# Next character that can open/close a nested value or start a string
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+_KEY = re.compile(r'\s*"([^"\\]*(?:\\.[^"\\]*)*)"\s*:\s*')
+_SCALAR_END = re.compile(r'\s*[,}\]]')
+_SPACE = re.compile(r'\s*')
+
+
+class Envelope:
+    """
+    Top-level fields of a CDP message.
+
+    `id`, `method` and `session_id` are decoded eagerly. `params`, `result` and
+    `error` are only located, and decoded on first access, so inspecting a
+    multi-megabyte screenshot response costs about one `str.find` over its data.
+    """
+
+    __slots__ = ("message", "id", "method", "session_id", "_spans", "_decoded")
+
+    def __init__(self, message: str, spans: Dict[str, Tuple[int, int]]):
+        self.message = message
+        self._spans = spans
+        self._decoded = {}
+        self.id = self._load("id")
+        self.method = self._load("method")
+        self.session_id = self._load("sessionId")
+
+    @property
+    def is_response(self) -> bool:
+        return self.id is not None and self.method is None
+
+    @property
+    def params(self):
+        return self._load("params")
+
+    @property
+    def result(self):
+        return self._load("result")
+
+    @property
+    def error(self):
+        return self._load("error")
+
+    def raw(self, key: str) -> Optional[str]:
+        """Undecoded JSON text of a top-level field"""
+        span = self._spans.get(key)
+        return self.message[span[0]:span[1]] if span else None
+
+    def _load(self, key: str):
+        if key not in self._decoded:
+            raw = self.raw(key)
+            self._decoded[key] = orjson.loads(raw) if raw is not None else None
+        return self._decoded[key]
+
+
+def parse_envelope(message) -> Optional[Envelope]:
+    """
+    Locate the top-level fields of a CDP message without decoding its bodies.
+
+    Args:
+        message: Text (or UTF-8 bytes) of a single CDP frame
+
+    Returns:
+        Envelope, or None if the frame is not a JSON object
+    """
+    if isinstance(message, (bytes, bytearray)):
+        message = message.decode()
+    try:
+        return Envelope(message, _top_level_spans(message))
+    except (ValueError, IndexError):
+        return None
+
+
+def encode(message: dict) -> str:
+    """Serialize a CDP message for a text frame"""
+    return orjson.dumps(message).decode()
+
+
+def _top_level_spans(s: str) -> Dict[str, Tuple[int, int]]:
+    i = _SPACE.match(s).end()
+    if s[i] != "{":
+        raise ValueError("not a JSON object")
+    i += 1
+    spans = {}
+    if s[_SPACE.match(s, i).end()] == "}":
+        return spans
+    while True:
+        m = _KEY.match(s, i)
+        if m is None:
+            raise ValueError(f"expected key at {i}")
+        start = m.end()
+        end = _skip_value(s, start)
+        spans[m.group(1)] = (start, end)
+        i = _SPACE.match(s, end).end()
+        if s[i] == ",":
+            i += 1
+        elif s[i] == "}":
+            return spans
+        else:
+            raise ValueError(f"unexpected {s[i]!r} at {i}")
+
+
+def _skip_value(s: str, i: int) -> int:
+    """Index just past the JSON value starting at `i`"""
+    c = s[i]
+    if c == '"':
+        return _skip_string(s, i)
+    if c in "{[":
+        depth = 0
+        while True:
+            m = _STRUCTURAL.search(s, i)
+            if m is None:
+                raise ValueError("unterminated value")
+            i = m.start()
+            c = s[i]
+            if c == '"':
+                i = _skip_string(s, i)
+                continue
+            depth += 1 if c in "{[" else -1
+            i += 1
+            if depth == 0:
+                return i
+    m = _SCALAR_END.search(s, i)
+    if m is None:
+        raise ValueError("unterminated scalar")
+    return m.start()
+
+
+def _skip_string(s: str, i: int) -> int:
+    """Index just past the string whose opening quote is at `i`"""
+    j = i + 1
+    while True:
+        j = s.find('"', j)
+        if j < 0:
+            raise ValueError("unterminated string")
+        # A quote preceded by an odd number of backslashes is escaped
+        k = j - 1
+        while s[k] == "\\":
+            k -= 1
+        if (j - 1 - k) % 2 == 0:
+            return j + 1
+        j += 1
+
+
+class CDPError(Exception):
+    """Error response to a CDP command"""
+
+    def __init__(self, error: dict):
+        super().__init__(f"{error.get('message')} ({error.get('code')})")
+        self.code = error.get("code")
+        self.message = error.get("message")
+
+
+class CDPSession:
+    """Minimal CDP client used by actors to drive the Chrome next to them"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self._next_id = 0
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._handlers: Dict[str, List[Callable[[dict, Optional[str]], Awaitable[None]]]] = {}
+        self._tasks = set()
+        self._reader = asyncio.create_task(self._read())
+
+    @classmethod
+    async def connect(cls, ws_url: str, timeout: float = 5.0) -> "CDPSession":
+        ws = await websockets.connect(ws_url, max_size=None, ping_interval=None, open_timeout=timeout)
+        return cls(ws)
+
+    @property
+    def closed(self) -> bool:
+        return self._reader.done()
+
+    async def send(self, method: str, params: Optional[dict] = None, session_id: Optional[str] = None, timeout: float = 30.0) -> dict:
+        """
+        Send a command and wait for its result.
+
+        Args:
+            method: CDP method, e.g. "Page.navigate"
+            params: Command parameters
+            session_id: Target session for flattened sessions, None for the browser target
+            timeout: Seconds to wait for the response
+
+        Raises:
+            CDPError: If Chrome answers with an error
+        """
+        self._next_id += 1
+        message_id = self._next_id
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        try:
+            await self.ws.send(encode(message))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(message_id, None)
+
+    def on(self, method: str, handler: Callable[[dict, Optional[str]], Awaitable[None]]):
+        """Run `handler(params, session_id)` as a task for every `method` event"""
+        self._handlers.setdefault(method, []).append(handler)
+
+    def off(self, method: str, handler: Callable[[dict, Optional[str]], Awaitable[None]]):
+        handlers = self._handlers.get(method, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def wait_for(self, method: str, session_id: Optional[str] = None) -> asyncio.Future:
+        """
+        Future for the next `method` event on `session_id`.
+
+        Register before sending the command that triggers the event, then await.
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        async def handler(params, event_session_id):
+            if event_session_id == session_id and not future.done():
+                future.set_result(params)
+
+        self.on(method, handler)
+        future.add_done_callback(lambda _: self.off(method, handler))
+        return future
+
+    async def close(self):
+        await self.ws.close()
+        await asyncio.gather(self._reader, return_exceptions=True)
+
+    async def _read(self):
+        try:
+            async for message in self.ws:
+                envelope = parse_envelope(message)
+                if envelope is None:
+                    continue
+                if envelope.id is not None:
+                    future = self._pending.get(envelope.id)
+                    if future is not None and not future.done():
+                        if envelope.error is not None:
+                            future.set_exception(CDPError(envelope.error))
+                        else:
+                            future.set_result(envelope.result or {})
+                    continue
+                for handler in self._handlers.get(envelope.method, ()):
+                    task = asyncio.create_task(self._dispatch(handler, envelope))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("CDP connection closed"))
+
+    async def _dispatch(self, handler, envelope: Envelope):
+        try:
+            await handler(envelope.params or {}, envelope.session_id)
+        except Exception as e:
+            logger.warning(f"CDP handler for {envelope.method} failed: {e}")
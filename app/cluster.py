@@ -0,0 +1,176 @@
+# cluster.py
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import ray
+
+from app.tenants import NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+# GCS the API drives, the head node's own unless set. Anything ray.init
+# takes: host:port, ray://host:port for Ray Client, or "auto"
+GCS_ADDRESS = os.getenv("BROWSERSTATION_GCS_ADDRESS", os.getenv("RAY_ADDRESS", "127.0.0.1:6379"))
+
+# How often a connected API checks that the GCS still answers
+CHECK_INTERVAL = float(os.getenv("BROWSERSTATION_RAY_CHECK_INTERVAL", "5"))
+
+# Seconds a GCS round trip may take before the GCS counts as down
+CHECK_TIMEOUT = 10.0
+
+# Ray's driver reconnects to a GCS that comes back with fault tolerance on its
+# own. When it hasn't this long after the GCS accepts connections again, the
+# driver is restarted.
+REINIT_AFTER = 30.0
+
+# Backoff between attempts while the GCS is down
+RETRY_MIN = 0.5
+RETRY_MAX = 10.0
+
+CONNECTING = "connecting"
+CONNECTED = "connected"
+DISCONNECTED = "disconnected"
+
+
+def _describe(e: Exception) -> str:
+    return f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+
+def _endpoint(address: str) -> Optional[Tuple[str, int]]:
+    """Host and port an address connects to, None for ones Ray resolves itself, like "auto" """
+    if address.startswith("ray://"):
+        address = address[len("ray://"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        return None
+    return host.strip("[]"), int(port)
+
+
+class RayConnection:
+    """
+    The API process's Ray driver, connected in the background.
+
+    The API starts serving, health checks included, before Ray is up. Until
+    the GCS accepts connections and answers, and again whenever it stops
+    answering, `connected` is False and routes that need Ray return 503.
+    Callbacks registered with `on_connect` run on every (re)connect, to
+    rebuild the process's state from the detached actors.
+
+    A GCS gone for longer than Ray's gcs_rpc_server_reconnect_timeout_s (60s
+    by default) ends the process; app.shard restarts it, and it waits here.
+    """
+
+    def __init__(self, address: str = GCS_ADDRESS, namespace: str = NAMESPACE):
+        self.address = address
+        self.namespace = namespace
+        self.state = CONNECTING
+        self.error: Optional[str] = None
+        self.since = time.time()
+        self.connects = 0
+        self._connected = asyncio.Event()
+        self._callbacks: List[Callable[[], Awaitable[None]]] = []
+
+    @property
+    def connected(self) -> bool:
+        return self.state == CONNECTED
+
+    def status(self) -> str:
+        detail = f"{self.state} for {time.time() - self.since:.0f}s"
+        return f"{detail}: {self.error}" if self.error and not self.connected else detail
+
+    def on_connect(self, callback: Callable[[], Awaitable[None]]):
+        self._callbacks.append(callback)
+
+    async def wait(self):
+        await self._connected.wait()
+
+    def _set(self, state: str, error: Optional[str] = None):
+        if state != self.state:
+            self.since = time.time()
+            log = logger.info if state == CONNECTED else logger.warning
+            log(f"Ray {state}" + (f": {error}" if error else ""))
+        self.state = state
+        self.error = error
+        if state == CONNECTED:
+            self._connected.set()
+        else:
+            self._connected.clear()
+
+    async def _listening(self) -> bool:
+        """Whether the GCS port accepts connections; left to ray.init and the round trip when there is no port"""
+        target = _endpoint(self.address)
+        if target is None:
+            return True
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(*target), 2)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    async def _check(self):
+        """A round trip to the GCS, raising when it doesn't answer in time"""
+        await asyncio.wait_for(asyncio.to_thread(ray.cluster_resources), CHECK_TIMEOUT)
+
+    async def _connect(self):
+        """Wait for the GCS to accept connections, then start the driver"""
+        delay = RETRY_MIN
+        while True:
+            if await self._listening():
+                try:
+                    if not ray.is_initialized():
+                        # In a thread: the event loop keeps serving, and Ray
+                        # leaves uvicorn's signal handlers alone off the main thread
+                        await asyncio.to_thread(ray.init, address=self.address, namespace=self.namespace)
+                    await self._check()
+                    return
+                except Exception as e:
+                    self.error = _describe(e)
+            else:
+                self.error = f"GCS at {self.address} not accepting connections"
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX)
+
+    async def _connected_again(self):
+        self.connects += 1
+        self._set(CONNECTED)
+        for callback in self._callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.warning(f"Restoring state after connecting to Ray failed: {e}")
+
+    async def _watch(self):
+        """Check the GCS until it is lost for good"""
+        lost_at = None
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            try:
+                if not await self._listening():
+                    raise ConnectionRefusedError("not accepting connections")
+                await self._check()
+            except Exception as e:
+                if lost_at is None:
+                    lost_at = time.time()
+                    self._set(DISCONNECTED, f"GCS at {self.address} lost: {_describe(e)}")
+                if time.time() - lost_at >= REINIT_AFTER and await self._listening():
+                    return
+                continue
+            if lost_at is not None:
+                lost_at = None
+                await self._connected_again()
+
+    async def run(self):
+        while True:
+            await self._connect()
+            await self._connected_again()
+            await self._watch()
+            logger.warning("Ray driver did not recover, reconnecting")
+            try:
+                await asyncio.wait_for(asyncio.to_thread(ray.shutdown), CHECK_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Ray shutdown failed: {e}")
+            self._set(CONNECTING, self.error)
@@ -0,0 +1,283 @@
+# context.py
+import re
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+import orjson
+
+from app.cdp import CDPSession, Envelope, parse_envelope, encode
+
+logger = logging.getLogger(__name__)
+
+# Browser-level commands that act on the default context when they name none
+CONTEXT_METHODS = {
+    "Target.createTarget",
+    "Storage.getCookies",
+    "Storage.setCookies",
+    "Storage.clearCookies",
+    "Browser.grantPermissions",
+    "Browser.resetPermissions",
+    "Browser.setPermission",
+    "Browser.setDownloadBehavior",
+}
+
+# Commands that would reach past the session's contexts whatever their params
+BLOCKED_METHODS = {
+    "Target.attachToBrowserTarget",
+    "Browser.close",
+    "Browser.crash",
+    "Browser.crashGpuProcess",
+}
+
+# Commands whose results list other sessions' targets and contexts too
+FILTERED_RESULTS = {"Target.getTargets", "Target.getBrowserContexts"}
+
+# Commands whose results the scope records
+RECORDED_RESULTS = FILTERED_RESULTS | {"Target.createBrowserContext", "Target.createTarget", "Target.attachToTarget"}
+
+# Cheap pre-checks, so most relayed frames are never parsed
+_SCOPED = re.compile(r'"(?:Target|Storage|Browser)\.')
+_TARGET_EVENT = re.compile(r'"method"\s*:\s*"Target\.')
+
+# Ids of the proxy's own commands, negative so they never clash with the client's
+_OWN_IDS_START = -1
+
+
+class SessionContext:
+    """
+    The browser contexts a session's pages live in.
+
+    Every session on a pod shares its Chrome, so each one gets a context of
+    its own: cookies and storage are kept apart, and interception, extraction
+    and snapshots only touch pages in it. The actor creates the context on
+    its CDP connection with disposeOnDetach, so Chrome closes it, and its
+    pages, when the actor goes away. Contexts the client creates through the
+    proxy are adopted and count as the session's too.
+    """
+
+    def __init__(self, cdp: CDPSession):
+        self.cdp = cdp
+        self.id: Optional[str] = None  # created by the actor, where unscoped client commands go
+        self.ids: Set[str] = set()
+
+    async def create(self):
+        self.id = (await self.cdp.send("Target.createBrowserContext", {"disposeOnDetach": True}))["browserContextId"]
+        self.ids.add(self.id)
+        # Clients that take the existing page, like Playwright's contexts[0].pages, find it here
+        await self.cdp.send("Target.createTarget", {"url": "about:blank", "browserContextId": self.id})
+
+    def adopt(self, context_id: str):
+        self.ids.add(context_id)
+
+    def owns(self, target: dict) -> bool:
+        return target.get("browserContextId") in self.ids
+
+    async def targets(self) -> List[dict]:
+        """The session's targets, of every type"""
+        targets = (await self.cdp.send("Target.getTargets"))["targetInfos"]
+        return [t for t in targets if self.owns(t)]
+
+    async def dispose(self):
+        """Close every context of the session, and with them all of its pages"""
+        for context_id in list(self.ids):
+            try:
+                await self.cdp.send("Target.disposeBrowserContext", {"browserContextId": context_id}, timeout=5)
+            except Exception as e:
+                logger.warning(f"Disposing browser context {context_id} failed: {e}")
+        self.ids.clear()
+
+
+class RelayScope:
+    """
+    Keeps what a proxied client does inside its session's browser contexts.
+
+    Sessions on a pod share its Chrome, and a browser-level connection can
+    see and drive every target in it. The scope keeps track of the
+    contexts, targets and CDP sessions this client owns, and:
+
+    - points browser-level commands that would act on the shared default
+      context, like creating a page or setting cookies, at the session's
+      context;
+    - refuses commands naming a target, session or context it doesn't own;
+    - drops other sessions' targets and contexts from target lists and
+      Target events;
+    - resumes and detaches from other sessions' pages that auto-attach
+      attached it to, so they never wait on this client.
+
+    Contexts and pages the client creates are reported to the actor before
+    the client hears about them, so interception is in place before the
+    client can navigate.
+    """
+
+    def __init__(self, actor, context_id: str, intercepting: bool = False, chrome=None, target_id: Optional[str] = None):
+        """
+        Initialize scope.
+
+        Args:
+            actor: The session's BrowserActor
+            context_id: The session's browser context
+            intercepting: Whether the session intercepts requests, so new pages must be watched
+            chrome: Connection to Chrome, for the proxy's own commands
+            target_id: Page the connection is to, for page-level connections
+        """
+        self.actor = actor
+        self.intercepting = intercepting
+        self.chrome = chrome
+        self.context_id = context_id
+        self.contexts: Set[str] = {context_id}
+        self.targets: Set[str] = {target_id} if target_id else set()
+        self.sessions: Set[str] = set()
+        self.foreign: Set[str] = set()  # other sessions' CDP sessions being detached from
+        self.pending: Dict[Tuple[Optional[str], int], str] = {}  # (session, command id) -> method, for results to record
+        self.own_id = _OWN_IDS_START
+
+    def request(self, message: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        A client command, scoped to the session's contexts.
+
+        Returns:
+            tuple: (message to forward to Chrome, or None; error response for the client, or None)
+        """
+        if _SCOPED.search(message) is None:
+            return message, None
+        envelope = parse_envelope(message)
+        if envelope is None or envelope.method is None or envelope.id is None:
+            return message, None
+        method = envelope.method
+        params = envelope.params or {}
+        if method in BLOCKED_METHODS:
+            return None, _error(envelope, f"{method} is not allowed through the proxy")
+        if params.get("targetId") is not None and params["targetId"] not in self.targets:
+            return None, _error(envelope, "No target with given id found")
+        if params.get("sessionId") is not None and params["sessionId"] not in self.sessions:
+            return None, _error(envelope, "No session with given id found")
+        if params.get("browserContextId") is not None and params["browserContextId"] not in self.contexts:
+            return None, _error(envelope, "Failed to find context with id " + str(params["browserContextId"]))
+
+        if method in RECORDED_RESULTS:
+            self.pending[envelope.session_id, envelope.id] = method
+        if envelope.session_id is not None or method not in CONTEXT_METHODS or "browserContextId" in params:
+            return message, None
+        command = orjson.loads(message)
+        command.setdefault("params", {})["browserContextId"] = self.context_id
+        return encode(command), None
+
+    async def response(self, message: str) -> Optional[str]:
+        """
+        A message from Chrome, scoped to the session's contexts.
+
+        Returns:
+            str: Message to relay to the client, None to drop it
+        """
+        if not self.pending and not self.foreign and _TARGET_EVENT.search(message) is None:
+            return message
+        envelope = parse_envelope(message)
+        if envelope is None:
+            return message
+        if envelope.session_id in self.foreign:
+            return None
+        if envelope.method is not None:
+            return await self._event(envelope, message)
+        if envelope.id is None:
+            return message
+        if envelope.id <= _OWN_IDS_START:
+            return None  # answer to one of the proxy's own commands
+        method = self.pending.pop((envelope.session_id, envelope.id), None)
+        result = envelope.result if method is not None else None
+        if not result:
+            return message
+        return await self._result(envelope, message, method, result)
+
+    async def _result(self, envelope: Envelope, message: str, method: str, result: dict) -> str:
+        if method == "Target.getTargets":
+            owned = [target for target in result.get("targetInfos", []) if self._owns(target)]
+            self.targets.update(target["targetId"] for target in owned)
+            return _with_result(envelope, dict(result, targetInfos=owned))
+        if method == "Target.getBrowserContexts":
+            contexts = [c for c in result.get("browserContextIds", []) if c in self.contexts]
+            return _with_result(envelope, dict(result, browserContextIds=contexts))
+        if method == "Target.attachToTarget":
+            self.sessions.add(result["sessionId"])
+            return message
+        try:
+            if method == "Target.createBrowserContext":
+                self.contexts.add(result["browserContextId"])
+                await self.actor.adopt_context.remote(result["browserContextId"])
+            else:
+                self.targets.add(result["targetId"])
+                if self.intercepting:
+                    await self.actor.watch_target.remote(result["targetId"])
+        except Exception as e:
+            logger.warning(f"Reporting {method} to the session failed: {e}")
+        return message
+
+    async def _event(self, envelope: Envelope, message: str) -> Optional[str]:
+        method = envelope.method
+        if not method.startswith("Target."):
+            return message
+        params = envelope.params or {}
+        info = params.get("targetInfo")
+        if method == "Target.attachedToTarget":
+            # Children of the client's own pages are its own, whatever Chrome reports
+            if envelope.session_id in self.sessions or self._owns(info):
+                self.targets.add(info["targetId"])
+                self.sessions.add(params["sessionId"])
+                return message
+            await self._release(params["sessionId"], params.get("waitingForDebugger", False))
+            return None
+        if method == "Target.detachedFromTarget":
+            session_id = params.get("sessionId")
+            if session_id in self.foreign:
+                self.foreign.discard(session_id)
+                return None
+            if session_id not in self.sessions:
+                return None
+            self.sessions.discard(session_id)
+            return message
+        if info is not None:
+            if not self._owns(info):
+                return None
+            self.targets.add(info["targetId"])
+            return message
+        if "targetId" in params:
+            if params["targetId"] not in self.targets:
+                return None
+            if method == "Target.targetDestroyed":
+                self.targets.discard(params["targetId"])
+            return message
+        if "sessionId" in params and params["sessionId"] not in self.sessions:
+            return None
+        return message
+
+    def _owns(self, target: Optional[dict]) -> bool:
+        return target is not None and target.get("browserContextId") in self.contexts
+
+    async def _release(self, session_id: str, waiting: bool):
+        """Let go of another session's page that auto-attach attached this connection to"""
+        self.foreign.add(session_id)
+        if self.chrome is None:
+            return
+        if waiting:
+            await self.chrome.send(self._command("Runtime.runIfWaitingForDebugger", {}, session_id))
+        await self.chrome.send(self._command("Target.detachFromTarget", {"sessionId": session_id}))
+
+    def _command(self, method: str, params: dict, session_id: Optional[str] = None) -> str:
+        command = {"id": self.own_id, "method": method, "params": params}
+        if session_id is not None:
+            command["sessionId"] = session_id
+        self.own_id -= 1
+        return encode(command)
+
+
+def _error(envelope: Envelope, message: str) -> str:
+    response = {"id": envelope.id, "error": {"code": -32000, "message": message}}
+    if envelope.session_id is not None:
+        response["sessionId"] = envelope.session_id
+    return encode(response)
+
+
+def _with_result(envelope: Envelope, result: dict) -> str:
+    response = {"id": envelope.id, "result": result}
+    if envelope.session_id is not None:
+        response["sessionId"] = envelope.session_id
+    return encode(response)
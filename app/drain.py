@@ -0,0 +1,112 @@
+# drain.py
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import ray
+from ray.util.scheduling_strategies import NodeLabelSchedulingStrategy, NotIn
+
+from app.probe import probe_name
+
+logger = logging.getLogger(__name__)
+
+# How often each API process re-reads drain state from the node probes
+DRAIN_POLL_INTERVAL = float(os.getenv("BROWSERSTATION_DRAIN_POLL_INTERVAL", "5"))
+
+# Custom event sent to CDP clients of a draining node, before their connection
+# is closed with 1012 (service restart) at the deadline
+DRAIN_EVENT = "BrowserStation.drainScheduled"
+
+
+def resolve_node(node: str) -> Optional[str]:
+    """Ray node ID of an alive node, given its ID or IP address"""
+    for entry in ray.nodes():
+        if entry["Alive"] and node in (entry["NodeID"], entry["NodeManagerAddress"]):
+            return entry["NodeID"]
+    return None
+
+
+async def read_drain(node_id: str) -> Optional[dict]:
+    """Drain status from a node's probe, None if the node has no probe"""
+    try:
+        probe = ray.get_actor(probe_name(node_id))
+    except ValueError:
+        return None
+    return await probe.drain_status.remote()
+
+
+class Drains:
+    """
+    Nodes being drained, as last read from their probes.
+
+    The probes hold the drain state, so it survives API restarts and is the
+    same in every API process.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, dict] = {}  # node_id -> drain status
+        self._events: Dict[str, asyncio.Event] = {}
+
+    def strategy(self) -> Optional[NodeLabelSchedulingStrategy]:
+        """Scheduling strategy keeping new actors off draining nodes, None when there are none"""
+        if not self.nodes:
+            return None
+        return NodeLabelSchedulingStrategy(hard={"ray.io/node_id": NotIn(*self.nodes)})
+
+    def update(self, node_id: str, status: Optional[dict]):
+        if status is None or status["state"] == "active":
+            self.nodes.pop(node_id, None)
+            self._event(node_id).clear()
+            return
+        self.nodes[node_id] = status
+        self._event(node_id).set()
+
+    def _event(self, node_id: str) -> asyncio.Event:
+        event = self._events.get(node_id)
+        if event is None:
+            event = self._events[node_id] = asyncio.Event()
+        return event
+
+    async def wait(self, node_id: str) -> dict:
+        """Wait until `node_id` is draining, then return its drain status"""
+        while True:
+            event = self._event(node_id)
+            await event.wait()
+            status = self.nodes.get(node_id)
+            if status is not None:
+                return status
+
+    async def until_deadline(self, node_id: str) -> bool:
+        """Sleep until the node's drain deadline; False if the drain was cancelled first"""
+        while True:
+            status = self.nodes.get(node_id)
+            if status is None:
+                return False
+            remaining = status["deadline"] - time.time()
+            if remaining <= 0:
+                return True
+            await asyncio.sleep(min(remaining, DRAIN_POLL_INTERVAL))
+
+    async def refresh(self):
+        """Re-read drain state from the probe of every alive node"""
+        nodes = await asyncio.to_thread(ray.nodes)
+        node_ids = [entry["NodeID"] for entry in nodes if entry["Alive"]]
+        statuses = await asyncio.gather(*(read_drain(node_id) for node_id in node_ids), return_exceptions=True)
+        for node_id, status in zip(node_ids, statuses):
+            if isinstance(status, Exception):
+                logger.warning(f"Reading drain state of node {node_id} failed: {status}")
+                continue
+            self.update(node_id, status)
+        # Nodes that left the cluster are no longer draining
+        for node_id in set(self.nodes) - set(node_ids):
+            self.update(node_id, None)
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Drain refresh failed: {e}")
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
@@ -0,0 +1,104 @@
+# evictions.py
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+import ray
+
+from app import admin
+from app.probe import probe_name
+from app.governor import ACTIVITY_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class Evictions:
+    """
+    Browsers the node probes evicted under memory pressure.
+
+    Every API process reports the activity of the relays it holds to the
+    probes, so they can tell idle sessions from busy ones, and reads back
+    what they evicted, to close those relays with the reason.
+    """
+
+    def __init__(self, registry=None):
+        self.shard = int(os.getenv("BROWSERSTATION_SHARD", "0"))
+        self.registry = registry                          # evicted browsers are dropped from it
+        self.evicted: Dict[str, str] = {}                 # browser_id -> reason
+        self._events: Dict[str, asyncio.Event] = {}
+        self._counts: Dict[int, Tuple[int, float]] = {}   # relay -> (messages, when that count was first seen)
+
+    def reason(self, browser_id: str) -> Optional[str]:
+        return self.evicted.get(browser_id)
+
+    async def wait(self, browser_id: str) -> str:
+        """Wait until `browser_id` is evicted, then return the reason"""
+        event = self._events.get(browser_id)
+        if event is None:
+            event = self._events[browser_id] = asyncio.Event()
+        await event.wait()
+        return self.evicted.get(browser_id, "Evicted")
+
+    def activity(self) -> Dict[str, Dict[str, dict]]:
+        """node_id -> {browser_id: {"last_active", "connections"}} for this process's relays"""
+        now = time.time()
+        counts, report = {}, {}
+        for key, relay in admin.relays.items():
+            messages = relay.to_chrome + relay.to_client
+            previous = self._counts.get(key)
+            last_active = previous[1] if previous is not None and previous[0] == messages else now
+            counts[key] = (messages, last_active)
+            entry = report.setdefault(relay.node_id, {}).setdefault(relay.browser_id, {"last_active": 0.0, "connections": 0})
+            entry["last_active"] = max(entry["last_active"], last_active)
+            entry["connections"] += 1
+        self._counts = counts
+        return report
+
+    async def refresh(self):
+        """Report relay activity to the probe of every alive node and pick up its evictions"""
+        report = self.activity()
+        nodes = await asyncio.to_thread(ray.nodes)
+        probes = []
+        for entry in nodes:
+            if not entry["Alive"]:
+                continue
+            try:
+                probes.append((entry["NodeID"], ray.get_actor(probe_name(entry["NodeID"]))))
+            except ValueError:
+                pass  # no browsers on the node
+        results = await asyncio.gather(
+            *(probe.activity.remote(self.shard, report.get(node_id, {})) for node_id, probe in probes),
+            return_exceptions=True,
+        )
+        evicted = {}
+        for (node_id, _), result in zip(probes, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Reporting activity to node {node_id} failed: {result}")
+                continue
+            evicted.update(result)
+
+        for browser_id, reason in evicted.items():
+            if browser_id in self.evicted:
+                continue
+            self.evicted[browser_id] = reason
+            if browser_id in self._events:
+                self._events[browser_id].set()
+            if self.registry is not None:
+                self.registry.remove(browser_id)
+        # Probes forget evictions after a while, and so do we
+        for browser_id in set(self.evicted) - set(evicted):
+            del self.evicted[browser_id]
+        # Nobody waits on browsers this process holds no relay for any more
+        relayed = {relay.browser_id for relay in admin.relays.values()}
+        for browser_id in set(self._events) - relayed - set(self.evicted):
+            del self._events[browser_id]
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Eviction refresh failed: {e}")
+            await asyncio.sleep(ACTIVITY_INTERVAL)
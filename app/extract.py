@@ -0,0 +1,150 @@
+# extract.py
+from typing import List, Optional
+
+from app.cdp import CDPSession
+from app.pages import evaluate
+
+# Isolated world the extraction runs in, so page scripts can neither see nor
+# tamper with it. Clients acting on a ref get the world's execution context
+# with Page.createIsolatedWorld under this name, then evaluate
+# window.__browserstation.get(ref) in it.
+WORLD_NAME = "__browserstation"
+
+# Elements keep their ref for the lifetime of the document, so refs in a diff
+# line up with earlier calls.
+EXTRACT_JS = """
+(({maxText}) => {
+  const bs = window.__browserstation || (window.__browserstation = (() => {
+    const refs = new WeakMap(), elements = new Map();
+    let next = 1;
+    return {
+      id: Math.random().toString(36).slice(2),
+      ref(el) {
+        if (!refs.has(el)) { refs.set(el, next); elements.set(next, new WeakRef(el)); next++; }
+        return refs.get(el);
+      },
+      get(ref) { const r = elements.get(ref); return r && r.deref(); },
+    };
+  })());
+
+  const INTERACTIVE = 'a[href],button,input,select,textarea,summary,details,[contenteditable=""],[contenteditable="true"],' +
+    '[role=button],[role=link],[role=checkbox],[role=radio],[role=tab],[role=menuitem],[role=option],[role=switch],' +
+    '[role=combobox],[role=textbox],[role=searchbox],[role=slider],[onclick],[tabindex]:not([tabindex="-1"])';
+  const SKIP = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'SVG', 'HEAD']);
+  const clean = s => (s || '').replace(/\\s+/g, ' ').trim();
+  const visible = el => {
+    const rect = el.getBoundingClientRect();
+    if (rect.width === 0 && rect.height === 0) return false;
+    const style = getComputedStyle(el);
+    return style.visibility !== 'hidden' && style.display !== 'none' && style.opacity !== '0';
+  };
+  const role = el => el.getAttribute('role') || ({
+    A: 'link', BUTTON: 'button', SELECT: 'combobox', TEXTAREA: 'textbox', SUMMARY: 'button', DETAILS: 'group',
+  })[el.tagName] || (el.tagName === 'INPUT' ? ({
+    checkbox: 'checkbox', radio: 'radio', submit: 'button', button: 'button', reset: 'button', range: 'slider', search: 'searchbox',
+  })[el.type] || 'textbox' : el.isContentEditable ? 'textbox' : 'generic');
+  const name = el => {
+    const labelledby = el.getAttribute('aria-labelledby');
+    const label = el.getAttribute('aria-label') ||
+      (labelledby && clean(labelledby.split(' ').map(id => (document.getElementById(id) || {}).textContent).join(' '))) ||
+      (el.labels && el.labels.length && clean(el.labels[0].textContent)) ||
+      clean(el.innerText) || el.getAttribute('alt') || el.getAttribute('title') || el.getAttribute('placeholder') ||
+      (el.type === 'submit' && el.value) || '';
+    return label.slice(0, 200);
+  };
+
+  const elements = [], seen = new Set();
+  for (const el of document.querySelectorAll(INTERACTIVE)) {
+    if (!visible(el) || el.closest('[aria-hidden="true"],[inert]')) continue;
+    const entry = {ref: bs.ref(el), role: role(el), name: name(el)};
+    if (el.tagName === 'A') entry.href = el.href;
+    if (el.tagName === 'SELECT') entry.value = el.selectedOptions.length ? clean(el.selectedOptions[0].textContent) : '';
+    else if ('value' in el && el.type !== 'submit' && el.type !== 'button' && el.value) entry.value = String(el.value).slice(0, 200);
+    if (el.checked) entry.checked = true;
+    if (el.disabled) entry.disabled = true;
+    const rect = el.getBoundingClientRect();
+    if (rect.bottom < 0 || rect.top > innerHeight) entry.offscreen = true;
+    // The same control repeated (e.g. sticky headers cloned for layout) is listed once
+    const key = [entry.role, entry.name, entry.href || '', entry.value || ''].join('\\u0000');
+    if (seen.has(key)) continue;
+    seen.add(key);
+    elements.push(entry);
+  }
+
+  const text = [], seenText = new Set();
+  let size = 0;
+  const walker = document.createTreeWalker(document.body || document.documentElement, NodeFilter.SHOW_TEXT, {
+    acceptNode(node) {
+      const parent = node.parentElement;
+      if (!parent || SKIP.has(parent.tagName.toUpperCase()) || parent.closest(INTERACTIVE)) return NodeFilter.FILTER_REJECT;
+      return NodeFilter.FILTER_ACCEPT;
+    },
+  });
+  for (let node = walker.nextNode(); node && size < maxText; node = walker.nextNode()) {
+    const value = clean(node.textContent);
+    if (value.length < 2 || seenText.has(value) || !visible(node.parentElement)) continue;
+    seenText.add(value);
+    text.push(value);
+    size += value.length;
+  }
+  return {document: bs.id, url: location.href, title: document.title, elements, text};
+})
+"""
+
+
+async def page_state(cdp: CDPSession, target_id: str, max_text: int) -> dict:
+    """
+    Interactive elements and visible text of a page, in one evaluation.
+
+    Returns:
+        dict: {"document", "url", "title", "elements": [{"ref", "role", "name", ...}], "text": [...]}
+    """
+    session_id = (await cdp.send("Target.attachToTarget", {"targetId": target_id, "flatten": True}))["sessionId"]
+    try:
+        # A page target's main frame shares its ID. The world, and the refs
+        # kept in it, live as long as the document.
+        world = await cdp.send("Page.createIsolatedWorld", {"frameId": target_id, "worldName": WORLD_NAME}, session_id=session_id)
+        return await evaluate(cdp, session_id, f"{EXTRACT_JS}({{maxText: {int(max_text)}}})", context_id=world["executionContextId"])
+    finally:
+        await cdp.send("Target.detachFromTarget", {"sessionId": session_id})
+
+
+def default_target(pages: List[dict]) -> Optional[str]:
+    """Of the session's pages, the one a client is most likely working in: the first loaded one"""
+    pages = sorted(pages, key=lambda t: not t["url"].startswith(("http://", "https://")))
+    return pages[0]["targetId"] if pages else None
+
+
+def diff_state(previous: Optional[dict], current: dict) -> dict:
+    """
+    Changes from `previous` to `current`.
+
+    Refs are only stable within a document, so a navigation or reload gets the full state.
+
+    Returns:
+        dict: {"url", "title", "full", "elements", "removed", "text", "text_removed"}
+    """
+    if previous is None or previous["document"] != current["document"]:
+        return {
+            "url": current["url"],
+            "title": current["title"],
+            "full": True,
+            "elements": current["elements"],
+            "removed": [],
+            "text": current["text"],
+            "text_removed": [],
+        }
+
+    before = {e["ref"]: e for e in previous["elements"]}
+    after = {e["ref"]: e for e in current["elements"]}
+    before_text = set(previous["text"])
+    after_text = set(current["text"])
+    return {
+        "url": current["url"],
+        "title": current["title"],
+        "full": False,
+        "elements": [e for ref, e in after.items() if before.get(ref) != e],
+        "removed": [ref for ref in before if ref not in after],
+        "text": [t for t in current["text"] if t not in before_text],
+        "text_removed": [t for t in previous["text"] if t not in after_text],
+    }
@@ -0,0 +1,300 @@
+# governor.py
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Collection, Dict, List, Optional, Tuple
+
+from app.cdp import CDPSession, CDPError
+from app.profiles import chrome_memory
+
+logger = logging.getLogger(__name__)
+
+# Memory use, as a fraction of the limit, at which the node probe starts
+# shedding load. Both sit below RAY_memory_usage_threshold (0.95 in
+# rayservice.yaml) so idle browsers go before Ray's OOM killer picks a victim.
+SOFT_WATERMARK = float(os.getenv("BROWSERSTATION_MEMORY_SOFT", "0.80"))
+HARD_WATERMARK = float(os.getenv("BROWSERSTATION_MEMORY_HARD", "0.90"))
+
+# Seconds without CDP traffic before a session counts as idle and may be evicted
+IDLE_AFTER = float(os.getenv("BROWSERSTATION_IDLE_AFTER", "120"))
+
+# Memory limit of the Chrome sidecar, from the downward API; Chrome's RSS is
+# held against it next to the Ray container's own cgroup
+CHROME_MEMORY_LIMIT = int(os.getenv("BROWSERSTATION_CHROME_MEMORY_LIMIT", "0")) or None
+
+# How often API processes report relay activity to the probes and read evictions back
+ACTIVITY_INTERVAL = float(os.getenv("BROWSERSTATION_ACTIVITY_INTERVAL", "5"))
+
+# Pressure notifications are sent at most this often
+RELIEF_INTERVAL = 30.0
+
+# Between the watermarks, memory gets this long to come back after a pressure
+# notification or an eviction before more sessions are evicted
+SETTLE = 10.0
+
+# How long probes remember evictions, so clients asking later get the reason
+EVICTED_TTL = 600.0
+
+# Close code for relays of evicted browsers: 1013, try again later
+EVICTED_CLOSE_CODE = 1013
+
+# Targets that run without a tab the client is driving
+BACKGROUND_TARGETS = {"background_page", "service_worker", "shared_worker"}
+
+
+def node_memory(cgroup: str = "/sys/fs/cgroup", meminfo: str = "/proc/meminfo") -> Tuple[int, int]:
+    """
+    (used, limit) bytes for this container: its cgroup when it has a memory
+    limit, else the host. Inactive page cache is not counted as used, as in
+    Ray's memory monitor, since the kernel drops it before OOM-killing.
+    """
+    try:
+        with open(f"{cgroup}/memory.max") as f:
+            limit = f.read().strip()
+        if limit != "max":
+            with open(f"{cgroup}/memory.current") as f:
+                current = int(f.read())
+            with open(f"{cgroup}/memory.stat") as f:
+                stat = dict(line.split() for line in f)
+            return current - int(stat.get("inactive_file", 0)), int(limit)
+    except (OSError, ValueError):
+        pass  # cgroup v1 or no limit
+
+    with open(meminfo) as f:
+        fields = {line.split(":")[0]: int(line.split()[1]) * 1024 for line in f}
+    return fields["MemTotal"] - fields["MemAvailable"], fields["MemTotal"]
+
+
+async def relieve(ws_url: str, level: str, context_ids: Collection[str]) -> int:
+    """
+    Ask a Chrome to free memory: a memory pressure notification, which drops
+    caches in every renderer, then closing the background targets of the
+    given browser contexts. Other sessions' workers are left alone.
+
+    Args:
+        ws_url: Browser-level DevTools WebSocket URL
+        level: "moderate" or "critical"
+        context_ids: Browser contexts of the sessions that may lose their background targets
+
+    Returns:
+        int: Background targets closed
+    """
+    cdp = await CDPSession.connect(ws_url)
+    try:
+        try:
+            await cdp.send("Memory.simulatePressureNotification", {"level": level}, timeout=5)
+        except CDPError as e:
+            logger.warning(f"Memory pressure notification failed: {e}")
+        closed = 0
+        for target in (await cdp.send("Target.getTargets"))["targetInfos"]:
+            if target["type"] not in BACKGROUND_TARGETS or target.get("browserContextId") not in context_ids:
+                continue
+            try:
+                await cdp.send("Target.closeTarget", {"targetId": target["targetId"]}, timeout=5)
+                closed += 1
+            except (CDPError, asyncio.TimeoutError):
+                pass  # already gone, or a type Chrome won't close
+        return closed
+    finally:
+        await cdp.close()
+
+
+async def context_heaps(ws_url: str) -> Dict[str, int]:
+    """
+    JS heap in use per browser context, summed over its pages. Chrome's RSS
+    is apportioned between sessions by it; pages sharing a renderer each
+    report that renderer's heap, so it is an estimate.
+    """
+    cdp = await CDPSession.connect(ws_url)
+    try:
+        heaps: Dict[str, int] = {}
+        for target in (await cdp.send("Target.getTargets"))["targetInfos"]:
+            if target["type"] != "page":
+                continue
+            try:
+                session_id = (await cdp.send("Target.attachToTarget", {"targetId": target["targetId"], "flatten": True}, timeout=5))["sessionId"]
+                try:
+                    used = (await cdp.send("Runtime.getHeapUsage", session_id=session_id, timeout=5)).get("usedSize", 0)
+                finally:
+                    await cdp.send("Target.detachFromTarget", {"sessionId": session_id}, timeout=5)
+            except (CDPError, asyncio.TimeoutError):
+                continue  # closed while we looked
+            context_id = target.get("browserContextId")
+            heaps[context_id] = heaps.get(context_id, 0) + used
+        return heaps
+    finally:
+        await cdp.close()
+
+
+async def close_pages(ws_url: str):
+    """Close every page of a Chrome no session uses any more, leaving one blank tab"""
+    cdp = await CDPSession.connect(ws_url)
+    try:
+        blank = (await cdp.send("Target.createTarget", {"url": "about:blank"}))["targetId"]
+        for target in (await cdp.send("Target.getTargets"))["targetInfos"]:
+            if target["targetId"] != blank and target["type"] in {"page"} | BACKGROUND_TARGETS:
+                try:
+                    await cdp.send("Target.closeTarget", {"targetId": target["targetId"]}, timeout=5)
+                except (CDPError, asyncio.TimeoutError):
+                    pass
+    finally:
+        await cdp.close()
+
+
+async def close_contexts(ws_url: str, context_ids: List[str]):
+    """Dispose of an evicted session's browser contexts, and with them its pages"""
+    cdp = await CDPSession.connect(ws_url)
+    try:
+        for context_id in context_ids:
+            try:
+                await cdp.send("Target.disposeBrowserContext", {"browserContextId": context_id}, timeout=5)
+            except (CDPError, asyncio.TimeoutError):
+                pass  # already disposed, with the actor's connection
+    finally:
+        await cdp.close()
+
+
+class MemoryGovernor:
+    """
+    Memory watermarks for one node, applied by its probe.
+
+    Over the soft watermark, each Chrome first gets a memory pressure
+    notification and idle sessions lose their background targets. If that isn't enough,
+    sessions idle for IDLE_AFTER are evicted, least recently active first and
+    ones without an open connection before ones with. Over the hard watermark
+    both happen at once.
+    """
+
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self.connections: Dict[int, Tuple[float, Dict[str, int]]] = {}  # shard -> (reported_at, {browser_id: relays})
+        self.evicted: "OrderedDict[str, dict]" = OrderedDict()           # browser_id -> {"reason", "at"}, oldest first
+        self.relieved_at: Optional[float] = None
+        self.settle_until = 0.0
+        self.starved = False  # over the watermark with nothing to evict, logged once
+        self.reading: Optional[dict] = None  # last {"used", "limit", "chrome_rss", "usage"}
+
+    def report(self, shard: int, browsers: Dict[str, dict], entries: Dict[str, dict]) -> Dict[str, str]:
+        """
+        Merge an API process's relay activity into the probe's entries.
+
+        Returns:
+            dict: Recent evictions, browser_id -> reason
+        """
+        self.connections[shard] = (time.time(), {browser_id: r["connections"] for browser_id, r in browsers.items()})
+        for browser_id, activity in browsers.items():
+            entry = entries.get(browser_id)
+            if entry is not None:
+                entry["last_active"] = max(entry["last_active"], activity["last_active"])
+        return self.recent()
+
+    def recent(self) -> Dict[str, str]:
+        """Evictions younger than EVICTED_TTL, browser_id -> reason"""
+        cutoff = time.time() - EVICTED_TTL
+        while self.evicted and next(iter(self.evicted.values()))["at"] < cutoff:
+            self.evicted.popitem(last=False)
+        return {browser_id: entry["reason"] for browser_id, entry in self.evicted.items()}
+
+    def connected(self, browser_id: str) -> int:
+        # A process that stopped reporting has restarted or gone, and its relays with it
+        cutoff = time.time() - 3 * ACTIVITY_INTERVAL
+        return sum(relays.get(browser_id, 0) for at, relays in self.connections.values() if at >= cutoff)
+
+    async def measure(self) -> dict:
+        used, limit = await asyncio.to_thread(node_memory)
+        chrome_rss = await asyncio.to_thread(chrome_memory)
+        usage = used / limit
+        if CHROME_MEMORY_LIMIT and chrome_rss:
+            usage = max(usage, chrome_rss / CHROME_MEMORY_LIMIT)
+        self.reading = {"used": used, "limit": limit, "chrome_rss": chrome_rss, "usage": usage}
+        return self.reading
+
+    async def check(self, entries: Dict[str, dict], endpoints: List[str]) -> List[Tuple[str, str]]:
+        """
+        One pass over the watermarks.
+
+        Args:
+            entries: The probe's registrations, browser_id -> entry with "last_active"
+            endpoints: Browser-level WebSocket URLs of the node's Chromes
+
+        Returns:
+            list: (browser_id, reason) of the sessions to evict now
+        """
+        reading = await self.measure()
+        usage = reading["usage"]
+        if usage < SOFT_WATERMARK:
+            self.relieved_at = None
+            self.starved = False
+            return []
+        now = time.time()
+        hard = usage >= HARD_WATERMARK
+        idle = [
+            browser_id for browser_id, entry in entries.items()
+            if browser_id not in self.evicted and now - entry["last_active"] >= IDLE_AFTER
+        ]
+        idle.sort(key=lambda browser_id: (self.connected(browser_id) > 0, entries[browser_id]["last_active"]))
+
+        if self.relieved_at is None or now - self.relieved_at >= RELIEF_INTERVAL:
+            self.relieved_at = now
+            level = "critical" if hard else "moderate"
+            contexts = {context_id for browser_id in idle for context_id in entries[browser_id].get("contexts", ())}
+            closed = await asyncio.gather(*(relieve(ws_url, level, contexts) for ws_url in endpoints), return_exceptions=True)
+            logger.warning(
+                f"Node {self.node_id} memory at {usage:.0%}, sent {level} pressure notification, "
+                f"closed {sum(c for c in closed if isinstance(c, int))} background targets"
+            )
+            if not hard:
+                self.settle_until = now + SETTLE
+                return []
+        if not hard and now < self.settle_until:
+            return []
+
+        if not idle:
+            if not self.starved:
+                logger.warning(f"Node {self.node_id} memory at {usage:.0%} with no idle session to evict")
+            self.starved = True
+            return []
+        self.starved = False
+
+        # Evict idle sessions until their share of Chrome's memory covers the
+        # excess; without a reading, evict one at a time and measure again
+        if reading["chrome_rss"] and CHROME_MEMORY_LIMIT and reading["chrome_rss"] / CHROME_MEMORY_LIMIT >= reading["used"] / reading["limit"]:
+            excess = reading["chrome_rss"] - SOFT_WATERMARK * CHROME_MEMORY_LIMIT
+        else:
+            excess = reading["used"] - SOFT_WATERMARK * reading["limit"]
+        count = 1
+        if reading["chrome_rss"]:
+            shares = await self.shares(reading["chrome_rss"], entries, endpoints)
+            freed = 0
+            for count, browser_id in enumerate(idle, 1):
+                freed += shares[browser_id]
+                if freed >= excess:
+                    break
+
+        victims = []
+        for browser_id in idle[:count]:
+            reason = f"Evicted: node memory at {usage:.0%}, idle for {now - entries[browser_id]['last_active']:.0f}s"
+            self.evicted[browser_id] = {"reason": reason, "at": now}
+            victims.append((browser_id, reason))
+        self.settle_until = now + SETTLE
+        return victims
+
+    async def shares(self, chrome_rss: int, entries: Dict[str, dict], endpoints: List[str]) -> Dict[str, float]:
+        """
+        Chrome's RSS apportioned between sessions by the JS heap of their
+        contexts' pages, or in equal shares when no heap could be read.
+        """
+        heaps: Dict[str, int] = {}
+        for result in await asyncio.gather(*(context_heaps(ws_url) for ws_url in endpoints), return_exceptions=True):
+            if isinstance(result, dict):
+                for context_id, used in result.items():
+                    heaps[context_id] = heaps.get(context_id, 0) + used
+        total = sum(heaps.values())
+        if not total:
+            return {browser_id: chrome_rss / len(entries) for browser_id in entries}
+        return {
+            browser_id: chrome_rss * sum(heaps.get(context_id, 0) for context_id in entry.get("contexts", ())) / total
+            for browser_id, entry in entries.items()
+        }
@@ -0,0 +1,351 @@
+# intercept.py
+import os
+import re
+import base64
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+from ray.util.metrics import Counter
+
+from app.cache import NodeCache, CREDENTIAL_HEADERS, freshness
+from app.cdp import CDPSession, CDPError
+from app.context import SessionContext
+from app.models import ResourcePolicy
+
+logger = logging.getLogger(__name__)
+
+CACHE_TYPES = os.getenv("BROWSERSTATION_CACHE_TYPES", "Script,Stylesheet,Font").split(",")
+
+# Resource types of `Link: <url>; rel=preload; as=...` targets, which are
+# fetched into the shared cache as soon as a response announces them
+PRELOAD_TYPES = {"script": "Script", "style": "Stylesheet", "font": "Font"}
+PREFETCH_TIMEOUT = 10.0
+
+_LINK = re.compile(r"<([^>]*)>([^<]*)")
+_LINK_PARAM = re.compile(r';\s*([\w-]+)(?:\s*=\s*"?([^";,]*)"?)?')
+
+_cache_requests = None
+_cache_bytes = None
+_blocked_requests = None
+
+
+def _metrics():
+    """Counters are created lazily, they need a connected Ray worker"""
+    global _cache_requests, _cache_bytes, _blocked_requests
+    if _cache_requests is None:
+        _cache_requests = Counter(
+            "browserstation_cache_requests",
+            description="Shared cache lookups by result",
+            tag_keys=("result",),
+        )
+        _cache_bytes = Counter(
+            "browserstation_cache_bytes_served",
+            description="Response bytes served from the shared node cache",
+        )
+        _blocked_requests = Counter(
+            "browserstation_requests_blocked",
+            description="Requests blocked by session resource policies",
+            tag_keys=("reason",),
+        )
+    return _cache_requests, _cache_bytes, _blocked_requests
+
+
+def preloads(url: str, headers: List[dict]) -> List[Tuple[str, str, bool]]:
+    """(url, resource type, crossorigin) of the cacheable preloads a response's Link headers announce"""
+    found = []
+    for header in headers:
+        if header["name"].lower() != "link":
+            continue
+        for m in _LINK.finditer(header["value"]):
+            params = {name.lower(): (value or "").lower() for name, value in _LINK_PARAM.findall(m.group(2))}
+            resource_type = PRELOAD_TYPES.get(params.get("as"))
+            if "preload" not in params.get("rel", "").split() or resource_type not in CACHE_TYPES:
+                continue
+            target = urljoin(url, m.group(1).strip())
+            if urlsplit(target).scheme in ("http", "https"):
+                found.append((target, resource_type, "crossorigin" in params))
+    return found
+
+
+def url_pattern(pattern: str):
+    """Compile a Fetch URL pattern ("*" any run, "?" one char, "\\" escapes)"""
+    regex, escaped = [], False
+    for c in pattern:
+        if escaped:
+            regex.append(re.escape(c))
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c == "*":
+            regex.append(".*")
+        elif c == "?":
+            regex.append(".")
+        else:
+            regex.append(re.escape(c))
+    return re.compile("".join(regex), re.DOTALL)
+
+
+class RequestInterceptor:
+    """
+    Request interception through the CDP Fetch domain, for one session's pages.
+
+    Chrome is shared with the other sessions on the pod, so Fetch is enabled
+    per target rather than on the browser target: the interceptor attaches
+    to every page in the session's browser contexts as it appears, and to
+    the frames and workers those pages start, which wait for it before
+    running. Requests of other sessions are never paused.
+    """
+
+    def __init__(self, cdp: CDPSession, context: SessionContext, cache: Optional[NodeCache] = None, policy: Optional[ResourcePolicy] = None):
+        """
+        Initialize interceptor.
+
+        Args:
+            cdp: Browser-level CDP connection, kept open for the session lifetime
+            context: The session's browser contexts, whose pages are intercepted
+            cache: Shared node cache to serve and store cacheable responses
+            policy: Resource types, URL patterns and response sizes to block
+        """
+        self.cdp = cdp
+        self.context = context
+        self.cache = cache
+        self.policy = policy
+        self.blocked_types = set(policy.blocked_resource_types) if policy else set()
+        self.blocked_urls = [url_pattern(p) for p in policy.blocked_url_patterns] if policy else []
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "bytes_served": 0, "prefetched": 0}
+        self.blocked = {"type": 0, "url": 0, "size": 0}
+        self.sessions = set()  # flattened sessions Fetch is enabled on
+        self.watching: Dict[str, asyncio.Task] = {}  # page target_id -> attach task
+        self.prefetching: Dict[str, asyncio.Task] = {}  # url -> preload fetch
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.patterns())
+
+    def cache_stats(self) -> Optional[dict]:
+        return dict(self.stats) if self.cache is not None else None
+
+    def blocked_stats(self) -> Optional[dict]:
+        return dict(self.blocked) if self.policy is not None else None
+
+    def patterns(self):
+        # Chrome only pauses requests matching a pattern, so the policy's
+        # blocklists double as the interception filter
+        patterns = []
+        for resource_type in self.blocked_types:
+            patterns.append({"urlPattern": "*", "resourceType": resource_type, "requestStage": "Request"})
+        for pattern in self.policy.blocked_url_patterns if self.policy else []:
+            patterns.append({"urlPattern": pattern, "requestStage": "Request"})
+        if self.policy is not None and self.policy.max_response_size is not None:
+            patterns.append({"urlPattern": "*", "requestStage": "Response"})
+        if self.cache is not None:
+            for resource_type in CACHE_TYPES:
+                patterns.append({"urlPattern": "*", "resourceType": resource_type, "requestStage": "Request"})
+                patterns.append({"urlPattern": "*", "resourceType": resource_type, "requestStage": "Response"})
+            # Documents are only paused for their Link headers, see _prefetch
+            patterns.append({"urlPattern": "*", "resourceType": "Document", "requestStage": "Response"})
+        return patterns
+
+    async def _block(self, request_id: str, reason: str, session_id: str):
+        await self.cdp.send("Fetch.failRequest", {"requestId": request_id, "errorReason": "BlockedByClient"}, session_id=session_id)
+        self.blocked[reason] += 1
+        _metrics()[2].inc(tags={"reason": reason})
+
+    async def enable(self):
+        if not self.enabled:
+            return
+        self.cdp.on("Fetch.requestPaused", self._on_paused)
+        self.cdp.on("Target.targetCreated", self._on_target_created)
+        self.cdp.on("Target.attachedToTarget", self._on_attached)
+        self.cdp.on("Target.detachedFromTarget", self._on_detached)
+        await self.cdp.send("Target.setDiscoverTargets", {"discover": True})
+        for target in await self.context.targets():
+            await self.watch(target)
+
+    async def watch(self, target: dict):
+        """
+        Intercept a page's requests, if it belongs to the session.
+
+        Safe to call more than once per page; later calls wait for the first.
+        """
+        if target.get("type") != "page" or not self.context.owns(target):
+            return
+        task = self.watching.get(target["targetId"])
+        if task is None:
+            task = self.watching[target["targetId"]] = asyncio.create_task(self._attach(target["targetId"]))
+        await asyncio.shield(task)
+
+    async def watch_target(self, target_id: str):
+        info = (await self.cdp.send("Target.getTargetInfo", {"targetId": target_id}))["targetInfo"]
+        await self.watch(info)
+
+    async def _attach(self, target_id: str):
+        try:
+            session_id = (await self.cdp.send("Target.attachToTarget", {"targetId": target_id, "flatten": True}))["sessionId"]
+            await self._intercept(session_id)
+        except Exception as e:
+            # Closed before we got to it
+            self.watching.pop(target_id, None)
+            logger.debug(f"Intercepting target {target_id} failed: {e}")
+
+    async def _intercept(self, session_id: str):
+        self.sessions.add(session_id)
+        await self.cdp.send("Fetch.enable", {"patterns": self.patterns()}, session_id=session_id)
+        # Out-of-process frames and workers are targets of their own; they
+        # start paused until Fetch is enabled on them too
+        await self.cdp.send("Target.setAutoAttach", {
+            "autoAttach": True, "waitForDebuggerOnStart": True, "flatten": True,
+        }, session_id=session_id)
+
+    async def _on_target_created(self, params: dict, session_id: Optional[str]):
+        # Pages opened by the session's pages (popups), or by the client
+        # without going through the proxy's report
+        if session_id is None:
+            await self.watch(params["targetInfo"])
+
+    async def _on_attached(self, params: dict, session_id: Optional[str]):
+        if session_id not in self.sessions:
+            return  # attached by someone else, or to a target that isn't the session's
+        child = params["sessionId"]
+        try:
+            await self._intercept(child)
+        except Exception as e:
+            logger.debug(f"Intercepting {params['targetInfo'].get('type')} target failed: {e}")
+        if params.get("waitingForDebugger"):
+            await self.cdp.send("Runtime.runIfWaitingForDebugger", session_id=child)
+
+    async def _on_detached(self, params: dict, session_id: Optional[str]):
+        self.sessions.discard(params["sessionId"])
+        if session_id is None and params.get("targetId") in self.watching:
+            del self.watching[params["targetId"]]
+
+    async def _on_paused(self, params: dict, session_id: Optional[str]):
+        if session_id not in self.sessions:
+            return  # paused by interception on someone else's session
+        request_id = params["requestId"]
+        try:
+            if "responseStatusCode" in params or "responseErrorReason" in params:
+                await self._on_response(params, session_id)
+            else:
+                await self._on_request(params, session_id)
+        except Exception as e:
+            logger.warning(f"Interception of {params['request']['url']} failed: {e}")
+            # Never leave Chrome waiting on a paused request
+            try:
+                await self.cdp.send("Fetch.continueRequest", {"requestId": request_id}, session_id=session_id)
+            except Exception:
+                pass
+
+    async def _credentialed(self, request: dict, session_id: str) -> bool:
+        """
+        Whether a request carries Authorization or cookies.
+
+        Chrome adds cookies after Fetch sees the request, so the page's
+        cookie jar is asked whether it has any for the URL.
+        """
+        if CREDENTIAL_HEADERS.intersection(name.lower() for name in request["headers"]):
+            return True
+        try:
+            cookies = await self.cdp.send("Network.getCookies", {"urls": [request["url"]]}, session_id=session_id)
+        except CDPError:
+            return True  # e.g. a worker target without a cookie jar; assume the worst
+        return bool(cookies["cookies"])
+
+    async def _on_request(self, params: dict, session_id: str):
+        request = params["request"]
+        request_id = params["requestId"]
+
+        if params.get("resourceType") in self.blocked_types:
+            return await self._block(request_id, "type", session_id)
+        if any(p.fullmatch(request["url"]) for p in self.blocked_urls):
+            return await self._block(request_id, "url", session_id)
+
+        if self.cache is not None and request["method"] == "GET" and params.get("resourceType") in CACHE_TYPES:
+            credentialed = await self._credentialed(request, session_id)
+            cached = await asyncio.to_thread(self.cache.get, request["url"], request["headers"], credentialed)
+            requests_counter, bytes_counter, _ = _metrics()
+            if cached is not None:
+                status, headers, body = cached
+                await self.cdp.send("Fetch.fulfillRequest", {
+                    "requestId": request_id,
+                    "responseCode": status,
+                    "responseHeaders": headers,
+                    "body": base64.b64encode(body).decode(),
+                }, session_id=session_id)
+                self.stats["hits"] += 1
+                self.stats["bytes_served"] += len(body)
+                requests_counter.inc(tags={"result": "hit"})
+                bytes_counter.inc(len(body))
+                return
+            self.stats["misses"] += 1
+            requests_counter.inc(tags={"result": "miss"})
+
+        await self.cdp.send("Fetch.continueRequest", {"requestId": request_id}, session_id=session_id)
+
+    async def _on_response(self, params: dict, session_id: str):
+        request = params["request"]
+        request_id = params["requestId"]
+        status = params.get("responseStatusCode")
+        headers = params.get("responseHeaders", [])
+
+        max_size = self.policy.max_response_size if self.policy else None
+        if max_size is not None:
+            length = next((h["value"] for h in headers if h["name"].lower() == "content-length"), None)
+            if length is not None and length.isdigit() and int(length) > max_size:
+                return await self._block(request_id, "size", session_id)
+
+        if self.cache is not None and status == 200:
+            self._prefetch(request, headers)
+
+        cacheable = self.cache is not None and status == 200 and request["method"] == "GET" and params.get("resourceType") in CACHE_TYPES
+        max_age = freshness(headers) if cacheable else 0
+        if max_age > 0 and await self._credentialed(request, session_id):
+            max_age = freshness(headers, credentialed=True)
+        if max_age > 0:
+            response = await self.cdp.send("Fetch.getResponseBody", {"requestId": request_id}, session_id=session_id)
+            body = response["body"]
+            body = base64.b64decode(body) if response.get("base64Encoded") else body.encode()
+            if await asyncio.to_thread(self.cache.put, request["url"], request["headers"], status, headers, body, max_age):
+                self.stats["stored"] += 1
+                _metrics()[0].inc(tags={"result": "store"})
+
+        # continueRequest at the response stage passes the original response through
+        await self.cdp.send("Fetch.continueRequest", {"requestId": request_id}, session_id=session_id)
+
+    def _prefetch(self, request: dict, headers: List[dict]):
+        """
+        Fetch the scripts, stylesheets and fonts a response preloads into the
+        shared cache, so the page's own requests for them are hits.
+
+        Preloads are fetched from the node without the page's cookies or
+        credentials, so only responses fit for any session are stored.
+        """
+        for url, resource_type, crossorigin in preloads(request["url"], headers):
+            if url not in self.prefetching:
+                task = self.prefetching[url] = asyncio.create_task(self._fetch(url, request, crossorigin))
+                task.add_done_callback(lambda _, url=url: self.prefetching.pop(url, None))
+
+    async def _fetch(self, url: str, document: dict, crossorigin: bool):
+        request_headers = {
+            name: value for name, value in document["headers"].items()
+            if name.lower() in ("user-agent", "accept-language")
+        }
+        request_headers["Referer"] = document["url"]
+        if crossorigin:
+            parts = urlsplit(document["url"])
+            request_headers["Origin"] = f"{parts.scheme}://{parts.netloc}"
+        try:
+            if await asyncio.to_thread(self.cache.get, url, request_headers) is not None:
+                return
+            async with httpx.AsyncClient(timeout=PREFETCH_TIMEOUT) as client:
+                response = await client.get(url, headers=request_headers)
+            headers = [{"name": name, "value": value} for name, value in response.headers.multi_items()]
+            max_age = freshness(headers) if response.status_code == 200 else 0
+            if max_age > 0 and await asyncio.to_thread(self.cache.put, url, request_headers, 200, headers, response.content, max_age):
+                self.stats["prefetched"] += 1
+                _metrics()[0].inc(tags={"result": "prefetch"})
+        except Exception as e:
+            logger.debug(f"Prefetching {url} failed: {e}")
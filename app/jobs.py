@@ -0,0 +1,282 @@
+# jobs.py
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+
+import orjson
+import ray
+
+from app.models import JobRequest, JobInfo
+from app.pool import BrowserPool, QuotaExceeded
+from app.tenants import DEFAULT_TENANT
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("BROWSERSTATION_JOBS_DIR", os.path.expanduser("~/.browserstation/jobs"))
+
+# Extra seconds a fetch may take on top of its page timeout before it is abandoned
+FETCH_GRACE = 15.0
+
+# How often a job waiting for room in its tenant's quota checks again
+QUOTA_INTERVAL = 2.0
+
+
+class Job:
+    """
+    A batch of page fetches.
+
+    `{job_id}.json` holds the request and state, `{job_id}.ndjson` one line per
+    finished URL. The results file is the checkpoint: a resumed job skips
+    every index already in it. Only the tenant that created a job sees it.
+    """
+
+    def __init__(self, job_id: str, request: JobRequest, created_at: float, path: str = JOBS_DIR,
+                 tenant: str = DEFAULT_TENANT):
+        self.job_id = job_id
+        self.request = request
+        self.tenant = tenant
+        self.created_at = created_at
+        self.finished_at: Optional[float] = None
+        self.state = "running"
+        self.succeeded = 0
+        self.failed = 0
+        self.meta_path = os.path.join(path, f"{job_id}.json")
+        self.results_path = os.path.join(path, f"{job_id}.ndjson")
+        self.task: Optional[asyncio.Task] = None
+        self._progress = asyncio.Event()
+
+    def info(self) -> JobInfo:
+        return JobInfo(
+            job_id=self.job_id,
+            state=self.state,
+            total=len(self.request.urls),
+            succeeded=self.succeeded,
+            failed=self.failed,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+        )
+
+    def save(self):
+        meta = {
+            "job_id": self.job_id,
+            "request": self.request.model_dump(),
+            "tenant": self.tenant,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "state": self.state,
+        }
+        tmp = f"{self.meta_path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps(meta))
+        os.replace(tmp, self.meta_path)
+
+    @classmethod
+    def load(cls, meta_path: str) -> "Job":
+        with open(meta_path, "rb") as f:
+            meta = orjson.loads(f.read())
+        job = cls(meta["job_id"], JobRequest(**meta["request"]), meta["created_at"], os.path.dirname(meta_path),
+                  meta.get("tenant", DEFAULT_TENANT))
+        job.state = meta["state"]
+        job.finished_at = meta["finished_at"]
+        return job
+
+    def checkpoint(self) -> set:
+        """Indices already finished, recounting successes and failures"""
+        done = set()
+        self.succeeded = self.failed = 0
+        valid = 0
+        try:
+            with open(self.results_path, "rb+") as f:
+                for line in f:
+                    try:
+                        result = orjson.loads(line) if line.endswith(b"\n") else None
+                    except orjson.JSONDecodeError:
+                        result = None
+                    if result is None:
+                        break
+                    valid += len(line)
+                    done.add(result["index"])
+                    if result["ok"]:
+                        self.succeeded += 1
+                    else:
+                        self.failed += 1
+                # Drop a line torn by a crash mid-write
+                f.truncate(valid)
+        except FileNotFoundError:
+            pass
+        return done
+
+    def append(self, result: dict):
+        with open(self.results_path, "ab") as f:
+            f.write(orjson.dumps(result) + b"\n")
+        if result["ok"]:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.notify()
+
+    def notify(self):
+        # Wake result streams waiting for the next line
+        self._progress.set()
+        self._progress = asyncio.Event()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._progress.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class JobManager:
+    """Runs page-fetch jobs on pooled browsers next to Chrome"""
+
+    def __init__(self, pool: BrowserPool, path: str = JOBS_DIR):
+        """
+        Initialize job manager.
+
+        Args:
+            pool: Browsers the jobs run on
+            path: Directory for job state and results
+        """
+        self.pool = pool
+        self.path = path
+        self.jobs: Dict[str, Job] = {}
+
+    def resume(self):
+        """Load jobs from disk and restart those that were running"""
+        if not os.path.isdir(self.path):
+            return  # no job was ever created
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            try:
+                job = Job.load(os.path.join(self.path, name))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable job file {name}: {e}")
+                continue
+            self.jobs[job.job_id] = job
+            if job.state == "running":
+                logger.info(f"Resuming job {job.job_id}")
+                self._start(job)
+            else:
+                job.checkpoint()
+
+    def create(self, request: JobRequest, tenant: str) -> JobInfo:
+        # Created on first use, not when the module-level service is built on import
+        os.makedirs(self.path, exist_ok=True)
+        job = Job(str(uuid.uuid4()), request, time.time(), self.path, tenant)
+        job.save()
+        self.jobs[job.job_id] = job
+        self._start(job)
+        return job.info()
+
+    def get(self, job_id: str, tenant: str) -> Optional[Job]:
+        """The tenant's job; another tenant's is as good as missing"""
+        job = self.jobs.get(job_id)
+        return job if job is not None and job.tenant == tenant else None
+
+    def owned_by(self, tenant: str) -> List[Job]:
+        return [job for job in self.jobs.values() if job.tenant == tenant]
+
+    def cancel(self, job_id: str, tenant: str) -> Optional[JobInfo]:
+        job = self.get(job_id, tenant)
+        if job is None:
+            return None
+        if job.task is not None and not job.task.done():
+            job.state = "cancelled"
+            job.task.cancel()
+        return job.info()
+
+    async def results(self, job: Job, offset: int = 0) -> AsyncIterator[bytes]:
+        """
+        Stream result lines from `offset`, following the file until the job ends.
+
+        Args:
+            job: Job to stream
+            offset: Result lines to skip, e.g. those a reconnecting client already has
+        """
+        position = 0
+        with open(job.results_path, "ab+") as f:
+            f.seek(0)
+            while True:
+                running = job.state == "running"
+                line = f.readline()
+                while line.endswith(b"\n"):
+                    if position >= offset:
+                        yield line
+                    position += 1
+                    line = f.readline()
+                if line:
+                    f.seek(-len(line), os.SEEK_CUR)  # partial line, reread once complete
+                if not running:
+                    return
+                await job.wait(1.0)
+
+    def _start(self, job: Job):
+        job.task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Job):
+        request = job.request
+        done = job.checkpoint()
+        pending = deque(i for i in range(len(request.urls)) if i not in done)
+        workers = min(request.concurrency, len(pending), self.pool.size)
+        try:
+            await asyncio.gather(*(self._worker(job, pending) for _ in range(workers)))
+            job.state = "completed"
+        except asyncio.CancelledError:
+            if job.state != "cancelled":
+                raise  # API shutting down, leave the job running on disk to resume
+        except Exception as e:
+            logger.warning(f"Job {job.job_id} failed: {e}")
+            job.state = "failed"
+        job.finished_at = time.time()
+        job.save()
+        job.notify()
+
+    async def _worker(self, job: Job, pending: deque):
+        """Hold one pooled browser and fetch URLs until the queue is empty"""
+        request = job.request
+        member = None
+        try:
+            while pending:
+                index = pending.popleft()
+                url = request.urls[index]
+                result = {"index": index, "url": url, "ok": False}
+                for attempt in range(1, request.retries + 2):
+                    result["attempts"] = attempt
+                    try:
+                        if member is None:
+                            member = await self._lease(job)
+                        page = await asyncio.wait_for(
+                            member[1].fetch_page.remote(url, request.extract, request.timeout),
+                            request.timeout + FETCH_GRACE,
+                        )
+                        result.update(page, ok=True)
+                        result.pop("error", None)
+                        break
+                    except (ray.exceptions.RayActorError, asyncio.TimeoutError) as e:
+                        # The browser is gone or wedged, retry on another one
+                        if member is not None:
+                            await self.pool.release(member, job.tenant, healthy=False)
+                            member = None
+                        result["error"] = str(e) or type(e).__name__
+                    except ray.exceptions.RayTaskError as e:
+                        result["error"] = str(e.cause)
+                    except Exception as e:
+                        result["error"] = str(e)
+                job.append(result)
+        finally:
+            if member is not None:
+                await self.pool.release(member, job.tenant)
+
+    async def _lease(self, job: Job):
+        """A pooled browser for the job, waiting while its tenant is at quota"""
+        while True:
+            try:
+                return await self.pool.acquire(job.tenant)
+            except QuotaExceeded:
+                await asyncio.sleep(QUOTA_INTERVAL)
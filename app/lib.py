@@ -1,15 +1,27 @@
 # lib.py
+from typing import Optional
+
 import httpx
 
-async def fetch_ws(ip: str, timeout: float = 2.0):
-    """Fetch browser-level WebSocket URL from Chrome"""
+async def fetch_ws(ip: str, timeout: float = 2.0, client: Optional[httpx.AsyncClient] = None):
+    """Fetch browser-level WebSocket URL from Chrome, reusing `client` when given"""
     try:
-        async with httpx.AsyncClient() as client:
+        if client is None:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(f"http://{ip}:9222/json/version", timeout=timeout)
+        else:
             response = await client.get(f"http://{ip}:9222/json/version", timeout=timeout)
         if response.status_code != 200:
             return None
         ws_url = response.json().get("webSocketDebuggerUrl", "")
         return ws_url.replace("localhost", ip)
-    
+
     except Exception as e:
-        return None
\ No newline at end of file
+        return None
+
+
+def proxy_path(browser_id: str, ws_url: Optional[str]):
+    """Map a Chrome WebSocket URL to its path on the head-node proxy"""
+    if not ws_url:
+        return None
+    return f"/ws/browsers/{browser_id}{ws_url.split('9222')[-1]}"
\ No newline at end of file
@@ -1,26 +1,80 @@
 # main.py
+import os
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import ray
 import logging
 
-from .routes import router
+from .routes import router, service
+from .autoscale import HEADROOM, autoscale_loop
+from . import tracing, admin
 
 logger = logging.getLogger(__name__)
 
+# Index of this process under app.shard; the control plane only runs in shard 0
+SHARD = int(os.getenv("BROWSERSTATION_SHARD", "0"))
+SHARDS = int(os.getenv("BROWSERSTATION_SHARDS", "1"))
+
+
+async def restore_state():
+    """Re-read state kept in the detached actors, on every connect to Ray"""
+    # Object refs of a previous driver are dead; snapshots are put again from disk on use
+    service.snapshot_stores.clear()
+    refreshes = [service.drains.refresh(), service.evictions.refresh()]
+    if SHARD == 0:
+        refreshes.append(service.registry.refresh())
+    for result in await asyncio.gather(*refreshes, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.warning(f"Restoring state from Ray failed: {result}")
+
+
+async def start_control_plane(tasks: list):
+    """Background loops that need Ray, started once it is first connected"""
+    await service.cluster.wait()
+
+    # Keep spare browser capacity requested from the autoscaler
+    if HEADROOM > 0 and SHARD == 0:
+        tasks.append(asyncio.create_task(autoscale_loop()))
+    # Every shard follows drains: shard 0 to place browsers, all of them to notify relays
+    tasks.append(asyncio.create_task(service.drains.run()))
+    # Every shard reports its relays' activity to the memory governors and closes evicted ones
+    tasks.append(asyncio.create_task(service.evictions.run()))
+
+    if SHARD == 0:
+        # Browsers created before a restart are read back from the node probes
+        tasks.append(asyncio.create_task(service.registry.run()))
+        # Pool members of a previous process are orphaned, its running jobs resume
+        try:
+            await asyncio.to_thread(service.pool.reap)
+        except Exception as e:
+            logger.warning(f"Reaping pool members failed: {e}")
+        service.jobs.resume()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifecycle"""
     # Startup
-    logger.info("Initializing Ray connection...")
-    if not ray.is_initialized():
-        ray.init(address="auto")
-    logger.info("Ray initialized successfully")
-    
+    tracing.setup("browserstation-api")
+
+    # Ray is connected in the background, so health checks are served
+    # (degraded) while the GCS comes up and after it goes away
+    service.cluster.on_connect(restore_state)
+    tasks = [
+        asyncio.create_task(service.cluster.run()),
+        asyncio.create_task(admin.lag_monitor.run()),
+    ]
+    tasks.append(asyncio.create_task(start_control_plane(tasks)))
+
     yield
 
+    for task in tasks:
+        task.cancel()
+    await service.pool.close()
+    tracing.flush()
+
 
 
 app = FastAPI(
@@ -39,5 +93,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def trace_requests(request: Request, call_next):
+    """Root span per request, continuing the client's trace when it sends traceparent"""
+    with tracing.remote_span(f"{request.method} {request.url.path}", dict(request.headers)) as span:
+        response = await call_next(request)
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+        return response
+
+if tracing.TRACING:
+    app.middleware("http")(trace_requests)
+
+@app.middleware("http")
+async def close_shard_routed(request: Request, call_next):
+    """
+    app.shard routes a connection by its first request only, so one that
+    reached this worker with ?shard=N must not be reused for the next request,
+    which may be meant for another worker. A ?shard= request that arrives on
+    a connection held by a different worker is refused, to be retried on a
+    fresh connection, rather than answered with this worker's state.
+    """
+    shard = request.query_params.get("shard")
+    if shard is None or not request.url.path.startswith("/admin/"):
+        return await call_next(request)
+    if shard.isdigit() and min(int(shard), SHARDS - 1) != SHARD:
+        response = JSONResponse(
+            status_code=421,
+            content={"detail": f"Connection is held by shard {SHARD}, retry on a new connection"},
+        )
+    else:
+        response = await call_next(request)
+    response.headers["Connection"] = "close"
+    return response
+
 # Include the router
 app.include_router(router)
\ No newline at end of file
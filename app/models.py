@@ -1,20 +1,43 @@
 # models.py
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Optional, List, Literal, Dict, Annotated
 from uuid import UUID
 
+# Kubernetes-style label syntax, so selectors never need quoting
+LabelKey = Annotated[str, StringConstraints(pattern=r"^[A-Za-z0-9][-A-Za-z0-9_./]{0,62}$")]
+LabelValue = Annotated[str, StringConstraints(pattern=r"^[-A-Za-z0-9_./]{0,63}$")]
+
 class Health(BaseModel):
     status: str
     ray_status: bool
+    ray: Optional[str] = None  # connection state, e.g. "connected for 3600s"
     browsers: dict  # {"alive": count, "pending": count, "dead": count}
     cluster: dict   # Ray cluster resources
     available: dict # Ray available resources  
 
+class ResourcePolicy(BaseModel):
+    blocked_resource_types: List[str] = []   # CDP resource types, e.g. "Image", "Media", "Font"
+    blocked_url_patterns: List[str] = []     # Fetch URL patterns, "*" and "?" wildcards
+    max_response_size: Optional[int] = None  # bytes, checked against Content-Length
+
+class BrowserOptions(BaseModel):
+    shared_cache: bool = False  # serve static assets from the node-wide HTTP cache
+    resource_policy: Optional[ResourcePolicy] = None
+    from_snapshot: Optional[str] = None  # snapshot ID to restore before the browser is returned
+    labels: Dict[LabelKey, LabelValue] = Field({}, max_length=32)  # for GET/DELETE /browsers?selector=
+    profile: Optional[Literal["lite", "full"]] = None  # Chrome launch profile, see app.profiles; None takes any node
+
 class BrowserInfo(BaseModel):
     browser_id: UUID
     pod_ip: str
     websocket_url: Optional[str] = None
     chrome_ready: bool
+    cache: Optional[dict] = None    # shared cache hit/miss counters when enabled
+    blocked: Optional[dict] = None  # requests blocked by the resource policy, by reason
+    node_id: Optional[str] = None   # Ray node hosting the browser
+    profile: Optional[str] = None   # launch profile of the node's Chrome
+    memory: Optional[int] = None    # Chrome resident memory in bytes, in GET /browsers/{id}
+    browser_context_id: Optional[str] = None  # the session's own context in the shared Chrome
 
 class ActorInfo(BaseModel):
     browser_id: UUID
@@ -24,5 +47,109 @@ class BrowserStatus(BaseModel):
     browser_id: UUID
     status: str
 
+class Demand(BaseModel):
+    live: int               # browsers holding a slot
+    pending: int            # creates waiting for a slot
+    capacity: int           # browser slots in the cluster
+    available: int          # free browser slots
+    headroom: int           # free slots kept ahead of demand
+    deficit: int            # slots missing to reach the target
+    target: int             # slots requested from the autoscaler
+    sessions_per_node: dict # {node_id: live browsers}
+
+class SnapshotInfo(BaseModel):
+    snapshot_id: str
+    size: int             # compressed bytes
+    cookies: int
+    origins: List[str]    # origins with localStorage, IndexedDB or service workers
+    created_at: float
+
+class SnapshotList(BaseModel):
+    snapshots: List[SnapshotInfo]
+
+class SnapshotStatus(BaseModel):
+    snapshot_id: str
+    status: str
+
+class JobRequest(BaseModel):
+    urls: List[str] = Field(min_length=1)
+    extract: List[Literal["html", "text"]] = ["html"]
+    concurrency: int = Field(10, ge=1, le=100)   # browsers working on the job at once
+    retries: int = Field(2, ge=0, le=10)         # extra attempts per URL
+    timeout: float = Field(30.0, gt=0, le=300)   # seconds to wait for each page load
+
+class JobInfo(BaseModel):
+    job_id: str
+    state: str              # running, completed, cancelled, failed
+    total: int
+    succeeded: int
+    failed: int
+    created_at: float
+    finished_at: Optional[float] = None
+
+class JobList(BaseModel):
+    jobs: List[JobInfo]
+
+class RenderRequest(BaseModel):
+    url: str
+    format: Literal["png", "jpeg", "webp", "pdf"] = "png"
+    width: int = Field(1280, ge=1, le=8192)        # viewport, CSS pixels
+    height: int = Field(800, ge=1, le=8192)
+    full_page: bool = False                        # capture the whole document, not just the viewport
+    quality: Optional[int] = Field(None, ge=0, le=100)  # jpeg and webp only
+    max_age: float = Field(60.0, ge=0)             # seconds a cached render may be reused, 0 always renders
+    timeout: float = Field(30.0, gt=0, le=300)     # seconds to wait for the page load
+
+class ExtractRequest(BaseModel):
+    target_id: Optional[str] = None   # page to read, defaults to the first page target
+    diff: bool = True                 # only changes since the last extract of this page
+    max_text: int = Field(20000, ge=0, le=1_000_000)  # characters of visible text
+
+class ExtractResult(BaseModel):
+    target_id: str
+    url: str
+    title: str
+    full: bool                  # False when elements/text are changes since the last call
+    elements: List[dict]        # interactive elements, {"ref", "role", "name", ...}
+    removed: List[int] = []     # refs gone since the last call
+    text: List[str]             # visible text blocks
+    text_removed: List[str] = []
+
+class LoopLag(BaseModel):
+    interval: float  # seconds between checks
+    samples: int
+    last: float      # seconds the loop was late, per check
+    mean: float
+    p50: float
+    p99: float
+    max: float
+
+class DrainRequest(BaseModel):
+    timeout: float = Field(600.0, gt=0, le=86400)  # seconds before remaining browsers are killed
+
+class DrainStatus(BaseModel):
+    node_id: str
+    state: Literal["active", "draining", "drained"]
+    started_at: Optional[float] = None
+    deadline: Optional[float] = None
+    browsers: List[str] = []  # browsers still on the node, pool members included
+
+class Usage(BaseModel):
+    tenant: str
+    sessions: int                       # live and pending browsers
+    cpus: float                         # sessions * BROWSERSTATION_SESSION_CPUS
+    max_sessions: Optional[int] = None
+    max_cpus: Optional[float] = None
+
+class UsageList(BaseModel):
+    tenants: List[Usage]
+
+class TaskDump(BaseModel):
+    tasks: List[dict]   # {"name", "coro", "done", "at"}
+    relays: List[dict]  # open CDP proxy connections with age and counters
+
 class BrowserList(BaseModel):
-    browsers: List[dict] 
\ No newline at end of file
+    browsers: List[dict]  # {"browser_id", "state", "websocket_url", "labels", "created_at", "node_id"}
+
+class BrowserStatusList(BaseModel):
+    browsers: List[BrowserStatus]
\ No newline at end of file
@@ -0,0 +1,158 @@
+# pages.py
+import base64
+import asyncio
+import logging
+from typing import List, Optional
+
+from app.cdp import CDPSession
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_JS = {
+    "html": "document.documentElement ? document.documentElement.outerHTML : ''",
+    "text": "document.body ? document.body.innerText : ''",
+}
+
+
+async def evaluate(cdp: CDPSession, session_id: str, expression: str, timeout: float = 30.0, context_id: Optional[int] = None):
+    """
+    Evaluate `expression` in a page, awaiting promises, and return its value.
+
+    Args:
+        context_id: Execution context to evaluate in, the page's main world if None
+    """
+    params = {"expression": expression, "awaitPromise": True, "returnByValue": True}
+    if context_id is not None:
+        params["contextId"] = context_id
+    result = await cdp.send("Runtime.evaluate", params, session_id=session_id, timeout=timeout)
+    if "exceptionDetails" in result:
+        raise RuntimeError(result["exceptionDetails"].get("text", "evaluation failed"))
+    return result["result"].get("value")
+
+
+async def open_page(cdp: CDPSession, url: str = "about:blank", browser_context_id: Optional[str] = None):
+    """
+    Open a page target and attach to it.
+
+    Args:
+        browser_context_id: Context to open the page in, the default context if None
+
+    Returns:
+        tuple: (target_id, session_id) for a flattened session on the page
+    """
+    params = {"url": url}
+    if browser_context_id:
+        params["browserContextId"] = browser_context_id
+    target_id = (await cdp.send("Target.createTarget", params))["targetId"]
+    session_id = (await cdp.send("Target.attachToTarget", {"targetId": target_id, "flatten": True}))["sessionId"]
+    await cdp.send("Page.enable", session_id=session_id)
+    return target_id, session_id
+
+
+async def close_page(cdp: CDPSession, target_id: str):
+    try:
+        await cdp.send("Target.closeTarget", {"targetId": target_id}, timeout=5)
+    except Exception as e:
+        logger.warning(f"Closing target {target_id} failed: {e}")
+
+
+async def navigate(cdp: CDPSession, session_id: str, url: str, timeout: float = 30.0) -> dict:
+    """
+    Navigate a page and wait for its load event.
+
+    Returns:
+        dict: {"status": main document HTTP status or None, "loaded": whether load fired in time}
+
+    Raises:
+        RuntimeError: If the navigation itself fails (DNS, TLS, blocked, ...)
+    """
+    responses = {}
+
+    async def on_response(params, event_session_id):
+        if event_session_id == session_id and params.get("type") == "Document":
+            responses.setdefault(params["loaderId"], params["response"]["status"])
+
+    cdp.on("Network.responseReceived", on_response)
+    try:
+        await cdp.send("Network.enable", session_id=session_id)
+        loaded = cdp.wait_for("Page.loadEventFired", session_id)
+        result = await cdp.send("Page.navigate", {"url": url}, session_id=session_id, timeout=timeout)
+        if result.get("errorText"):
+            loaded.cancel()
+            raise RuntimeError(f"Navigation failed: {result['errorText']}")
+        try:
+            await asyncio.wait_for(loaded, timeout)
+            complete = True
+        except asyncio.TimeoutError:
+            # Pages held open by slow subresources are still worth extracting
+            complete = False
+        return {"status": responses.get(result.get("loaderId")), "loaded": complete}
+    finally:
+        cdp.off("Network.responseReceived", on_response)
+
+
+async def fetch(cdp: CDPSession, url: str, extract: List[str], timeout: float = 30.0, browser_context_id: Optional[str] = None) -> dict:
+    """
+    Load `url` in a fresh page and extract its content.
+
+    Args:
+        cdp: Browser-level CDP connection
+        url: Page to load
+        extract: Any of "html", "text"
+        timeout: Seconds to wait for the load event
+        browser_context_id: The browser's own context, to open the page in
+
+    Returns:
+        dict: {"final_url", "title", "status", "loaded", <extract>...}
+    """
+    target_id, session_id = await open_page(cdp, browser_context_id=browser_context_id)
+    try:
+        result = await navigate(cdp, session_id, url, timeout)
+        result["final_url"] = await evaluate(cdp, session_id, "location.href")
+        result["title"] = await evaluate(cdp, session_id, "document.title")
+        for key in extract:
+            result[key] = await evaluate(cdp, session_id, EXTRACT_JS[key])
+        return result
+    finally:
+        await close_page(cdp, target_id)
+
+
+async def render(cdp: CDPSession, url: str, options: dict, browser_context_id: Optional[str] = None) -> bytes:
+    """
+    Load `url` in a fresh page and capture it.
+
+    Args:
+        cdp: Browser-level CDP connection
+        url: Page to load
+        options: "format" (png, jpeg, webp or pdf), "width", "height",
+            "full_page", "quality" and "timeout"
+        browser_context_id: The browser's own context, to open the page in
+
+    Returns:
+        bytes: Image or PDF
+    """
+    target_id, session_id = await open_page(cdp, browser_context_id=browser_context_id)
+    try:
+        await cdp.send("Emulation.setDeviceMetricsOverride", {
+            "width": options["width"],
+            "height": options["height"],
+            "deviceScaleFactor": 1,
+            "mobile": False,
+        }, session_id=session_id)
+        await navigate(cdp, session_id, url, options["timeout"])
+
+        if options["format"] == "pdf":
+            result = await cdp.send("Page.printToPDF", {"printBackground": True}, session_id=session_id, timeout=options["timeout"])
+            return base64.b64decode(result["data"])
+
+        params = {"format": options["format"]}
+        if options.get("quality") is not None and options["format"] != "png":
+            params["quality"] = options["quality"]
+        if options["full_page"]:
+            size = (await cdp.send("Page.getLayoutMetrics", session_id=session_id))["cssContentSize"]
+            params["clip"] = {"x": 0, "y": 0, "width": size["width"], "height": size["height"], "scale": 1}
+            params["captureBeyondViewport"] = True
+        result = await cdp.send("Page.captureScreenshot", params, session_id=session_id, timeout=options["timeout"])
+        return base64.b64decode(result["data"])
+    finally:
+        await close_page(cdp, target_id)
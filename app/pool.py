@@ -0,0 +1,184 @@
+# pool.py
+import os
+import uuid
+import asyncio
+import logging
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import ray
+
+from app.models import BrowserOptions
+from app.drain import Drains
+
+logger = logging.getLogger(__name__)
+
+# Pool members are named with this prefix and hidden from GET /browsers
+POOL_PREFIX = "pool-"
+
+# Most browsers the API runs server-side work on at once
+POOL_SIZE = int(os.getenv("BROWSERSTATION_POOL_SIZE", "20"))
+
+# Idle browsers kept warm between jobs
+POOL_WARM = int(os.getenv("BROWSERSTATION_POOL_WARM", "0"))
+
+# How long a new member waits for its Chrome
+READY_TIMEOUT = 30.0
+
+
+class QuotaExceeded(Exception):
+    """A lease the owner's quota has no room for"""
+
+
+class BrowserPool:
+    """
+    Browsers owned by the API for server-side work.
+
+    Members are ordinary BrowserActors, so they hold a `browser` slot and count
+    towards autoscaling demand like client sessions do. Each lease is made on
+    behalf of an owner, a tenant, and counts against its quota like a session.
+    """
+
+    def __init__(self, actor_class, size: int = POOL_SIZE, warm: int = POOL_WARM, drains: Optional[Drains] = None,
+                 quota: Optional[Callable[[str], Optional[str]]] = None):
+        """
+        Initialize pool.
+
+        Args:
+            actor_class: BrowserActor, passed in since the service module owns both
+            size: Maximum members, leased and idle
+            warm: Idle members kept instead of being killed on release
+            drains: Draining nodes, which members are kept off
+            quota: Why an owner can't take one more lease, None if it can
+        """
+        self.actor_class = actor_class
+        self.size = size
+        self.warm = warm
+        self.drains = drains
+        self.quota = quota
+        self.idle: List[Tuple[str, "ray.actor.ActorHandle"]] = []
+        self.nodes: Dict[str, str] = {}  # member name -> node_id
+        self.leased = 0
+        self.waiting = 0
+        self.leases: Counter = Counter()  # owner -> leases held or waited for
+        self._available = asyncio.Condition()
+
+    async def acquire(self, owner: str) -> Tuple[str, "ray.actor.ActorHandle"]:
+        """
+        Lease a ready member, creating one if the pool has room.
+
+        Args:
+            owner: Tenant the lease counts against; QuotaExceeded if it has no room
+
+        Returns:
+            tuple: (actor name, actor handle)
+        """
+        # Checked and counted before the first await, so concurrent leases can't overshoot
+        refusal = self.quota(owner) if self.quota is not None else None
+        if refusal is not None:
+            raise QuotaExceeded(refusal)
+        self.leases[owner] += 1
+        try:
+            return await self._acquire()
+        except BaseException:
+            self._unlease(owner)
+            raise
+
+    async def _acquire(self) -> Tuple[str, "ray.actor.ActorHandle"]:
+        async with self._available:
+            while not self.idle and self.leased >= self.size:
+                self.waiting += 1
+                try:
+                    await self._available.wait()
+                finally:
+                    self.waiting -= 1
+            self.leased += 1
+            if self.idle:
+                return self.idle.pop()
+
+        try:
+            return await self._create()
+        except Exception:
+            async with self._available:
+                self.leased -= 1
+                self._available.notify()
+            raise
+
+    async def release(self, member: Tuple[str, "ray.actor.ActorHandle"], owner: str, healthy: bool = True):
+        """
+        Return a leased member.
+
+        Args:
+            member: Value returned by acquire
+            owner: Owner it was acquired for
+            healthy: False kills the member instead of keeping it warm
+        """
+        self._unlease(owner)
+        async with self._available:
+            self.leased -= 1
+            keep = healthy and not self._draining(member) and len(self.idle) < max(self.warm, self.waiting)
+            if keep:
+                self.idle.append(member)
+            self._available.notify()
+        if not keep:
+            self._kill(member)
+
+    async def retire(self, node_id: str):
+        """Kill idle members on a draining node; leased ones are killed on release"""
+        async with self._available:
+            retired = [member for member in self.idle if self.nodes.get(member[0]) == node_id]
+            self.idle = [member for member in self.idle if member not in retired]
+        for member in retired:
+            self._kill(member)
+
+    def _unlease(self, owner: str):
+        self.leases[owner] -= 1
+        if self.leases[owner] <= 0:
+            del self.leases[owner]
+
+    def _draining(self, member) -> bool:
+        return self.drains is not None and self.nodes.get(member[0]) in self.drains.nodes
+
+    async def _create(self):
+        browser_id = str(uuid.uuid4())
+        name = f"{POOL_PREFIX}{browser_id}"
+        strategy = self.drains.strategy() if self.drains is not None else None
+        actor = self.actor_class.options(name=name, lifetime="detached", scheduling_strategy=strategy).remote(browser_id)
+        try:
+            await actor.start.remote(BrowserOptions())
+            info = await actor.wait_ready.remote(READY_TIMEOUT)
+            if not info.chrome_ready:
+                raise RuntimeError("Chrome not ready")
+        except Exception:
+            ray.kill(actor)
+            raise
+        self.nodes[name] = info.node_id
+        return name, actor
+
+    def _kill(self, member):
+        name, actor = member
+        self.nodes.pop(name, None)
+        try:
+            ray.kill(actor)
+        except Exception as e:
+            logger.warning(f"Killing pool member {name} failed: {e}")
+
+    async def close(self):
+        """Kill idle members, leased ones are killed as they are released"""
+        self.warm = 0
+        async with self._available:
+            idle, self.idle = self.idle, []
+        for member in idle:
+            self._kill(member)
+
+    def reap(self):
+        """Kill members left behind by a previous API process"""
+        from ray.util.state import list_actors
+
+        actors = list_actors(filters=[("class_name", "=", "BrowserActor"), ("state", "=", "ALIVE")], limit=10_000)
+        for actor in actors:
+            if actor.name.startswith(POOL_PREFIX):
+                try:
+                    ray.kill(ray.get_actor(actor.name))
+                except ValueError:
+                    pass
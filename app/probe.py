@@ -0,0 +1,274 @@
+# probe.py
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import httpx
+import ray
+from ray.util.scheduling_strategies import NodeAffinitySchedulingStrategy
+
+from app.lib import fetch_ws
+from app.governor import MemoryGovernor, close_pages, close_contexts
+
+logger = logging.getLogger(__name__)
+
+PROBE_INTERVAL = float(os.getenv("BROWSERSTATION_PROBE_INTERVAL", "2.0"))
+
+# Probes exit after this long without browsers, so they don't keep an
+# otherwise empty node from being scaled down
+IDLE_EXIT = 60.0
+
+# Registrations younger than this are never pruned, so a browser created while
+# the API was listing actors doesn't get dropped before it shows up as ALIVE.
+PRUNE_GRACE = 30.0
+
+# How often the probe checks its registrations against the live actors itself,
+# for browsers that were killed without closing and are never listed
+RECONCILE_INTERVAL = 30.0
+
+
+def probe_name(node_id: str) -> str:
+    return f"probe-{node_id}"
+
+
+def get_node_probe(node_id: Optional[str] = None):
+    """
+    Get or create the probe actor pinned to a node.
+
+    Args:
+        node_id: Ray node ID, defaults to the node of the calling process
+    """
+    node_id = node_id or ray.get_runtime_context().get_node_id()
+    return NodeProbe.options(
+        name=probe_name(node_id),
+        lifetime="detached",
+        get_if_exists=True,
+        scheduling_strategy=NodeAffinitySchedulingStrategy(node_id=node_id, soft=False),
+    ).remote(node_id)
+
+
+@ray.remote(num_cpus=0)
+class NodeProbe:
+    """Actor that probes every Chrome on its node in a single loop"""
+
+    def __init__(self, node_id: str):
+        """
+        Initialize node probe.
+
+        Args:
+            node_id: Ray node ID this probe is pinned to
+        """
+        self.node_id = node_id
+        self.browsers: Dict[str, dict] = {}  # browser_id -> {"ip", "registered_at", "labels", "namespace", "last_active", "contexts"}
+        self.table: Dict[str, dict] = {}     # browser_id -> {"ready", "path", "registered_at", "labels", "namespace"}
+        self.updated_at: Optional[float] = None
+        self.idle_since = time.time()
+        self.drain: Optional[dict] = None    # {"started_at", "deadline"} while the node is drained
+        self.endpoints: Dict[str, str] = {}  # Chrome IP -> browser-level WebSocket URL, when ready
+        self.governor = MemoryGovernor(node_id)
+        self._task: Optional[asyncio.Task] = None
+
+    async def register(self, browser_id: str, ip: str, labels: Optional[Dict[str, str]] = None, namespace: Optional[str] = None):
+        """
+        Start probing the Chrome serving `browser_id`.
+
+        Args:
+            labels: Session labels, kept here so the API can rebuild its registry
+            namespace: Ray namespace of the actor (its tenant's)
+        """
+        now = time.time()
+        self.browsers[browser_id] = {"ip": ip, "registered_at": now, "labels": labels or {}, "namespace": namespace, "last_active": now, "contexts": []}
+        self.idle_since = None
+        self._ensure_running()
+
+    async def contexts(self, browser_id: str, context_ids: List[str]):
+        """The browser contexts of a session, disposed of when it is evicted"""
+        entry = self.browsers.get(browser_id)
+        if entry is not None:
+            entry["contexts"] = context_ids
+
+    async def touch(self, browser_id: str):
+        """Note CDP use by the browser actor itself, which the API's relays don't see"""
+        entry = self.browsers.get(browser_id)
+        if entry is not None:
+            entry["last_active"] = time.time()
+
+    async def activity(self, shard: int, browsers: Dict[str, dict]):
+        """
+        Relay activity from one API process, so idle sessions can be told apart.
+
+        Args:
+            shard: Index of the reporting API process
+            browsers: browser_id -> {"last_active", "connections"} for its relays to this node
+
+        Returns:
+            dict: Recent evictions, browser_id -> reason, for the API to close relays with
+        """
+        return self.governor.report(shard, browsers, self.browsers)
+
+    async def memory(self):
+        """Last memory reading of the governor, and recent evictions"""
+        return {"node_id": self.node_id, "reading": self.governor.reading, "evicted": self.governor.recent()}
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def start_drain(self, timeout: float):
+        """
+        Mark the node as draining. Browsers still on it after `timeout`
+        seconds are killed; draining again moves the deadline.
+
+        Returns:
+            dict: See drain_status
+        """
+        now = time.time()
+        started_at = self.drain["started_at"] if self.drain else now
+        self.drain = {"started_at": started_at, "deadline": now + timeout}
+        self._ensure_running()
+        return await self.drain_status()
+
+    async def cancel_drain(self):
+        self.drain = None
+        if not self.browsers and self.idle_since is None:
+            self.idle_since = time.time()
+        return await self.drain_status()
+
+    async def drain_status(self):
+        """
+        Returns:
+            dict: {"node_id", "state", "started_at", "deadline", "browsers"}, state
+                being "active", "draining" or "drained" (no browsers left)
+        """
+        drain = self.drain or {}
+        state = "active" if not self.drain else "draining" if self.browsers else "drained"
+        return {
+            "node_id": self.node_id,
+            "state": state,
+            "started_at": drain.get("started_at"),
+            "deadline": drain.get("deadline"),
+            "browsers": sorted(self.browsers),
+        }
+
+    async def unregister(self, browser_id: str):
+        self.browsers.pop(browser_id, None)
+        self.table.pop(browser_id, None)
+        if not self.browsers and self.idle_since is None:
+            self.idle_since = time.time()
+
+    async def snapshot(self, browser_ids: Optional[List[str]] = None):
+        """
+        Read the status table.
+
+        Args:
+            browser_ids: Live browsers on this node. Registrations missing from
+                the list are pruned, covering actors that died without closing.
+
+        Returns:
+            dict: {"node_id", "updated_at", "browsers": {browser_id: {"ready", "path"}}}
+        """
+        if browser_ids is not None:
+            await self._prune(set(browser_ids))
+
+        return {"node_id": self.node_id, "updated_at": self.updated_at, "browsers": dict(self.table)}
+
+    async def _prune(self, live: set):
+        cutoff = time.time() - PRUNE_GRACE
+        for browser_id, entry in list(self.browsers.items()):
+            if browser_id not in live and entry["registered_at"] < cutoff:
+                await self.unregister(browser_id)
+
+    async def _reconcile(self):
+        from ray.util.state import list_actors
+
+        actors = await asyncio.to_thread(
+            list_actors,
+            filters=[("node_id", "=", self.node_id), ("class_name", "=", "BrowserActor"), ("state", "=", "ALIVE")],
+            limit=10_000,
+        )
+        await self._prune({actor.name for actor in actors})
+
+    async def _run(self):
+        last_reconcile = time.time()
+        async with httpx.AsyncClient() as client:
+            while True:
+                if time.time() - last_reconcile > RECONCILE_INTERVAL:
+                    last_reconcile = time.time()
+                    try:
+                        await self._reconcile()
+                    except Exception as e:
+                        logger.warning(f"Probe reconcile on node {self.node_id} failed: {e}")
+                if self.drain is not None and time.time() >= self.drain["deadline"] and self.browsers:
+                    await self._evict()
+                # A drained node keeps its probe, so the API keeps placing browsers elsewhere
+                if self.drain is None and self.idle_since is not None and time.time() - self.idle_since > IDLE_EXIT:
+                    logger.info(f"Probe on node {self.node_id} idle, exiting")
+                    ray.kill(ray.get_runtime_context().current_actor, no_restart=True)
+                    return
+                try:
+                    await self._probe(client)
+                except Exception as e:
+                    logger.warning(f"Probe loop on node {self.node_id} failed: {e}")
+                if self.browsers:
+                    try:
+                        await self._govern()
+                    except Exception as e:
+                        logger.warning(f"Memory governor on node {self.node_id} failed: {e}")
+                await asyncio.sleep(PROBE_INTERVAL)
+
+    async def _evict(self):
+        """Kill the browsers left on the node at the drain deadline"""
+        for name in list(self.browsers):
+            logger.info(f"Drain deadline passed on node {self.node_id}, killing {name}")
+            await self._kill(name)
+
+    async def _govern(self):
+        """Evict idle sessions the memory governor picked, freeing Chrome's pages once nothing uses them"""
+        victims = await self.governor.check(self.browsers, list(self.endpoints.values()))
+        for name, reason in victims:
+            ip = self.browsers[name]["ip"]
+            logger.warning(f"{reason}, killing {name} on node {self.node_id}")
+            await self._kill(name)
+            if ip in self.endpoints and all(entry["ip"] != ip for entry in self.browsers.values()):
+                await close_pages(self.endpoints[ip])
+
+    async def _kill(self, name: str):
+        entry = self.browsers[name]
+        try:
+            ray.kill(ray.get_actor(name, namespace=entry["namespace"]), no_restart=True)
+        except ValueError:
+            pass  # already gone
+        except Exception as e:
+            logger.warning(f"Killing {name} on node {self.node_id} failed: {e}")
+            return
+        await self.unregister(name)
+        # Chrome drops the actor's own context with its connection, but not
+        # contexts the client created, nor any while the connection lingers
+        ws_url = self.endpoints.get(entry["ip"])
+        if entry["contexts"] and ws_url:
+            try:
+                await close_contexts(ws_url, entry["contexts"])
+            except Exception as e:
+                logger.warning(f"Closing the browser contexts of {name} on node {self.node_id} failed: {e}")
+
+    async def _probe(self, client: httpx.AsyncClient):
+        # Browsers sharing a Chrome endpoint are covered by one request
+        ips = sorted({entry["ip"] for entry in self.browsers.values()})
+        results = await asyncio.gather(*(fetch_ws(ip, client=client) for ip in ips))
+        by_ip = dict(zip(ips, results))
+        self.endpoints = {ip: ws_url for ip, ws_url in by_ip.items() if ws_url}
+
+        table = {}
+        for browser_id, entry in self.browsers.items():
+            ws_url = by_ip.get(entry["ip"])
+            table[browser_id] = {
+                "ready": bool(ws_url),
+                "path": ws_url.split("9222")[-1] if ws_url else None,
+                "registered_at": entry["registered_at"],
+                "labels": entry["labels"],
+                "namespace": entry["namespace"],
+            }
+        self.table = table
+        self.updated_at = time.time()
\ No newline at end of file
@@ -0,0 +1,109 @@
+# profiles.py
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Chrome launch profiles. Each runs as the Chrome sidecar of its own worker
+# group (see rayservice.yaml), which advertises `chrome-<profile>` next to the
+# `browser` slot, so a session asking for a profile is placed on a node whose
+# Chrome was started with its flags.
+PROFILE_RESOURCE = "chrome-{}"
+
+# Set on the ray-worker container of each group, so actors can report the
+# profile of the Chrome they were given
+NODE_PROFILE_ENV = "BROWSERSTATION_CHROME_PROFILE"
+
+# The zenika/alpine-chrome entrypoint already adds --headless,
+# --disable-dev-shm-usage and software GL
+COMMON_ARGS = [
+    "--no-sandbox",
+    "--remote-debugging-address=0.0.0.0",
+    "--remote-debugging-port=9222",
+]
+
+
+@dataclass(frozen=True)
+class LaunchProfile:
+    name: str
+    args: List[str]
+
+
+PROFILES: Dict[str, LaunchProfile] = {
+    # High throughput: Chrome defaults, a renderer per site
+    "full": LaunchProfile("full", COMMON_ARGS),
+    # Low memory: few renderers shared across sites, small caches and V8 heap,
+    # nothing running in the background
+    "lite": LaunchProfile("lite", COMMON_ARGS + [
+        "--disable-extensions",
+        "--disable-site-isolation-trials",
+        "--disable-features=site-per-process,IsolateOrigins,Translate,BackForwardCache,MediaRouter,OptimizationHints",
+        "--renderer-process-limit=2",
+        "--disk-cache-size=33554432",
+        "--js-flags=--max-old-space-size=256",
+        "--disable-background-networking",
+        "--disable-component-update",
+        "--disable-default-apps",
+        "--disable-gpu",
+        "--mute-audio",
+        "--no-first-run",
+    ]),
+}
+
+
+def node_profile() -> Optional[str]:
+    """
+    Profile of the Chrome on the calling process's node. Read per call, since
+    actor methods are pickled along with the API process's module globals.
+    """
+    return os.getenv(NODE_PROFILE_ENV)
+
+
+def profile_resources(profile: Optional[str]) -> Dict[str, float]:
+    """Custom resources placing a browser on a node running `profile`, none for any node"""
+    return {PROFILE_RESOURCE.format(profile): 1} if profile else {}
+
+
+def chrome_memory(port: int = 9222, proc: str = "/proc") -> Optional[int]:
+    """
+    Resident memory in bytes of the Chrome serving DevTools on `port`, summed
+    over its browser process and every descendant (zygotes, renderers, GPU and
+    utility processes). Shared pages are counted once per process, so this
+    overstates what the profile costs a node by the shared libraries.
+
+    The Chrome sidecar is only visible with shareProcessNamespace on the pod;
+    returns None when it isn't found.
+    """
+    flag = f"--remote-debugging-port={port}".encode()
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    roots = []
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    for entry in os.listdir(proc):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        try:
+            with open(f"{proc}/{pid}/stat", "rb") as f:
+                # The command name is in parentheses and may contain spaces
+                fields = f.read().rsplit(b")", 1)[1].split()
+            with open(f"{proc}/{pid}/statm", "rb") as f:
+                rss[pid] = int(f.read().split()[1]) * page_size
+            with open(f"{proc}/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().split(b"\0")
+        except (OSError, IndexError, ValueError):
+            continue  # exited while we looked
+        children.setdefault(int(fields[1]), []).append(pid)
+        if flag in cmdline:
+            roots.append(pid)
+    if not roots:
+        return None
+
+    total, stack, seen = 0, list(roots), set()
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, ()))
+    return total
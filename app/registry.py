@@ -0,0 +1,271 @@
+# registry.py
+import re
+import time
+import bisect
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import ray
+
+from app.pool import POOL_PREFIX
+from app.probe import probe_name, PRUNE_GRACE
+from app.tenants import DEFAULT_TENANT, tenant_of_namespace
+
+logger = logging.getLogger(__name__)
+
+# How often the registry re-reads the node probes, catching browsers that
+# died without being deleted and ones created by a previous API process
+SYNC_INTERVAL = 10.0
+
+ALIVE = "ALIVE"
+PENDING = "PENDING"
+
+_TERM = re.compile(
+    r"^\s*(?:(?P<not>!)\s*(?P<absent>[^\s=!(),]+)"
+    r"|(?P<key>[^\s=!(),]+)\s*(?:(?P<op>==|=|!=)\s*(?P<value>[^\s=!(),]*)"
+    r"|\s+(?P<set_op>in|notin)\s*\((?P<values>[^()]*)\))?)\s*$"
+)
+
+
+@dataclass(frozen=True)
+class Requirement:
+    key: str
+    op: str                   # "in", "notin", "exists" or "!exists"
+    values: Tuple[str, ...] = ()
+
+    def matches(self, labels: Dict[str, str]) -> bool:
+        if self.op == "exists":
+            return self.key in labels
+        if self.op == "!exists":
+            return self.key not in labels
+        if self.op == "in":
+            return labels.get(self.key) in self.values
+        return labels.get(self.key) not in self.values
+
+
+def parse_selector(selector: str) -> List[Requirement]:
+    """
+    Parse a Kubernetes-style label selector.
+
+    Terms are comma-separated: `key=value`, `key!=value`, `key in (a,b)`,
+    `key notin (a,b)`, `key` (has the label) and `!key` (lacks it).
+
+    Raises:
+        ValueError: On a malformed term
+    """
+    terms, depth, start = [], 0, 0
+    for i, char in enumerate(selector):
+        depth += char == "("
+        depth -= char == ")"
+        if char == "," and depth == 0:
+            terms.append(selector[start:i])
+            start = i + 1
+    terms.append(selector[start:])
+
+    requirements = []
+    for term in terms:
+        if not term.strip():
+            continue
+        match = _TERM.match(term)
+        if match is None:
+            raise ValueError(f"Invalid selector term: {term.strip()!r}")
+        if match["absent"]:
+            requirements.append(Requirement(match["absent"], "!exists"))
+        elif match["op"]:
+            op = "notin" if match["op"] == "!=" else "in"
+            requirements.append(Requirement(match["key"], op, (match["value"],)))
+        elif match["set_op"]:
+            values = tuple(v.strip() for v in match["values"].split(",") if v.strip())
+            requirements.append(Requirement(match["key"], match["set_op"], values))
+        else:
+            requirements.append(Requirement(match["key"], "exists"))
+    return requirements
+
+
+@dataclass
+class Entry:
+    browser_id: str
+    state: str
+    created_at: float
+    labels: Dict[str, str] = field(default_factory=dict)
+    node_id: Optional[str] = None
+    tenant: str = DEFAULT_TENANT
+    alive_since: Optional[float] = None
+
+
+class BrowserRegistry:
+    """
+    Client browsers with their labels, indexed for tenant, selector, state and age queries.
+
+    Lives in the API process and is rebuilt from the node probes, which keep
+    each browser's labels, after a restart.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Entry] = {}
+        self.by_label: Dict[Tuple[str, str], Set[str]] = {}
+        self.by_key: Dict[str, Set[str]] = {}
+        self.by_state: Dict[str, Set[str]] = {ALIVE: set(), PENDING: set()}
+        self.by_tenant: Dict[str, Set[str]] = {}
+        self.by_age: List[Tuple[float, str]] = []  # (created_at, browser_id), sorted
+
+    def __len__(self):
+        return len(self.entries)
+
+    def count(self, tenant: str) -> int:
+        """Live and pending browsers of a tenant"""
+        return len(self.by_tenant.get(tenant, ()))
+
+    def add(self, browser_id: str, labels: Dict[str, str], state: str = PENDING,
+            created_at: Optional[float] = None, node_id: Optional[str] = None, tenant: str = DEFAULT_TENANT):
+        self.remove(browser_id)
+        entry = Entry(browser_id, state, created_at or time.time(), dict(labels), node_id, tenant)
+        if state == ALIVE:
+            entry.alive_since = time.time()
+        self.entries[browser_id] = entry
+        for item in entry.labels.items():
+            self.by_label.setdefault(item, set()).add(browser_id)
+            self.by_key.setdefault(item[0], set()).add(browser_id)
+        self.by_state[state].add(browser_id)
+        self.by_tenant.setdefault(tenant, set()).add(browser_id)
+        bisect.insort(self.by_age, (entry.created_at, browser_id))
+
+    def set_alive(self, browser_id: str, node_id: Optional[str] = None):
+        entry = self.entries.get(browser_id)
+        if entry is None or entry.state == ALIVE:
+            return
+        self.by_state[entry.state].discard(browser_id)
+        entry.state = ALIVE
+        entry.alive_since = time.time()
+        entry.node_id = node_id or entry.node_id
+        self.by_state[ALIVE].add(browser_id)
+
+    def remove(self, browser_id: str):
+        entry = self.entries.pop(browser_id, None)
+        if entry is None:
+            return
+        for item in entry.labels.items():
+            _discard(self.by_label, item, browser_id)
+            _discard(self.by_key, item[0], browser_id)
+        self.by_state[entry.state].discard(browser_id)
+        _discard(self.by_tenant, entry.tenant, browser_id)
+        i = bisect.bisect_left(self.by_age, (entry.created_at, browser_id))
+        if i < len(self.by_age) and self.by_age[i] == (entry.created_at, browser_id):
+            del self.by_age[i]
+
+    def query(self, requirements: List[Requirement] = (), state: Optional[str] = None,
+              min_age: Optional[float] = None, max_age: Optional[float] = None,
+              tenant: Optional[str] = None) -> List[Entry]:
+        """
+        Browsers matching every requirement, in creation order.
+
+        Candidates come from the smallest index hit (tenant, label, state or
+        age range), so only browsers that can match are looked at.
+        """
+        now = time.time()
+        newest = now - min_age if min_age is not None else None
+        oldest = now - max_age if max_age is not None else None
+
+        indexed = []
+        for requirement in requirements:
+            if requirement.op == "in":
+                ids = set().union(*(self.by_label.get((requirement.key, v), ()) for v in requirement.values))
+                indexed.append(ids)
+            elif requirement.op == "exists":
+                indexed.append(self.by_key.get(requirement.key, set()))
+        if state is not None:
+            indexed.append(self.by_state.get(state, set()))
+        if tenant is not None:
+            indexed.append(self.by_tenant.get(tenant, set()))
+
+        if indexed:
+            indexed.sort(key=len)
+            candidates = set(indexed[0])
+            for ids in indexed[1:]:
+                if not candidates:
+                    break
+                candidates &= ids
+        else:
+            # Browser IDs sort between "" and "\uffff", bracketing a timestamp
+            lo = bisect.bisect_left(self.by_age, (oldest, "")) if oldest is not None else 0
+            hi = bisect.bisect_right(self.by_age, (newest, "\uffff")) if newest is not None else len(self.by_age)
+            candidates = [browser_id for _, browser_id in self.by_age[lo:hi]]
+
+        matched = []
+        for browser_id in candidates:
+            entry = self.entries[browser_id]
+            if newest is not None and entry.created_at > newest:
+                continue
+            if oldest is not None and entry.created_at < oldest:
+                continue
+            if all(requirement.matches(entry.labels) for requirement in requirements):
+                matched.append(entry)
+        matched.sort(key=lambda entry: entry.created_at)
+        return matched
+
+    def sync(self, tables: List[dict], unread: Set[str] = frozenset()):
+        """
+        Reconcile with the node probes' status tables.
+
+        Browsers a probe knows about but the registry doesn't (created before
+        an API restart) are added; alive ones no probe knows about any more
+        are dropped. Browsers on nodes in `unread`, whose probe is alive but
+        couldn't be read, are kept until it can.
+        """
+        seen = set()
+        for table in tables:
+            for browser_id, status in table["browsers"].items():
+                if browser_id.startswith(POOL_PREFIX):
+                    continue
+                seen.add(browser_id)
+                entry = self.entries.get(browser_id)
+                if entry is None:
+                    tenant = tenant_of_namespace(status.get("namespace"))
+                    self.add(browser_id, status.get("labels") or {}, ALIVE, status.get("registered_at"), table["node_id"], tenant)
+                elif entry.state == PENDING:
+                    self.set_alive(browser_id, table["node_id"])
+        cutoff = time.time() - PRUNE_GRACE
+        for browser_id in list(self.by_state[ALIVE]):
+            entry = self.entries[browser_id]
+            if browser_id not in seen and entry.alive_since < cutoff and entry.node_id not in unread:
+                self.remove(browser_id)
+
+    async def refresh(self):
+        nodes = await asyncio.to_thread(ray.nodes)
+        probes, unread = [], set()
+        for entry in nodes:
+            if not entry["Alive"]:
+                continue
+            try:
+                probes.append((entry["NodeID"], ray.get_actor(probe_name(entry["NodeID"]))))
+            except ValueError:
+                # Gone idle with no browsers, or not started yet; either way
+                # the node's browsers can't be confirmed dead
+                unread.add(entry["NodeID"])
+        tables = []
+        results = await asyncio.gather(*(probe.snapshot.remote() for _, probe in probes), return_exceptions=True)
+        for (node_id, _), result in zip(probes, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Probe read for node {node_id} failed: {result}")
+                unread.add(node_id)
+            else:
+                tables.append(result)
+        self.sync(tables, unread)
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Browser registry sync failed: {e}")
+            await asyncio.sleep(SYNC_INTERVAL)
+
+
+def _discard(index: dict, key, browser_id: str):
+    ids = index.get(key)
+    if ids is not None:
+        ids.discard(browser_id)
+        if not ids:
+            del index[key]
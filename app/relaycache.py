@@ -0,0 +1,134 @@
+# relaycache.py
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.cdp import Envelope, parse_envelope
+
+# Idempotent CDP methods the proxy may answer from cache, comma-separated,
+# e.g. "DOM.getDocument,Page.getLayoutMetrics,Runtime.evaluate". Empty, the
+# default, turns the cache off.
+CACHE_METHODS = frozenset(
+    method.strip() for method in os.getenv("BROWSERSTATION_CDP_CACHE_METHODS", "").split(",") if method.strip()
+)
+
+# Seconds a cached response is served for, bounding staleness from changes
+# Chrome sends no event about (e.g. DOM mutations without the DOM domain enabled)
+CACHE_TTL = float(os.getenv("BROWSERSTATION_CDP_CACHE_TTL", "5"))
+
+# Responses kept per connection
+CACHE_SIZE = 256
+
+# Events after which cached responses may be stale: navigation, frames coming
+# and going, DOM mutations and execution contexts being replaced
+INVALIDATING_EVENTS = (
+    "DOM.",
+    "Page.frame",
+    "Page.navigatedWithinDocument",
+    "Page.documentOpened",
+    "Page.domContentEventFired",
+    "Page.loadEventFired",
+    "Runtime.executionContext",
+    "Target.targetDestroyed",
+    "Target.detachedFromTarget",
+    "Inspector.detached",
+)
+
+# Methods that are only idempotent when Chrome is asked to refuse side effects
+SIDE_EFFECT_CHECKED = {"Runtime.evaluate"}
+
+
+class RelayCache:
+    """
+    Responses to idempotent CDP commands on one proxied connection.
+
+    Commands in the allowlist are keyed on session, method and the raw params
+    text. A repeat within the TTL is answered by the proxy, with the client's
+    request id, instead of making the round trip to Chrome. Navigation, frame
+    and DOM events from Chrome clear the cache, and so does any command the
+    client sends that isn't cacheable, since it may change what the cached
+    ones return. Runtime.evaluate is only cached with throwOnSideEffect, so
+    Chrome itself refuses expressions that aren't pure.
+    """
+
+    def __init__(self, methods: frozenset = CACHE_METHODS, ttl: float = CACHE_TTL, size: int = CACHE_SIZE):
+        self.methods = methods
+        self.ttl = ttl
+        self.size = size
+        self.entries: "OrderedDict[tuple, Tuple[float, str]]" = OrderedDict()  # key -> (stored at, raw result)
+        self.pending: Dict[int, Tuple[tuple, int]] = {}  # command id -> (key, generation it was sent in)
+        self.generation = 0  # bumped on every invalidation, so responses sent before one aren't stored
+        self.hits = 0
+        self.misses = 0
+
+    def request(self, message: str) -> Optional[str]:
+        """
+        Look at a command from the client.
+
+        Returns:
+            str: Response to send the client instead of forwarding the command, on a hit
+        """
+        envelope = parse_envelope(message)
+        if envelope is None or envelope.method is None or envelope.id is None:
+            return None
+        if not self._cacheable(envelope):
+            self._invalidate()
+            return None
+
+        key = (envelope.session_id, envelope.method, envelope.raw("params"))
+        entry = self.entries.get(key)
+        if entry is not None:
+            if time.monotonic() - entry[0] < self.ttl:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return _response(envelope, entry[1])
+            del self.entries[key]
+        self.misses += 1
+        self.pending[envelope.id] = (key, self.generation)
+        return None
+
+    def response(self, message: str):
+        """Look at a message from Chrome: store responses to cacheable commands, clear on invalidating events"""
+        if not self.pending and not self.entries:
+            return  # nothing to store or to invalidate
+        envelope = parse_envelope(message)
+        if envelope is None:
+            return
+        if envelope.method is not None:
+            if envelope.method.startswith(INVALIDATING_EVENTS):
+                self._invalidate()
+            return
+        pending = self.pending.pop(envelope.id, None) if envelope.id is not None else None
+        if pending is None:
+            return
+        key, generation = pending
+        result = envelope.raw("result")
+        # Errors aren't cached, nor responses that may predate an invalidation
+        if result is None or generation != self.generation:
+            return
+        self.entries[key] = (time.monotonic(), result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    def _cacheable(self, envelope: Envelope) -> bool:
+        if envelope.method not in self.methods:
+            return False
+        if envelope.method in SIDE_EFFECT_CHECKED:
+            return bool((envelope.params or {}).get("throwOnSideEffect"))
+        return True
+
+    def _invalidate(self):
+        self.generation += 1
+        self.entries.clear()
+
+
+def _response(envelope: Envelope, result: str) -> str:
+    """A response to `envelope` with a cached result, spliced from raw JSON without decoding it"""
+    session_id = envelope.raw("sessionId")
+    tail = f',"sessionId":{session_id}' if session_id is not None else ""
+    return f'{{"id":{envelope.raw("id")},"result":{result}{tail}}}'
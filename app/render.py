@@ -0,0 +1,120 @@
+# render.py
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import orjson
+import ray
+
+from app.models import RenderRequest
+from app.pool import BrowserPool
+
+logger = logging.getLogger(__name__)
+
+RENDER_CACHE_SIZE = int(os.getenv("BROWSERSTATION_RENDER_CACHE_SIZE", str(256 * 1024 ** 2)))
+
+MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp", "pdf": "application/pdf"}
+
+# Extra seconds a render may take on top of its page timeout before it is abandoned
+RENDER_GRACE = 15.0
+
+
+def render_key(request: RenderRequest, owner: str) -> str:
+    """Cache key: the tenant, the URL and every option that changes the output"""
+    options = request.model_dump(exclude={"max_age", "timeout"})
+    digest = hashlib.sha256(orjson.dumps(options, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    return f"{owner}/{digest}"
+
+
+class RenderCache:
+    """In-memory LRU of rendered output, bounded by total bytes"""
+
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def get(self, key: str, max_age: float) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry[0] > max_age:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, body: bytes):
+        if len(body) > self.max_size:
+            return
+        self.pop(key)
+        self.entries[key] = (time.time(), body)
+        self.size += len(body)
+        while self.size > self.max_size:
+            self.pop(next(iter(self.entries)))
+
+    def pop(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class Renderer:
+    """
+    Screenshots and PDFs rendered on pooled browsers.
+
+    Identical requests arriving while a render is in flight wait for it
+    instead of starting their own. Renders lease their browser for the
+    requesting tenant, and are cached and shared only within that tenant.
+    """
+
+    def __init__(self, pool: BrowserPool, cache: Optional[RenderCache] = None):
+        self.pool = pool
+        self.cache = cache or RenderCache()
+        self.inflight: Dict[str, asyncio.Task] = {}
+
+    async def render(self, request: RenderRequest, owner: str) -> Tuple[bytes, str]:
+        """
+        Args:
+            request: URL, format and capture options
+            owner: Tenant the pooled browser is leased for
+
+        Returns:
+            tuple: (output, "hit", "merged" or "miss")
+        """
+        key = render_key(request, owner)
+        if request.max_age > 0:
+            body = self.cache.get(key, request.max_age)
+            if body is not None:
+                return body, "hit"
+
+        task = self.inflight.get(key)
+        if task is not None:
+            return await asyncio.shield(task), "merged"
+
+        # The render runs in its own task, so a caller that disconnects
+        # doesn't cancel it for the others waiting on the same key
+        task = asyncio.create_task(self._render(key, request, owner))
+        self.inflight[key] = task
+        task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task), "miss"
+
+    async def _render(self, key: str, request: RenderRequest, owner: str) -> bytes:
+        options = request.model_dump(exclude={"url", "max_age"})
+        for attempt in range(2):
+            member = await self.pool.acquire(owner)
+            try:
+                body = await asyncio.wait_for(member[1].render.remote(request.url, options), request.timeout + RENDER_GRACE)
+            except (ray.exceptions.RayActorError, asyncio.TimeoutError):
+                # The browser is gone or wedged, try once more on another one
+                await self.pool.release(member, owner, healthy=False)
+                if attempt:
+                    raise
+                continue
+            except BaseException:
+                await self.pool.release(member, owner)
+                raise
+            await self.pool.release(member, owner)
+            self.cache.put(key, body)
+            return body
@@ -1,69 +1,314 @@
 # routes.py
 import os
-from fastapi import APIRouter, WebSocket, HTTPException, Depends
+from fastapi import APIRouter, WebSocket, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.security import APIKeyHeader
 from .service import BrowserService
+from .tenants import Tenant, Tenants, load_tenants
+from . import admin
 
-from app.models import Health, ActorInfo, BrowserList, BrowserInfo, BrowserStatus 
-
-router = APIRouter()
-service = BrowserService()
+from typing import Optional
 
+from app.models import Health, ActorInfo, BrowserList, BrowserInfo, BrowserStatus, BrowserStatusList, BrowserOptions, Demand, SnapshotInfo, SnapshotList, SnapshotStatus, JobRequest, JobInfo, JobList, RenderRequest, ExtractRequest, ExtractResult, DrainRequest, DrainStatus, UsageList, LoopLag, TaskDump
 
 API_KEY = os.getenv("BROWSERSTATION_API_KEY")
 
+# API keys map to tenants (BROWSERSTATION_TENANTS), or all to "default"
+tenants = Tenants(load_tenants(api_key=API_KEY))
+
+router = APIRouter()
+service = BrowserService(tenants)
+
 # API key authentication using FastAPI security
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
-async def verify_api_key(api_key: str = Depends(api_key_header)):
-    """Verify API key from X-API-Key header"""
-    if API_KEY and api_key != API_KEY:
+async def verify_api_key(api_key: str = Depends(api_key_header)) -> Tenant:
+    """Resolve the X-API-Key header to its tenant"""
+    tenant = tenants.for_key(api_key)
+    if tenant is None:
         raise HTTPException(status_code=401, detail="Invalid API key")
-    return api_key
+    return tenant
+
+async def verify_operator(tenant: Tenant = Depends(verify_api_key)) -> Tenant:
+    """Cluster-wide operations are limited to admin tenants"""
+    if not tenant.admin:
+        raise HTTPException(status_code=403, detail="Not allowed for this tenant")
+    return tenant
+
+async def require_ray():
+    """Routes that reach Ray return 503 while the API is not connected to it"""
+    if not service.cluster.connected:
+        raise HTTPException(status_code=503, detail=f"Ray unavailable: {service.cluster.status()}", headers={"Retry-After": "5"})
+
+ADMIN_KEY = os.getenv("BROWSERSTATION_ADMIN_KEY")
+
+admin_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
+
+async def verify_admin_key(admin_key: str = Depends(admin_key_header)):
+    """Admin endpoints only exist when BROWSERSTATION_ADMIN_KEY is set"""
+    if not ADMIN_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if admin_key != ADMIN_KEY:
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+    return admin_key
 
 @router.get("/", response_model=Health)
 async def health():
     """Health check endpoint."""
     return await service.health()
 
-@router.post("/browsers", dependencies=[Depends(verify_api_key)], response_model=ActorInfo)
-async def create_browser():
-    """Create a new browser instance."""
-    return await service.create_browser()
+@router.get("/demand", dependencies=[Depends(verify_operator), Depends(require_ray)], response_model=Demand)
+async def demand():
+    """Demand for browser slots, as used to drive autoscaling."""
+    return await service.demand()
+
+@router.post("/browsers", dependencies=[Depends(verify_api_key), Depends(require_ray)], response_model=ActorInfo)
+async def create_browser(options: Optional[BrowserOptions] = None, tenant: Tenant = Depends(verify_api_key)):
+    """
+    Create a new browser instance.
+
+    Args:
+        options: Session options applied before the browser is returned
+    """
+    return await service.create_browser(options or BrowserOptions(), tenant)
+
+@router.get("/browsers", dependencies=[Depends(verify_api_key), Depends(require_ray)], response_model=BrowserList)
+async def list_browsers(
+    selector: Optional[str] = None,
+    state: Optional[str] = Query(None, pattern="^(ALIVE|PENDING)$"),
+    min_age: Optional[float] = Query(None, ge=0),
+    max_age: Optional[float] = Query(None, ge=0),
+    tenant: Tenant = Depends(verify_api_key),
+):
+    """
+    List browser instances, optionally filtered.
+
+    Args:
+        selector: Label selector, e.g. "team=search,job in (a,b),!debug"
+        state: ALIVE or PENDING
+        min_age: Only browsers created at least this many seconds ago
+        max_age: Only browsers created at most this many seconds ago
+    """
+    return await service.list_browsers(tenant, selector, state, min_age, max_age)
+
+@router.delete("/browsers", dependencies=[Depends(verify_api_key), Depends(require_ray)], response_model=BrowserStatusList)
+async def close_browsers(
+    selector: str,
+    state: Optional[str] = Query(None, pattern="^(ALIVE|PENDING)$"),
+    min_age: Optional[float] = Query(None, ge=0),
+    max_age: Optional[float] = Query(None, ge=0),
+    tenant: Tenant = Depends(verify_api_key),
+):
+    """
+    Close every browser matching a label selector, e.g. all sessions of a job.
 
-@router.get("/browsers", dependencies=[Depends(verify_api_key)], response_model=BrowserList)
-async def list_browsers():
-    """List all browser instances and cluster CPU stats."""
-    return await service.list_browsers()
+    Args:
+        selector: Label selector, required
+        state: ALIVE or PENDING
+        min_age: Only browsers created at least this many seconds ago
+        max_age: Only browsers created at most this many seconds ago
+    """
+    return await service.delete_browsers(tenant, selector, state, min_age, max_age)
 
-@router.get("/browsers/{browser_id}", dependencies=[Depends(verify_api_key)], response_model=BrowserInfo)
-async def get_browser(browser_id: str):
+@router.get("/browsers/{browser_id}", dependencies=[Depends(verify_api_key), Depends(require_ray)], response_model=BrowserInfo)
+async def get_browser(browser_id: str, wait: float = Query(0, ge=0, le=60), tenant: Tenant = Depends(verify_api_key)):
     """
     Get information about a specific browser instance.
     
     Args:
         browser_id: UUID of the browser instance
+        wait: Seconds to hold the request until Chrome is ready (long-poll)
     """
-    return await service.get_browser(browser_id)
+    return await service.get_browser(browser_id, tenant, wait)
 
-@router.delete("/browsers/{browser_id}", dependencies=[Depends(verify_api_key)], response_model=BrowserStatus)
-async def close_browser(browser_id: str):
+@router.delete("/browsers/{browser_id}", dependencies=[Depends(verify_api_key), Depends(require_ray)], response_model=BrowserStatus)
+async def close_browser(browser_id: str, tenant: Tenant = Depends(verify_api_key)):
     """
     Close and delete a browser instance.
     
     Args:
         browser_id: UUID of the browser instance to close
     """
-    return await service.delete_browser(browser_id)
+    return await service.delete_browser(browser_id, tenant)
+
+@router.post("/browsers/{browser_id}/snapshot", dependencies=[Depends(verify_api_key), Depends(require_ray)], response_model=SnapshotInfo)
+async def snapshot_browser(browser_id: str, tenant: Tenant = Depends(verify_api_key)):
+    """
+    Capture cookies, localStorage, IndexedDB and service workers of a browser.
+
+    Args:
+        browser_id: UUID of the browser instance
+    """
+    return await service.snapshot_browser(browser_id, tenant)
+
+@router.post("/browsers/{browser_id}/extract", dependencies=[Depends(verify_api_key), Depends(require_ray)], response_model=ExtractResult)
+async def extract(browser_id: str, request: Optional[ExtractRequest] = None, tenant: Tenant = Depends(verify_api_key)):
+    """
+    Compact view of a page for agents: interactive elements and visible text.
+
+    Repeated calls for the same page return only what changed.
+
+    Args:
+        browser_id: UUID of the browser instance
+        request: Page, diff mode and text budget
+    """
+    return await service.extract(browser_id, request or ExtractRequest(), tenant)
+
+@router.get("/snapshots", dependencies=[Depends(verify_api_key)], response_model=SnapshotList)
+async def list_snapshots(tenant: Tenant = Depends(verify_api_key)):
+    """List stored profile snapshots."""
+    return await service.list_snapshots(tenant)
+
+@router.delete("/snapshots/{snapshot_id}", dependencies=[Depends(verify_api_key)], response_model=SnapshotStatus)
+async def delete_snapshot(snapshot_id: str, tenant: Tenant = Depends(verify_api_key)):
+    """
+    Delete a profile snapshot.
+
+    Args:
+        snapshot_id: ID returned by POST /browsers/{browser_id}/snapshot
+    """
+    return await service.delete_snapshot(snapshot_id, tenant)
+
+@router.post("/jobs", dependencies=[Depends(verify_api_key), Depends(require_ray)], response_model=JobInfo)
+async def create_job(request: JobRequest, tenant: Tenant = Depends(verify_api_key)):
+    """
+    Fetch a list of URLs on pooled browsers.
+
+    Args:
+        request: URLs, content to extract, concurrency, retries and page timeout
+    """
+    return await service.create_job(request, tenant)
+
+@router.get("/jobs", dependencies=[Depends(verify_api_key)], response_model=JobList)
+async def list_jobs(tenant: Tenant = Depends(verify_api_key)):
+    """List page-fetch jobs and their progress."""
+    return await service.list_jobs(tenant)
+
+@router.get("/jobs/{job_id}", dependencies=[Depends(verify_api_key)], response_model=JobInfo)
+async def get_job(job_id: str, tenant: Tenant = Depends(verify_api_key)):
+    """
+    Get the progress of a page-fetch job.
+
+    Args:
+        job_id: ID returned by POST /jobs
+    """
+    return await service.get_job(job_id, tenant)
+
+@router.get("/jobs/{job_id}/results", dependencies=[Depends(verify_api_key)])
+async def job_results(job_id: str, offset: int = Query(0, ge=0), tenant: Tenant = Depends(verify_api_key)):
+    """
+    Stream job results as NDJSON, one line per URL in completion order.
+
+    Follows the job until it finishes.
+
+    Args:
+        job_id: ID returned by POST /jobs
+        offset: Result lines to skip, to resume an interrupted stream
+    """
+    return StreamingResponse(await service.job_results(job_id, tenant, offset), media_type="application/x-ndjson")
+
+@router.delete("/jobs/{job_id}", dependencies=[Depends(verify_api_key)], response_model=JobInfo)
+async def cancel_job(job_id: str, tenant: Tenant = Depends(verify_api_key)):
+    """
+    Cancel a running page-fetch job. Results so far are kept.
+
+    Args:
+        job_id: ID returned by POST /jobs
+    """
+    return await service.cancel_job(job_id, tenant)
+
+@router.post("/render", dependencies=[Depends(verify_api_key), Depends(require_ray)], response_class=Response)
+async def render(request: RenderRequest, tenant: Tenant = Depends(verify_api_key)):
+    """
+    Screenshot or PDF of a page, rendered on a pooled browser.
+
+    Identical requests within `max_age` seconds are served from cache, and
+    concurrent ones share a single render.
+
+    Args:
+        request: URL, format, viewport and capture options
+    """
+    return await service.render(request, tenant)
+
+@router.post("/nodes/{node}/drain", dependencies=[Depends(verify_operator), Depends(require_ray)], response_model=DrainStatus)
+async def drain_node(node: str, request: Optional[DrainRequest] = None):
+    """
+    Stop placing browsers on a node and wind down the sessions on it.
+
+    Idle pool members there are replaced, CDP clients get a
+    BrowserStation.drainScheduled event, and browsers left at the deadline
+    are killed. Draining again moves the deadline.
+
+    Args:
+        node: Ray node ID or IP address
+        request: Seconds until the deadline
+    """
+    return await service.drain_node(node, request or DrainRequest())
+
+@router.get("/nodes/{node}/drain", dependencies=[Depends(verify_operator), Depends(require_ray)], response_model=DrainStatus)
+async def get_drain(node: str):
+    """
+    Drain progress of a node: its state, deadline and the browsers still on it.
+
+    Args:
+        node: Ray node ID or IP address
+    """
+    return await service.get_drain(node)
+
+@router.delete("/nodes/{node}/drain", dependencies=[Depends(verify_operator), Depends(require_ray)], response_model=DrainStatus)
+async def cancel_drain(node: str):
+    """
+    Put a draining node back into service.
+
+    Args:
+        node: Ray node ID or IP address
+    """
+    return await service.cancel_drain(node)
+
+@router.get("/usage", response_model=UsageList)
+async def usage(tenant: Tenant = Depends(verify_api_key)):
+    """Sessions and CPUs in use against quota: the caller's tenant, or every tenant for admins."""
+    return await service.usage(tenant)
+
+@router.get("/admin/profile", dependencies=[Depends(verify_admin_key)], response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, le=admin.MAX_PROFILE_SECONDS),
+    mode: str = Query("wall", pattern="^(wall|cpu)$"),
+    interval: float = Query(0.005, ge=0.001, le=1),
+):
+    """
+    Sampling profile of the API process as folded stacks, for flamegraph tools.
+
+    Args:
+        seconds: How long to sample
+        mode: "wall" for all samples, "cpu" for samples of threads running on CPU
+        interval: Seconds between samples
+    """
+    return await service.profile(seconds, mode, interval)
+
+@router.get("/admin/tasks", dependencies=[Depends(verify_admin_key)], response_model=TaskDump)
+async def tasks():
+    """Asyncio tasks of the API process and open CDP relays."""
+    return admin.dump_tasks()
+
+@router.get("/admin/loop", dependencies=[Depends(verify_admin_key)], response_model=LoopLag)
+async def loop_lag():
+    """Event loop lag of the API process."""
+    return admin.lag_monitor.stats()
 
 @router.websocket("/ws/browsers/{browser_id}/{path:path}")
 async def websocket_proxy(websocket: WebSocket, browser_id: str, path: str):
     """
     WebSocket proxy to Chrome DevTools Protocol.
+
+    The API key is required like on every other route, and only the key's
+    tenant's browsers can be reached. Browsers can't set headers on a
+    WebSocket, so the key may also come as the `api_key` query parameter.
     
     Args:
         websocket: FastAPI WebSocket connection
         browser_id: UUID of the browser instance
         path: Chrome DevTools path (e.g., "devtools/browser")
     """
-    await service.websocket_proxy(websocket, browser_id, path)
+    tenant = tenants.for_key(websocket.headers.get("X-API-Key") or websocket.query_params.get("api_key"))
+    await service.websocket_proxy(websocket, browser_id, path, tenant)
@@ -1,58 +1,356 @@
 # service.py
+import os
+import re
 import uuid
+import hashlib
+from typing import Optional
 import ray
-from ray.util.state import list_actors
 import logging
 import httpx
-from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect, Response
 
 import asyncio
+import orjson
 import websockets
-from fastapi import WebSocketDisconnect
 
-from app.models import Health, ActorInfo, BrowserList, BrowserInfo, BrowserStatus 
-from app.lib import fetch_ws
+from app.models import (
+    Health, ActorInfo, BrowserList, BrowserInfo, BrowserStatus, BrowserStatusList, BrowserOptions,
+    SnapshotList, SnapshotStatus, JobRequest, JobList, RenderRequest, ExtractRequest, ExtractResult,
+    DrainRequest, DrainStatus, Usage, UsageList,
+)
+from app.lib import fetch_ws, proxy_path
+from app.cdp import CDPSession, CDPError
+from app.cache import NodeCache
+from app.intercept import RequestInterceptor
+from app.context import SessionContext, RelayScope
+from app.probe import get_node_probe, probe_name
+from app.autoscale import BROWSER_RESOURCE, demand
+from app.pages import fetch, render
+from app.extract import page_state, default_target, diff_state
+from app.pool import BrowserPool, QuotaExceeded
+from app.profiles import node_profile, chrome_memory, profile_resources
+from app.drain import Drains, DRAIN_EVENT, resolve_node, read_drain
+from app.evictions import Evictions
+from app.relaycache import RelayCache, CACHE_METHODS
+from app.cluster import RayConnection
+from app.governor import EVICTED_CLOSE_CODE
+from app.registry import BrowserRegistry, ALIVE, parse_selector
+from app.tenants import Tenant, Tenants, DEFAULT_TENANT, SESSION_CPUS
+from app.jobs import JobManager
+from app.render import Renderer, MEDIA_TYPES
+from app import tracing, admin
+from app.snapshot import STORE_DIR, NodeSnapshotCache, SnapshotStore, capture, restore, encode_snapshot, decode_snapshot, digest, summarize
 
 logger = logging.getLogger(__name__)
 
-@ray.remote(num_cpus=1)
+# Proxy paths of page-level DevTools connections, with the page's target ID
+PAGE_PATH = re.compile(r"^devtools/page/([^/?#]+)")
+
+# How long session setup waits for the Chrome sidecar to come up
+START_TIMEOUT = 30.0
+
+# How long a new browser may wait for a node to be placed on, including
+# autoscaling one up; a profile no worker group offers would wait forever
+PLACEMENT_TIMEOUT = float(os.getenv("BROWSERSTATION_PLACEMENT_TIMEOUT", "300"))
+
+# Browsers closed at once by a bulk delete
+DELETE_CONCURRENCY = 32
+
+@ray.remote(num_cpus=0, resources={BROWSER_RESOURCE: 1})
 class BrowserActor:
     """Actor to manage a single Chrome instance on a worker node"""
     
-    def __init__(self, browser_id: str):
+    def __init__(self, browser_id: str, namespace: Optional[str] = None):
         """
         Initialize browser actor.
         
         Args:
             browser_id: Unique identifier for this browser instance
+            namespace: Ray namespace the actor is named in, when not the creating job's
         """
         self.browser_id = browser_id
+        # The runtime context only knows the job's namespace, not the one the actor was named in
+        self.namespace = namespace or ray.get_runtime_context().namespace
         self.pod_ip = ray.util.get_node_ip_address()
+        self.node_id = ray.get_runtime_context().get_node_id()
+        self.profile = node_profile()
+        self.probe = None
+        self.cdp = None
+        self.context = None  # the session's browser contexts in the shared Chrome
+        self.interceptor = None
+        self.extracted = {}  # target_id -> last page state returned by extract
+        tracing.setup("browserstation-actor")
+
+    async def start(self, options: BrowserOptions, snapshot: Optional[list] = None, trace: Optional[dict] = None):
+        """
+        Apply session options through CDP before the browser is handed out.
+
+        Args:
+            options: Options from POST /browsers
+            snapshot: [snapshot_id, ObjectRef] of the profile to restore. Nested
+                in a list so Ray doesn't fetch the blob when the node has it cached.
+            trace: Caller's trace context, see app.tracing.inject
+
+        Returns:
+            BrowserInfo: Browser details once setup is complete
+        """
+        with tracing.remote_span("BrowserActor.start", trace, browser_id=self.browser_id):
+            with tracing.span("probe.register"):
+                await self._register(options.labels)
+
+            if snapshot is not None:
+                with tracing.span("snapshot.restore", snapshot_id=snapshot[0]):
+                    await self._restore(*snapshot)
+            if options.shared_cache or options.resource_policy:
+                cdp = await self._connect()
+                self.interceptor = RequestInterceptor(
+                    cdp,
+                    self.context,
+                    cache=NodeCache() if options.shared_cache else None,
+                    policy=options.resource_policy,
+                )
+                with tracing.span("interceptor.enable"):
+                    await self.interceptor.enable()
+            return await self._info()
+
+    async def _restore(self, snapshot_id: str, ref: ray.ObjectRef):
+        cache = NodeSnapshotCache()
+        blob = await asyncio.to_thread(cache.get, snapshot_id)
+        if blob is None:
+            blob = await ref
+            await asyncio.to_thread(cache.put, snapshot_id, blob)
+        cdp = await self._connect()
+        await restore(cdp, decode_snapshot(blob), self.context.id)
+
+    async def snapshot(self):
+        """
+        Capture cookies and site storage of the running session.
+
+        Returns:
+            tuple: (snapshot_id, compressed blob, summary)
+        """
+        cdp = await self._connect()
+        state = await capture(cdp, self.context)
+        blob = encode_snapshot(state)
+        snapshot_id = digest(blob)
+        # Sessions restored on this node later skip the object store fetch
+        await asyncio.to_thread(NodeSnapshotCache().put, snapshot_id, blob)
+        return snapshot_id, blob, summarize(state)
+
+    async def _register(self, labels: dict):
+        """Let the node's probe keep this browser's status (and labels) fresh for listings"""
+        # Registered by actor name, which is what the probe reconciles against
+        # (pool members are named with a prefix on top of their browser ID)
+        name = ray.get_runtime_context().get_actor_name() or self.browser_id
+        try:
+            self.probe = get_node_probe()
+            await self.probe.register.remote(name, self.pod_ip, labels, self.namespace)
+        except ray.exceptions.RayActorError:
+            # The probe exited while idle just as we looked it up
+            self.probe = get_node_probe()
+            await self.probe.register.remote(name, self.pod_ip, labels, self.namespace)
+
+    async def _connect(self):
+        """Open the actor's own browser-level CDP connection and the session's browser context, once"""
+        if self.cdp is None or self.cdp.closed:
+            with tracing.span("cdp.connect"):
+                info = await self._wait_ready(START_TIMEOUT)
+                if not info.chrome_ready:
+                    raise RuntimeError("Chrome not ready")
+                self.cdp = await CDPSession.connect(await fetch_ws(self.pod_ip))
+            with tracing.span("context.create"):
+                # A context from an earlier connection was disposed with it
+                self.context = SessionContext(self.cdp)
+                await self.context.create()
+            await self._report_contexts()
+            if self.interceptor is not None:
+                self.interceptor = RequestInterceptor(self.cdp, self.context, self.interceptor.cache, self.interceptor.policy)
+                await self.interceptor.enable()
+        if self.probe is not None:
+            # Work done here never crosses the proxy; keeps the session from looking idle
+            self.probe.touch.remote(ray.get_runtime_context().get_actor_name() or self.browser_id)
+        return self.cdp
         
-    async def get_info(self):
+    async def fetch_page(self, url: str, extract: list, timeout: float = 30.0):
+        """
+        Load a page in a new tab and extract its content, next to Chrome.
+
+        Args:
+            url: Page to load
+            extract: Any of "html", "text"
+            timeout: Seconds to wait for the load event
+
+        Returns:
+            dict: {"final_url", "title", "status", "loaded", <extract>...}
+        """
+        cdp = await self._connect()
+        return await fetch(cdp, url, extract, timeout, self.context.id)
+
+    async def render(self, url: str, options: dict):
+        """
+        Load a page in a new tab and capture a screenshot or PDF, next to Chrome.
+
+        Args:
+            url: Page to load
+            options: RenderRequest fields other than url and max_age
+
+        Returns:
+            bytes: Image or PDF
+        """
+        cdp = await self._connect()
+        return await render(cdp, url, options, self.context.id)
+
+    async def extract(self, request: ExtractRequest):
+        """
+        Interactive elements and visible text of a page, computed next to Chrome.
+
+        Args:
+            request: Page, diff mode and text budget
+
+        Returns:
+            ExtractResult: Full state, or changes since the last extract of the page
+        """
+        cdp = await self._connect()
+        # Only the session's pages; the Chrome is shared with other sessions
+        pages = [t for t in await self.context.targets() if t["type"] == "page"]
+        if request.target_id is not None and request.target_id not in {t["targetId"] for t in pages}:
+            raise ValueError("Page not found in this browser")
+        target_id = request.target_id or default_target(pages)
+        if target_id is None:
+            raise ValueError("No page open")
+        current = await page_state(cdp, target_id, request.max_text)
+        previous = self.extracted.get(target_id) if request.diff else None
+
+        # Forget pages that have been closed
+        open_targets = {t["targetId"] for t in pages}
+        self.extracted = {t: s for t, s in self.extracted.items() if t in open_targets}
+        self.extracted[target_id] = current
+        return ExtractResult(target_id=target_id, **diff_state(previous, current))
+
+    async def get_info(self, trace: Optional[dict] = None, memory: bool = False, context: bool = False):
         """
         Get browser connection information.
+
+        Args:
+            trace: Caller's trace context, see app.tracing.inject
+            memory: Also measure Chrome's resident memory, which scans the pod's processes
+            context: Create the session's browser context if Chrome is ready, for the proxy
         
         Returns:
             BrowserInfo: Browser details including ID, pod IP, WebSocket URL, and readiness status
         """
-        ws_url = await fetch_ws(self.pod_ip)
+        with tracing.remote_span("BrowserActor.get_info", trace, browser_id=self.browser_id):
+            info = await self._info()
+            if context and info.chrome_ready and self.context is None:
+                await self._connect()
+                info = await self._info()
+            return await self._measured(info, memory)
+
+    async def adopt_context(self, context_id: str):
+        """Count a browser context the client created through the proxy as the session's"""
+        if self.context is not None:
+            self.context.adopt(context_id)
+            await self._report_contexts()
+
+    async def _report_contexts(self):
+        """Tell the probe the session's contexts, so evicting it closes them"""
+        if self.probe is not None:
+            name = ray.get_runtime_context().get_actor_name() or self.browser_id
+            await self.probe.contexts.remote(name, sorted(self.context.ids))
+
+    async def owns_target(self, target_id: str) -> bool:
+        """Whether a target is in one of the session's contexts, for page-level proxy connections"""
+        cdp = await self._connect()
+        try:
+            info = (await cdp.send("Target.getTargetInfo", {"targetId": target_id}))["targetInfo"]
+        except CDPError:
+            return False
+        return self.context.owns(info)
+
+    async def watch_target(self, target_id: str):
+        """Start intercepting a page the client created, before the client is told about it"""
+        if self.interceptor is not None:
+            await self.interceptor.watch_target(target_id)
+
+    async def _info(self):
+        with tracing.span("fetch_ws"):
+            ws_url = await fetch_ws(self.pod_ip)
         return BrowserInfo(
             browser_id=self.browser_id,
             pod_ip=self.pod_ip,
-            websocket_url=f"/ws/browsers/{self.browser_id}{ws_url.split('9222')[-1]}" if ws_url else None,
-            chrome_ready=bool(ws_url)
+            websocket_url=proxy_path(self.browser_id, ws_url),
+            chrome_ready=bool(ws_url),
+            cache=self.interceptor.cache_stats() if self.interceptor else None,
+            blocked=self.interceptor.blocked_stats() if self.interceptor else None,
+            node_id=self.node_id,
+            profile=self.profile,
+            browser_context_id=self.context.id if self.context else None,
         )
 
+    async def _measured(self, info: BrowserInfo, memory: bool):
+        if memory and info.chrome_ready:
+            info.memory = await asyncio.to_thread(chrome_memory)
+        return info
+
+    async def wait_ready(self, timeout: float, trace: Optional[dict] = None, memory: bool = False):
+        """
+        Wait until Chrome answers, probing locally so clients can long-poll.
+
+        Args:
+            timeout: Maximum seconds to wait
+            trace: Caller's trace context, see app.tracing.inject
+            memory: Also measure Chrome's resident memory once ready
+
+        Returns:
+            BrowserInfo: Latest browser details, ready or not
+        """
+        with tracing.remote_span("BrowserActor.wait_ready", trace, browser_id=self.browser_id):
+            return await self._measured(await self._wait_ready(timeout), memory)
+
+    async def _wait_ready(self, timeout: float):
+        deadline = asyncio.get_running_loop().time() + timeout
+        delay = 0.05
+        while True:
+            info = await self._info()
+            remaining = deadline - asyncio.get_running_loop().time()
+            if info.chrome_ready or remaining <= 0:
+                return info
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 1.0)
+
+    async def close(self):
+        """Release node-level registrations and the CDP connection before the actor is killed"""
+        if self.probe is not None:
+            await self.probe.unregister.remote(ray.get_runtime_context().get_actor_name() or self.browser_id)
+        if self.context is not None and not self.cdp.closed:
+            await self.context.dispose()
+        if self.cdp is not None:
+            await self.cdp.close()
+        await asyncio.to_thread(tracing.flush)
+
 
 class BrowserService:
     """Service to manage browser instances"""
     
-    def __init__(self):
-        pass
+    def __init__(self, tenants: Tenants):
+        self.tenants = tenants
+        self.cluster = RayConnection()
+        self.snapshot_stores = {}  # tenant name -> SnapshotStore
+        self.drains = Drains()
+        self.registry = BrowserRegistry()
+        self.evictions = Evictions(self.registry)
+        self.pool = BrowserPool(BrowserActor, drains=self.drains, quota=self._refusal)
+        self.jobs = JobManager(self.pool)
+        self.renderer = Renderer(self.pool)
+        self.profiling = asyncio.Lock()
     
 
     async def health(self):
+        if not self.cluster.connected:
+            # Served while Ray comes up or is away, the process itself is fine
+            return Health(status="degraded", ray_status=False, ray=self.cluster.status(), browsers={}, cluster={}, available={})
+        from ray.util.state import list_actors
+
         try:
             ray_status = ray.is_initialized()
             
@@ -78,6 +376,7 @@ class BrowserService:
             return Health(
                 status="healthy", 
                 ray_status=ray_status, 
+                ray=self.cluster.status(),
                 browsers=browser_states,
                 cluster=cluster,
                 available=available
@@ -88,14 +387,90 @@ class BrowserService:
     
 
 
-    async def create_browser(self):
+    async def demand(self):
+        try:
+            return await asyncio.to_thread(demand)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Demand unavailable: {e}")
+
+
+    def _snapshots(self, tenant: Tenant) -> SnapshotStore:
+        """Each tenant sees only its own snapshots"""
+        store = self.snapshot_stores.get(tenant.name)
+        if store is None:
+            path = STORE_DIR if tenant.name == DEFAULT_TENANT else os.path.join(STORE_DIR, "tenants", tenant.name)
+            store = self.snapshot_stores[tenant.name] = SnapshotStore(path)
+        return store
+
+
+    def _actor(self, browser_id: str, tenant: Tenant):
+        """The tenant's browser actor; ValueError if it has none by that ID"""
+        # Browser IDs are always UUIDs; node probes and pool members share the
+        # namespace under other names and must not be reachable as browsers
+        uuid.UUID(browser_id)
+        with tracing.span("ray.get_actor"):
+            return ray.get_actor(browser_id, namespace=tenant.namespace)
+
+
+    def _not_found(self, browser_id: str) -> HTTPException:
+        # Evicted browsers say why they are gone
+        return HTTPException(status_code=404, detail=self.evictions.reason(browser_id) or "Browser not found")
+
+    def _sessions(self, tenant: str) -> int:
+        """Browsers and pool leases a tenant holds, which count against its quota alike"""
+        return self.registry.count(tenant) + self.pool.leases[tenant]
+
+    def _refusal(self, tenant: str) -> Optional[str]:
+        """Why a tenant can't take one more session or pool lease, None if it can"""
+        quota = self.tenants.tenants.get(tenant)
+        if quota is None:
+            return f"Unknown tenant {tenant}"
+        return quota.admits(self._sessions(tenant))
+
+    def _forget(self, browser_id: str, tenant: Tenant):
+        entry = self.registry.entries.get(browser_id)
+        if entry is not None and entry.tenant == tenant.name:
+            self.registry.remove(browser_id)
+
+
+    async def create_browser(self, options: BrowserOptions, tenant: Tenant):
+        # Checked and counted before the first await, so concurrent creates can't overshoot
+        refusal = self._refusal(tenant.name)
+        if refusal is not None:
+            raise HTTPException(status_code=429, detail=refusal)
+
+        snapshot = None
+        if options.from_snapshot:
+            ref = self._snapshots(tenant).ref(options.from_snapshot)
+            if ref is None:
+                raise HTTPException(status_code=404, detail="Snapshot not found")
+            snapshot = [options.from_snapshot, ref]
+
         browser_id = str(uuid.uuid4())
         
         # Create the actor with a name
-        actor = BrowserActor.options(name=browser_id, lifetime="detached").remote(browser_id)
+        with tracing.span("BrowserActor.create", browser_id=browser_id):
+            actor = BrowserActor.options(
+                name=browser_id, namespace=tenant.namespace, lifetime="detached",
+                resources={BROWSER_RESOURCE: 1, **profile_resources(options.profile)},
+                scheduling_strategy=self.drains.strategy(),
+            ).remote(browser_id, tenant.namespace)
+        self.registry.add(browser_id, options.labels, tenant=tenant.name)
         
-        # Verify it was created by calling a method
-        await actor.get_info.remote()
+        # Apply session options, which also verifies the actor was created
+        try:
+            info = await asyncio.wait_for(actor.start.remote(options, snapshot, trace=tracing.inject()), PLACEMENT_TIMEOUT)
+        except (Exception, asyncio.CancelledError) as e:
+            # Killing the actor also drops its pending placement, and removing it frees the quota slot;
+            # a cancelled request would otherwise leave a detached browser nobody knows the ID of
+            ray.kill(actor)
+            self.registry.remove(browser_id)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            if isinstance(e, asyncio.TimeoutError):
+                raise HTTPException(status_code=503, detail=f"No node for the browser within {PLACEMENT_TIMEOUT:g}s")
+            raise HTTPException(status_code=503, detail=f"Browser setup failed: {e}")
+        self.registry.set_alive(browser_id, info.node_id)
         
         return ActorInfo(
             browser_id=browser_id,
@@ -104,84 +479,360 @@ class BrowserService:
   
 
 
-    async def list_browsers(self):
-        # Get alive and pending actors
-        alive_actors = list_actors(filters=[("class_name", "=", "BrowserActor"), ("state", "=", "ALIVE")])
-        pending_actors = list_actors(filters=[("class_name", "=", "BrowserActor"), ("state", "=", "PENDING_CREATION")])
-        
+    async def list_browsers(self, tenant: Tenant, selector: Optional[str] = None, state: Optional[str] = None,
+                            min_age: Optional[float] = None, max_age: Optional[float] = None):
+        entries = self.registry.query(self._requirements(selector), state, min_age, max_age, tenant.name)
 
-        async def get_browser_info(actor):
-            actor_handle = ray.get_actor(actor.name)
-            info = await actor_handle.get_info.remote()
-            return {"browser_id": actor.name, "state": "ALIVE", "websocket_url": info.websocket_url}
-          
-        
-        alive_browsers = [await get_browser_info(actor) for actor in alive_actors]
-        pending_browsers = [{"browser_id": actor.name, "state": "PENDING", "websocket_url": None} for actor in pending_actors]
-        
-        return BrowserList(browsers=alive_browsers + pending_browsers)
+        # One status table read per node instead of one get_info per browser
+        nodes = {entry.node_id for entry in entries if entry.state == ALIVE}
+        tables = await asyncio.gather(*(self._read_probe(node_id) for node_id in nodes))
+        status = {}
+        for table in tables:
+            status.update(table)
+
+        def browser_entry(entry):
+            path = (status.get(entry.browser_id) or {}).get("path")
+            return {
+                "browser_id": entry.browser_id,
+                "state": entry.state,
+                "websocket_url": f"/ws/browsers/{entry.browser_id}{path}" if path else None,
+                "labels": entry.labels,
+                "created_at": entry.created_at,
+                "node_id": entry.node_id,
+            }
+
+        return BrowserList(browsers=[browser_entry(entry) for entry in entries])
+
+
+    def _requirements(self, selector: Optional[str]):
+        try:
+            return parse_selector(selector or "")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     
-    async def get_browser(self, browser_id: str):
+    async def _read_probe(self, node_id: str):
+        """Read a node's probe table, empty if the probe isn't up yet"""
+        try:
+            probe = ray.get_actor(probe_name(node_id))
+            table = await probe.snapshot.remote()
+            return table["browsers"]
+        except Exception as e:
+            logger.warning(f"Probe read for node {node_id} failed: {e}")
+            return {}
+
+    async def get_browser(self, browser_id: str, tenant: Tenant, wait: float = 0):
+        try:
+            actor = self._actor(browser_id, tenant)
+            if wait > 0:
+                return await actor.wait_ready.remote(wait, trace=tracing.inject(), memory=True)
+            return await actor.get_info.remote(trace=tracing.inject(), memory=True)
+        except ValueError:
+            raise self._not_found(browser_id)
+
+
+    async def snapshot_browser(self, browser_id: str, tenant: Tenant):
+        try:
+            actor = self._actor(browser_id, tenant)
+        except ValueError:
+            raise self._not_found(browser_id)
+        try:
+            snapshot_id, blob, summary = await actor.snapshot.remote()
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Snapshot failed: {e}")
+        return await asyncio.to_thread(self._snapshots(tenant).add, snapshot_id, blob, summary)
+
+
+    async def list_snapshots(self, tenant: Tenant):
+        return SnapshotList(snapshots=await asyncio.to_thread(self._snapshots(tenant).list))
+
+
+    async def delete_snapshot(self, snapshot_id: str, tenant: Tenant):
+        if not await asyncio.to_thread(self._snapshots(tenant).delete, snapshot_id):
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+        return SnapshotStatus(snapshot_id=snapshot_id, status="deleted")
+
+
+    async def create_job(self, request: JobRequest, tenant: Tenant):
+        # A job waits for quota as it leases browsers, but one that can't start at all is refused
+        refusal = self._refusal(tenant.name)
+        if refusal is not None:
+            raise HTTPException(status_code=429, detail=refusal)
+        return self.jobs.create(request, tenant.name)
+
+
+    async def list_jobs(self, tenant: Tenant):
+        return JobList(jobs=[job.info() for job in self.jobs.owned_by(tenant.name)])
+
+
+    async def get_job(self, job_id: str, tenant: Tenant):
+        job = self.jobs.get(job_id, tenant.name)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job.info()
+
+
+    async def job_results(self, job_id: str, tenant: Tenant, offset: int = 0):
+        job = self.jobs.get(job_id, tenant.name)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return self.jobs.results(job, offset)
+
+
+    async def cancel_job(self, job_id: str, tenant: Tenant):
+        info = self.jobs.cancel(job_id, tenant.name)
+        if info is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return info
+
+
+    async def render(self, request: RenderRequest, tenant: Tenant):
+        try:
+            body, cache = await self.renderer.render(request, tenant.name)
+        except QuotaExceeded as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        except ray.exceptions.RayTaskError as e:
+            raise HTTPException(status_code=502, detail=f"Render failed: {e.cause}")
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Render unavailable: {e}")
+        return Response(
+            content=body,
+            media_type=MEDIA_TYPES[request.format],
+            headers={"X-Render-Cache": cache, "ETag": f'"{hashlib.sha256(body).hexdigest()}"'},
+        )
+
+
+    async def extract(self, browser_id: str, request: ExtractRequest, tenant: Tenant):
+        try:
+            actor = self._actor(browser_id, tenant)
+        except ValueError:
+            raise self._not_found(browser_id)
+        try:
+            return await actor.extract.remote(request)
+        except ray.exceptions.RayTaskError as e:
+            if isinstance(e.cause, ValueError):
+                raise HTTPException(status_code=404, detail=str(e.cause))
+            raise HTTPException(status_code=502, detail=f"Extract failed: {e.cause}")
+
+
+    async def _node(self, node: str) -> str:
+        node_id = await asyncio.to_thread(resolve_node, node)
+        if node_id is None:
+            raise HTTPException(status_code=404, detail="Node not found")
+        return node_id
+
+
+    async def drain_node(self, node: str, request: DrainRequest):
+        node_id = await self._node(node)
+        # Created if the node has none yet, so an empty node can be drained too
+        probe = get_node_probe(node_id)
+        status = await probe.start_drain.remote(request.timeout)
+        self.drains.update(node_id, status)
+        await self.pool.retire(node_id)
+        return DrainStatus(**status)
+
+
+    async def get_drain(self, node: str):
+        node_id = await self._node(node)
+        status = await read_drain(node_id)
+        if status is None:
+            return DrainStatus(node_id=node_id, state="active")
+        return DrainStatus(**status)
+
+
+    async def cancel_drain(self, node: str):
+        node_id = await self._node(node)
         try:
-            actor = ray.get_actor(browser_id)
-            return await actor.get_info.remote()
+            probe = ray.get_actor(probe_name(node_id))
         except ValueError:
-            raise HTTPException(status_code=404, detail="Browser not found")
+            return DrainStatus(node_id=node_id, state="active")
+        status = await probe.cancel_drain.remote()
+        self.drains.update(node_id, status)
+        return DrainStatus(**status)
+
 
+    async def profile(self, seconds: float, mode: str, interval: float):
+        if self.profiling.locked():
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        async with self.profiling:
+            # Sampled from a worker thread, so the loop being profiled keeps running
+            return await asyncio.to_thread(admin.sample, seconds, interval, mode)
 
-    async def delete_browser(self, browser_id: str):
+
+    async def delete_browser(self, browser_id: str, tenant: Tenant):
         try:
-            actor = ray.get_actor(browser_id)
+            actor = self._actor(browser_id, tenant)
+            try:
+                await asyncio.wait_for(actor.close.remote(), timeout=2)
+            except Exception as e:
+                logger.warning(f"Graceful close of {browser_id} failed: {e}")
             ray.kill(actor)
+            self._forget(browser_id, tenant)
             return BrowserStatus(browser_id=browser_id, status="closed")
         except ValueError:
-            raise HTTPException(status_code=404, detail="Browser not found")
+            self._forget(browser_id, tenant)
+            raise self._not_found(browser_id)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to kill actor {e}")
+
+
+    async def delete_browsers(self, tenant: Tenant, selector: str, state: Optional[str] = None,
+                              min_age: Optional[float] = None, max_age: Optional[float] = None):
+        requirements = self._requirements(selector)
+        if not requirements:
+            # Never "everything" by accident
+            raise HTTPException(status_code=400, detail="A non-empty selector is required")
+        entries = self.registry.query(requirements, state, min_age, max_age, tenant.name)
+        limit = asyncio.Semaphore(DELETE_CONCURRENCY)
+
+        async def delete(browser_id):
+            async with limit:
+                try:
+                    return await self.delete_browser(browser_id, tenant)
+                except HTTPException as e:
+                    if e.status_code == 404:
+                        return BrowserStatus(browser_id=browser_id, status="not_found")
+                    return BrowserStatus(browser_id=browser_id, status="failed")
+
+        return BrowserStatusList(browsers=await asyncio.gather(*(delete(entry.browser_id) for entry in entries)))
         
 
     
-    async def websocket_proxy(self, websocket: WebSocket, browser_id: str, path: str) -> None:
-        await websocket.accept()
+    async def usage(self, tenant: Tenant):
+        tenants = self.tenants.tenants.values() if tenant.admin else [tenant]
+        return UsageList(tenants=[
+            Usage(
+                tenant=t.name,
+                sessions=self._sessions(t.name),
+                cpus=self._sessions(t.name) * SESSION_CPUS,
+                max_sessions=t.max_sessions,
+                max_cpus=t.max_cpus,
+            )
+            for t in tenants
+        ])
 
-        try:
-            actor = ray.get_actor(browser_id)
-        except ValueError:
-            await websocket.close(code=1008, reason="Browser not found")
-            return
 
-        info = await actor.get_info.remote()
-        if not info.chrome_ready:
-            await websocket.close(code=1011, reason="Chrome not ready")
+    async def websocket_proxy(self, websocket: WebSocket, browser_id: str, path: str, tenant: Optional[Tenant]) -> None:
+        await websocket.accept()
+        if tenant is None:
+            await websocket.close(code=1008, reason="Invalid API key")
             return
-
-        # Verify Chrome is reachable
-        try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(f"http://{info.pod_ip}:9222/json/version", timeout=2)
-                resp.raise_for_status()
-        except Exception as exc:
-            await websocket.close(code=1011, reason=f"Chrome unreachable: {exc}")
+        if not self.cluster.connected:
+            await websocket.close(code=1013, reason=f"Ray unavailable: {self.cluster.status()}")
             return
 
-        chrome_ws_url = f"ws://{info.pod_ip}:9222/{path}"
-
-        async with websockets.connect(chrome_ws_url, timeout=5) as chrome_ws:
-            async def client_to_chrome():
+        with tracing.remote_span("websocket_proxy", dict(websocket.headers), browser_id=browser_id):
+            # Each hop before the relay gets its own span, so slow connects can be attributed
+            with tracing.span("websocket_proxy.connect"):
                 try:
-                    while True:
-                        msg = await websocket.receive_text()
-                        await chrome_ws.send(msg)
-                except WebSocketDisconnect:
-                    pass  # client hung up
+                    actor = self._actor(browser_id, tenant)
+                except ValueError:
+                    reason = self.evictions.reason(browser_id)
+                    if reason is not None:
+                        await websocket.close(code=EVICTED_CLOSE_CODE, reason=reason)
+                    else:
+                        await websocket.close(code=1008, reason="Browser not found")
+                    return
+
+                info = await actor.get_info.remote(trace=tracing.inject(), context=True)
+                if not info.chrome_ready or info.browser_context_id is None:
+                    await websocket.close(code=1011, reason="Chrome not ready")
+                    return
 
-            async def chrome_to_client():
+                # Verify Chrome is reachable
                 try:
-                    async for msg in chrome_ws:
-                        await websocket.send_text(msg)
-                except websockets.exceptions.ConnectionClosed:
-                    pass  # chrome died
+                    with tracing.span("chrome.json_version"):
+                        async with httpx.AsyncClient() as client:
+                            resp = await client.get(f"http://{info.pod_ip}:9222/json/version", timeout=2)
+                            resp.raise_for_status()
+                except Exception as exc:
+                    await websocket.close(code=1011, reason=f"Chrome unreachable: {exc}")
+                    return
 
-            await asyncio.gather(client_to_chrome(), chrome_to_client())
-        
+                # Page-level connections only reach the session's own pages
+                page = PAGE_PATH.match(path)
+                target_id = page.group(1) if page else None
+                if target_id is not None and not await actor.owns_target.remote(target_id):
+                    await websocket.close(code=1008, reason="Page not found in this browser")
+                    return
+
+                chrome_ws_url = f"ws://{info.pod_ip}:9222/{path}"
+                with tracing.span("websockets.connect"):
+                    chrome_ws = await websockets.connect(chrome_ws_url, open_timeout=5)
+
+            async with chrome_ws:
+                with tracing.span("websocket_proxy.relay"), admin.track_relay(browser_id, path, chrome_ws, info.node_id) as relay:
+                    sampler = tracing.CDPSampler()
+                    cache = relay.cache = RelayCache() if CACHE_METHODS else None
+                    # The client only sees and drives targets in the session's own contexts
+                    intercepting = info.cache is not None or info.blocked is not None
+                    scope = RelayScope(actor, info.browser_context_id, intercepting, chrome_ws, target_id)
+
+                    async def client_to_chrome():
+                        try:
+                            while True:
+                                msg = await websocket.receive_text()
+                                msg, refusal = scope.request(msg)
+                                if refusal is not None:
+                                    await websocket.send_text(refusal)
+                                    continue
+                                if cache is not None:
+                                    reply = cache.request(msg)
+                                    if reply is not None:
+                                        await websocket.send_text(reply)
+                                        relay.to_client += 1
+                                        relay.bytes_to_client += len(reply)
+                                        continue
+                                relay.in_flight += 1
+                                sampler.sent(msg)
+                                await chrome_ws.send(msg)
+                                relay.in_flight -= 1
+                                relay.to_chrome += 1
+                                relay.bytes_to_chrome += len(msg)
+                        except (WebSocketDisconnect, websockets.exceptions.ConnectionClosed):
+                            pass  # client hung up, or chrome died
+
+                    async def chrome_to_client():
+                        try:
+                            async for msg in chrome_ws:
+                                relay.in_flight += 1
+                                sampler.received(msg)
+                                msg = await scope.response(msg)
+                                if msg is None:
+                                    relay.in_flight -= 1
+                                    continue
+                                if cache is not None:
+                                    cache.response(msg)
+                                await websocket.send_text(msg)
+                                relay.in_flight -= 1
+                                relay.to_client += 1
+                                relay.bytes_to_client += len(msg)
+                        except (WebSocketDisconnect, websockets.exceptions.ConnectionClosed):
+                            pass  # chrome died, or client hung up
+
+                    async def drain_notice():
+                        # Tell the client its node is going away, then close at the deadline
+                        while True:
+                            drain = await self.drains.wait(info.node_id)
+                            await websocket.send_text(orjson.dumps({
+                                "method": DRAIN_EVENT,
+                                "params": {"browserId": browser_id, "nodeId": info.node_id, "deadline": drain["deadline"]},
+                            }).decode())
+                            if await self.drains.until_deadline(info.node_id):
+                                return
+
+                    # Either side hanging up, the drain deadline or an eviction ends the relay
+                    relays = [asyncio.create_task(client_to_chrome()), asyncio.create_task(chrome_to_client())]
+                    notice = asyncio.create_task(drain_notice())
+                    evicted = asyncio.create_task(self.evictions.wait(browser_id))
+                    done, pending = await asyncio.wait(relays + [notice, evicted], return_when=asyncio.FIRST_COMPLETED)
+                    for task in pending:
+                        task.cancel()
+                    # A failed relay still ends in the close code and reason below
+                    for task in done:
+                        if task.exception() is not None:
+                            logger.warning(f"Relay for {browser_id} failed: {task.exception()!r}")
+                    if evicted in done:
+                        await websocket.close(code=EVICTED_CLOSE_CODE, reason=evicted.result())
+                    elif notice in done:
+                        await websocket.close(code=1012, reason="Node drained")
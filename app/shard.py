@@ -0,0 +1,238 @@
+# shard.py
+"""
+Multi-process API server: one front process owns the port and hands each
+accepted connection to one of N uvicorn worker processes.
+
+CDP proxy connections (/ws/browsers/{browser_id}/...) go to the worker picked
+by hashing browser_id, so every connection to a browser lands in the same
+process. Everything else, the control plane, goes to worker 0, which is the
+only one running the autoscaler, the browser pool and jobs. Admin requests
+can name a worker with ?shard=N, to look at the relays it holds; the worker
+closes those connections after responding, since a connection stays on the
+worker its first request picked.
+
+    python -m app.shard --host 0.0.0.0 --port 8050 --workers 4
+"""
+import os
+import re
+import sys
+import zlib
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import subprocess
+from typing import List, Optional
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("BROWSERSTATION_PROXY_WORKERS", str(os.cpu_count() or 1)))
+
+# Longest request line routed, and how long a client may take to send it
+MAX_REQUEST_LINE = 8192
+REQUEST_LINE_TIMEOUT = 10.0
+
+RESPAWN_INTERVAL = 1.0
+
+WS_PATH = re.compile(rb"^[A-Z]+ /ws/browsers/([^/?# ]+)")
+SHARD_PARAM = re.compile(rb"^[A-Z]+ /admin/[^ ]*[?&]shard=(\d+)")
+
+
+def shard_for(request_line: bytes, workers: int) -> int:
+    """Worker for a connection, from the first line of its first request"""
+    match = WS_PATH.match(request_line)
+    if match:
+        return zlib.crc32(match.group(1)) % workers
+    match = SHARD_PARAM.match(request_line)
+    if match:
+        return min(int(match.group(1)), workers - 1)
+    return 0
+
+
+async def _readable(sock: socket.socket):
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_reader(sock.fileno(), lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        loop.remove_reader(sock.fileno())
+
+
+async def _request_line(sock: socket.socket) -> Optional[bytes]:
+    """First line the client sent, left unread in the socket for the worker"""
+    while True:
+        await _readable(sock)
+        data = sock.recv(MAX_REQUEST_LINE, socket.MSG_PEEK)
+        if not data:
+            return None
+        end = data.find(b"\r\n")
+        if end >= 0:
+            return data[:end]
+        if len(data) >= MAX_REQUEST_LINE:
+            return data
+        # The rest of the line is still in flight; the socket stays readable
+        # while the peeked bytes are buffered, so poll instead of waiting on it
+        await asyncio.sleep(0.005)
+
+
+class Worker:
+    """One worker process and the channel its connections are passed over"""
+
+    def __init__(self, index: int, workers: int, args: argparse.Namespace):
+        self.index = index
+        self.workers = workers
+        self.args = args
+        self.process: Optional[subprocess.Popen] = None
+        self.channel: Optional[socket.socket] = None
+
+    def spawn(self):
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        env = dict(os.environ, BROWSERSTATION_SHARD=str(self.index), BROWSERSTATION_SHARDS=str(self.workers))
+        command = [sys.executable, "-m", "app.shard", "--channel-fd", str(theirs.fileno()), "--log-level", self.args.log_level]
+        self.process = subprocess.Popen(command, pass_fds=[theirs.fileno()], env=env)
+        theirs.close()
+        if self.channel is not None:
+            self.channel.close()
+        self.channel = ours
+        logger.info(f"Started worker {self.index} [{self.process.pid}]")
+
+    def hand_over(self, conn: socket.socket):
+        socket.send_fds(self.channel, [b"c"], [conn.fileno()])
+
+
+class Front:
+    """Accepts on the port and routes each connection to a worker"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workers = [Worker(i, args.workers, args) for i in range(args.workers)]
+        self.stopping = asyncio.Event()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+
+        listener = socket.create_server((self.args.host, self.args.port), backlog=2048)
+        listener.setblocking(False)
+        for worker in self.workers:
+            worker.spawn()
+        logger.info(f"Routing http://{self.args.host}:{self.args.port} to {len(self.workers)} workers")
+
+        tasks = [asyncio.create_task(self.accept(listener)), asyncio.create_task(self.supervise())]
+        await self.stopping.wait()
+        for task in tasks:
+            task.cancel()
+        listener.close()
+        await self.stop_workers()
+
+    async def accept(self, listener: socket.socket):
+        loop = asyncio.get_running_loop()
+        pending = set()
+        while True:
+            conn, _ = await loop.sock_accept(listener)
+            task = asyncio.create_task(self.route(conn))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+    async def route(self, conn: socket.socket):
+        try:
+            line = await asyncio.wait_for(_request_line(conn), REQUEST_LINE_TIMEOUT)
+            if line is not None:
+                self.workers[shard_for(line, len(self.workers))].hand_over(conn)
+        except (asyncio.TimeoutError, OSError) as e:
+            # Slow client, reset connection or a worker being restarted
+            logger.debug(f"Dropped connection before routing: {e}")
+        finally:
+            conn.close()
+
+    async def supervise(self):
+        while True:
+            await asyncio.sleep(RESPAWN_INTERVAL)
+            for worker in self.workers:
+                code = worker.process.poll()
+                if code is not None:
+                    logger.warning(f"Worker {worker.index} exited with {code}, restarting")
+                    worker.spawn()
+
+    async def stop_workers(self):
+        for worker in self.workers:
+            if worker.process.poll() is None:
+                worker.process.terminate()
+        for worker in self.workers:
+            await asyncio.to_thread(worker.process.wait)
+            worker.channel.close()
+
+
+class ShardServer(uvicorn.Server):
+    """uvicorn serving connections accepted by the front process instead of its own socket"""
+
+    def __init__(self, config: uvicorn.Config, channel: socket.socket):
+        super().__init__(config)
+        self.channel = channel
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None):
+        await super().startup(sockets=[])
+        self.channel.setblocking(False)
+        asyncio.get_running_loop().add_reader(self.channel.fileno(), self.receive)
+
+    def receive(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                message, fds, _, _ = socket.recv_fds(self.channel, 1, 16)
+            except BlockingIOError:
+                return
+            if not message and not fds:
+                # The front process is gone, nothing more will arrive
+                loop.remove_reader(self.channel.fileno())
+                self.should_exit = True
+                return
+            for fd in fds:
+                loop.create_task(loop.connect_accepted_socket(self.create_protocol, socket.socket(fileno=fd)))
+
+    def create_protocol(self) -> asyncio.Protocol:
+        return self.config.http_protocol_class(
+            config=self.config,
+            server_state=self.server_state,
+            app_state=self.lifespan.state,
+        )
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None):
+        asyncio.get_running_loop().remove_reader(self.channel.fileno())
+        await super().shutdown()
+
+
+def serve_worker(args: argparse.Namespace):
+    config = uvicorn.Config("app.main:app", loop="uvloop", log_level=args.log_level)
+    channel = socket.socket(fileno=args.channel_fd)
+    ShardServer(config, channel).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BrowserStation API with the CDP proxy sharded across processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--channel-fd", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:     %(message)s")
+    if args.channel_fd is not None:
+        serve_worker(args)
+        return
+
+    try:
+        import uvloop
+    except ImportError:
+        uvloop = None
+    (uvloop.run if uvloop is not None else asyncio.run)(Front(args).run())
+
+
+if __name__ == "__main__":
+    main()
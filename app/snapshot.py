@@ -0,0 +1,278 @@
+# snapshot.py
+import os
+import re
+import time
+import zlib
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+import orjson
+import ray
+
+from app.cdp import CDPSession, CDPError
+from app.context import SessionContext
+from app.pages import evaluate, open_page, close_page
+from app.models import SnapshotInfo
+
+logger = logging.getLogger(__name__)
+
+# Node-local copies of snapshot blobs, shared by every browser on the node
+NODE_DIR = os.getenv("BROWSERSTATION_SNAPSHOT_DIR", "/var/cache/browserstation/snapshots")
+
+# Canonical copies kept by the API on the head node
+STORE_DIR = os.getenv("BROWSERSTATION_SNAPSHOT_STORE", os.path.expanduser("~/.browserstation/snapshots"))
+
+# Served with an empty page during restore so origins can be entered without network
+RESTORE_PATH = "/__browserstation_restore__"
+
+# Fields Storage.setCookies accepts out of what Storage.getCookies returns
+COOKIE_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires", "priority", "sourceScheme", "sourcePort", "partitionKey")
+
+CAPTURE_JS = """
+(async () => {
+  const request = r => new Promise((resolve, reject) => { r.onsuccess = () => resolve(r.result); r.onerror = () => reject(r.error); });
+  const state = {localStorage: {}, indexedDB: [], serviceWorkers: []};
+  for (let i = 0; i < localStorage.length; i++) {
+    const key = localStorage.key(i);
+    state.localStorage[key] = localStorage.getItem(key);
+  }
+  for (const info of indexedDB.databases ? await indexedDB.databases() : []) {
+    const db = await request(indexedDB.open(info.name));
+    const dump = {name: db.name, version: db.version, stores: []};
+    for (const name of db.objectStoreNames) {
+      const store = db.transaction(name, "readonly").objectStore(name);
+      const [keys, values] = await Promise.all([request(store.getAllKeys()), request(store.getAll())]);
+      dump.stores.push({
+        name, keyPath: store.keyPath, autoIncrement: store.autoIncrement,
+        indexes: Array.from(store.indexNames, n => {
+          const index = store.index(n);
+          return {name: n, keyPath: index.keyPath, unique: index.unique, multiEntry: index.multiEntry};
+        }),
+        records: keys.map((key, i) => [key, values[i]]),
+      });
+    }
+    db.close();
+    state.indexedDB.push(dump);
+  }
+  if (navigator.serviceWorker) {
+    for (const registration of await navigator.serviceWorker.getRegistrations()) {
+      const worker = registration.active || registration.waiting || registration.installing;
+      if (worker) state.serviceWorkers.push({scriptURL: worker.scriptURL, scope: registration.scope});
+    }
+  }
+  return state;
+})()
+"""
+
+RESTORE_JS = """
+(async (state) => {
+  for (const [key, value] of Object.entries(state.localStorage)) localStorage.setItem(key, value);
+  for (const dump of state.indexedDB) {
+    await new Promise((resolve, reject) => {
+      const open = indexedDB.open(dump.name, dump.version);
+      open.onupgradeneeded = () => {
+        for (const s of dump.stores) {
+          if (open.result.objectStoreNames.contains(s.name)) continue;
+          const store = open.result.createObjectStore(s.name, {keyPath: s.keyPath, autoIncrement: s.autoIncrement});
+          for (const i of s.indexes) store.createIndex(i.name, i.keyPath, {unique: i.unique, multiEntry: i.multiEntry});
+        }
+      };
+      open.onsuccess = () => {
+        const db = open.result;
+        if (!dump.stores.length) { db.close(); return resolve(); }
+        const tx = db.transaction(dump.stores.map(s => s.name), "readwrite");
+        for (const s of dump.stores) {
+          const store = tx.objectStore(s.name);
+          for (const [key, value] of s.records) s.keyPath === null ? store.put(value, key) : store.put(value);
+        }
+        tx.oncomplete = () => { db.close(); resolve(); };
+        tx.onerror = () => reject(tx.error);
+      };
+      open.onerror = () => reject(open.error);
+    });
+  }
+  for (const sw of state.serviceWorkers) {
+    try { await navigator.serviceWorker.register(sw.scriptURL, {scope: sw.scope}); } catch (e) {}
+  }
+})
+"""
+
+
+def encode_snapshot(state: dict) -> bytes:
+    return zlib.compress(orjson.dumps(state), 6)
+
+
+def decode_snapshot(blob: bytes) -> dict:
+    return orjson.loads(zlib.decompress(blob))
+
+
+def digest(blob: bytes) -> str:
+    """Snapshot ID: identical profiles share one ID, one blob and one cache entry"""
+    return hashlib.sha256(blob).hexdigest()[:32]
+
+
+def valid_id(snapshot_id: str) -> bool:
+    # IDs become file names, anything but a digest is rejected
+    return re.fullmatch(r"[0-9a-f]{32}", snapshot_id) is not None
+
+
+async def capture(cdp: CDPSession, context: SessionContext) -> dict:
+    """
+    Capture cookies and per-origin storage from the session's contexts and open pages.
+
+    Other sessions share the Chrome, so its default context and their
+    contexts are never read.
+
+    Returns:
+        dict: {"cookies": [...], "origins": {origin: {"localStorage", "indexedDB", "serviceWorkers"}}}
+    """
+    cookies = {}
+    for context_id in context.ids:
+        for cookie in (await cdp.send("Storage.getCookies", {"browserContextId": context_id}))["cookies"]:
+            cookies[(cookie["name"], cookie["domain"], cookie["path"])] = cookie
+
+    origins = {}
+    for target in await context.targets():
+        if target["type"] != "page" or not target["url"].startswith(("http://", "https://")):
+            continue
+        session_id = (await cdp.send("Target.attachToTarget", {"targetId": target["targetId"], "flatten": True}))["sessionId"]
+        try:
+            origin = await evaluate(cdp, session_id, "location.origin")
+            origins[origin] = await evaluate(cdp, session_id, CAPTURE_JS)
+        except (CDPError, RuntimeError) as e:
+            logger.warning(f"Storage capture for {target['url']} failed: {e}")
+        finally:
+            await cdp.send("Target.detachFromTarget", {"sessionId": session_id})
+
+    return {"cookies": list(cookies.values()), "origins": origins}
+
+
+async def restore(cdp: CDPSession, state: dict, browser_context_id: str):
+    """Apply a captured profile to the session's browser context"""
+    cookies = [
+        {k: v for k, v in cookie.items() if k in COOKIE_FIELDS and not (k == "expires" and cookie.get("session"))}
+        for cookie in state["cookies"]
+    ]
+    if cookies:
+        await cdp.send("Storage.setCookies", {"cookies": cookies, "browserContextId": browser_context_id})
+    if not state["origins"]:
+        return
+
+    # One hidden page visits each origin; the visit is answered locally with
+    # an empty document, so restoring storage never touches the network
+    target_id, session_id = await open_page(cdp, browser_context_id=browser_context_id)
+
+    async def fulfill(params, event_session_id):
+        if event_session_id == session_id:
+            await cdp.send("Fetch.fulfillRequest", {
+                "requestId": params["requestId"],
+                "responseCode": 200,
+                "responseHeaders": [{"name": "Content-Type", "value": "text/html"}],
+                "body": "",
+            }, session_id=session_id)
+
+    cdp.on("Fetch.requestPaused", fulfill)
+    try:
+        await cdp.send("Fetch.enable", {"patterns": [{"urlPattern": f"*{RESTORE_PATH}", "requestStage": "Request"}]}, session_id=session_id)
+        for origin, storage in state["origins"].items():
+            loaded = cdp.wait_for("Page.loadEventFired", session_id)
+            await cdp.send("Page.navigate", {"url": origin + RESTORE_PATH}, session_id=session_id)
+            await asyncio.wait_for(loaded, 10)
+            await evaluate(cdp, session_id, f"{RESTORE_JS}({orjson.dumps(storage).decode()})")
+    finally:
+        cdp.off("Fetch.requestPaused", fulfill)
+        await close_page(cdp, target_id)
+
+
+class NodeSnapshotCache:
+    """Snapshot blobs by ID on a directory shared by every browser on the node"""
+
+    def __init__(self, path: str = NODE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def get(self, snapshot_id: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.path, snapshot_id), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, snapshot_id: str, blob: bytes):
+        path = os.path.join(self.path, snapshot_id)
+        if os.path.exists(path):
+            return
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+
+
+class SnapshotStore:
+    """
+    Snapshots known to the API.
+
+    Blobs are written to disk on the head and put in the Ray object store once,
+    so every restore hands actors a reference instead of re-sending the bytes.
+    """
+
+    def __init__(self, path: str = STORE_DIR):
+        self.path = path
+        self.refs: Dict[str, ray.ObjectRef] = {}
+        os.makedirs(path, exist_ok=True)
+
+    def add(self, snapshot_id: str, blob: bytes, state_summary: dict) -> SnapshotInfo:
+        existing = self.info(snapshot_id)
+        if existing is not None:
+            return existing
+
+        info = SnapshotInfo(snapshot_id=snapshot_id, size=len(blob), created_at=time.time(), **state_summary)
+        with open(os.path.join(self.path, f"{snapshot_id}.bin"), "wb") as f:
+            f.write(blob)
+        with open(os.path.join(self.path, f"{snapshot_id}.json"), "wb") as f:
+            f.write(info.model_dump_json().encode())
+        self.refs[snapshot_id] = ray.put(blob)
+        return info
+
+    def info(self, snapshot_id: str) -> Optional[SnapshotInfo]:
+        if not valid_id(snapshot_id):
+            return None
+        try:
+            with open(os.path.join(self.path, f"{snapshot_id}.json"), "rb") as f:
+                return SnapshotInfo.model_validate_json(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def ref(self, snapshot_id: str) -> Optional[ray.ObjectRef]:
+        if not valid_id(snapshot_id):
+            return None
+        if snapshot_id not in self.refs:
+            try:
+                with open(os.path.join(self.path, f"{snapshot_id}.bin"), "rb") as f:
+                    self.refs[snapshot_id] = ray.put(f.read())
+            except OSError:
+                return None
+        return self.refs[snapshot_id]
+
+    def list(self) -> List[SnapshotInfo]:
+        infos = (self.info(name[:-5]) for name in os.listdir(self.path) if name.endswith(".json"))
+        return sorted((i for i in infos if i is not None), key=lambda i: i.created_at)
+
+    def delete(self, snapshot_id: str) -> bool:
+        if not valid_id(snapshot_id):
+            return False
+        self.refs.pop(snapshot_id, None)
+        found = False
+        for suffix in (".bin", ".json"):
+            try:
+                os.unlink(os.path.join(self.path, snapshot_id + suffix))
+                found = True
+            except OSError:
+                pass
+        return found
+
+
+def summarize(state: dict) -> dict:
+    return {"cookies": len(state["cookies"]), "origins": sorted(state["origins"])}
@@ -0,0 +1,80 @@
+# tenants.py
+import os
+import logging
+from typing import Dict, List, Optional
+
+import orjson
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+# Named actors are looked up in the driver's namespace, which must be the same
+# in every API shard (and across restarts) for them to find each other's browsers.
+# Tenants other than the default one get "<namespace>-<tenant>".
+NAMESPACE = os.getenv("BROWSERSTATION_NAMESPACE", "browserstation")
+
+# JSON file mapping tenant names to their keys and quotas, e.g.
+#   {"acme": {"api_keys": ["..."], "max_sessions": 50, "max_cpus": 40}}
+# Without it there is one tenant, "default", keyed by BROWSERSTATION_API_KEY.
+TENANTS_FILE = os.getenv("BROWSERSTATION_TENANTS")
+
+# CPUs a session counts as against max_cpus: the Chrome sidecar's request per browser slot
+SESSION_CPUS = float(os.getenv("BROWSERSTATION_SESSION_CPUS", "1"))
+
+DEFAULT_TENANT = "default"
+
+
+class Tenant(BaseModel):
+    name: str = DEFAULT_TENANT
+    api_keys: List[str] = []
+    max_sessions: Optional[int] = Field(None, ge=0)  # live and pending browsers
+    max_cpus: Optional[float] = Field(None, ge=0)    # sessions * SESSION_CPUS
+    admin: bool = False                              # may drain nodes and read every tenant's usage
+
+    @property
+    def namespace(self) -> str:
+        return NAMESPACE if self.name == DEFAULT_TENANT else f"{NAMESPACE}-{self.name}"
+
+    def admits(self, sessions: int) -> Optional[str]:
+        """Why one more session would exceed a quota, None if it fits"""
+        if self.max_sessions is not None and sessions + 1 > self.max_sessions:
+            return f"Session quota reached ({self.max_sessions} concurrent sessions)"
+        if self.max_cpus is not None and (sessions + 1) * SESSION_CPUS > self.max_cpus:
+            return f"CPU quota reached ({self.max_cpus} CPUs)"
+        return None
+
+
+def tenant_of_namespace(namespace: Optional[str]) -> str:
+    if not namespace or namespace == NAMESPACE:
+        return DEFAULT_TENANT
+    return namespace[len(NAMESPACE) + 1:] if namespace.startswith(f"{NAMESPACE}-") else namespace
+
+
+def load_tenants(path: Optional[str] = TENANTS_FILE, api_key: Optional[str] = None) -> Dict[str, Tenant]:
+    """
+    Tenants by name. Without a tenants file, a single admin tenant whose key
+    is `api_key` (no key means the API is open).
+    """
+    if not path:
+        return {DEFAULT_TENANT: Tenant(api_keys=[api_key] if api_key else [], admin=True)}
+    with open(path, "rb") as f:
+        config = orjson.loads(f.read())
+    tenants = {name: Tenant(name=name, **settings) for name, settings in config.items()}
+    logger.info(f"Loaded {len(tenants)} tenants from {path}")
+    return tenants
+
+
+class Tenants:
+    """API keys resolved to tenants"""
+
+    def __init__(self, tenants: Dict[str, Tenant]):
+        self.tenants = tenants
+        self.by_key = {key: tenant for tenant in tenants.values() for key in tenant.api_keys}
+        # With no keys at all the API is open and every caller is the default tenant
+        self.open = not self.by_key
+
+    def for_key(self, api_key: Optional[str]) -> Optional[Tenant]:
+        if self.open:
+            return self.tenants.get(DEFAULT_TENANT) or next(iter(self.tenants.values()))
+        return self.by_key.get(api_key)
+
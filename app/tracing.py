@@ -0,0 +1,131 @@
+# tracing.py
+import os
+import time
+import random
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from app.cdp import parse_envelope
+
+logger = logging.getLogger(__name__)
+
+# "otlp" exports to OTEL_EXPORTER_OTLP_ENDPOINT (default http://localhost:4318),
+# "file" appends one JSON span per line to TRACE_FILE, anything else disables tracing
+TRACING = os.getenv("BROWSERSTATION_TRACING", "")
+TRACE_FILE = os.getenv("BROWSERSTATION_TRACE_FILE", "/tmp/browserstation-traces.jsonl")
+
+# Fraction of CDP commands through the proxy recorded as spans
+CDP_SAMPLE_RATE = float(os.getenv("BROWSERSTATION_CDP_TRACE_SAMPLE", "0"))
+
+try:
+    from opentelemetry import trace, propagate, context
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+except ImportError:  # tracing is optional
+    trace = None
+
+_tracer = None
+_provider = None
+
+
+def setup(service_name: str):
+    """Install the exporter for this process, once. A no-op unless tracing is configured."""
+    global _tracer, _provider
+    if _tracer is not None or TRACING not in ("otlp", "file"):
+        return
+    if trace is None:
+        logger.warning("BROWSERSTATION_TRACING is set but opentelemetry-sdk is not installed")
+        return
+
+    if TRACING == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    else:
+        exporter = ConsoleSpanExporter(
+            out=open(TRACE_FILE, "a", buffering=1),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    _provider = provider
+    _tracer = provider.get_tracer("browserstation")
+
+
+def flush():
+    """Export buffered spans now, e.g. before an actor is killed"""
+    if _provider is not None:
+        _provider.force_flush()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Span as a child of the current one, or nothing when tracing is off"""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def inject() -> Optional[Dict[str, str]]:
+    """Carrier for the current trace, passed to actor methods as `trace=`"""
+    if _tracer is None:
+        return None
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+@contextmanager
+def remote_span(name: str, carrier: Optional[Dict[str, str]], **attributes):
+    """Span continuing the trace of a caller in another process (actor RPC or HTTP headers)"""
+    if _tracer is None:
+        yield None
+        return
+    if carrier is None:
+        # Called locally, e.g. one actor method from another
+        with span(name, **attributes) as current:
+            yield current
+        return
+    token = context.attach(propagate.extract(carrier or {}))
+    try:
+        with _tracer.start_as_current_span(name, attributes=attributes) as current:
+            yield current
+    finally:
+        context.detach(token)
+
+
+class CDPSampler:
+    """
+    Round-trip spans for a sample of the CDP commands on one proxied connection.
+
+    Commands are picked before they are parsed, so unsampled traffic only
+    costs a random() call.
+    """
+
+    def __init__(self, rate: float = CDP_SAMPLE_RATE):
+        self.rate = rate if _tracer is not None else 0
+        self.parent = context.get_current() if self.rate else None
+        self.pending: Dict[int, tuple] = {}  # command id -> (method, session_id, start ns)
+
+    def sent(self, message: str):
+        if not self.rate or random.random() >= self.rate:
+            return
+        envelope = parse_envelope(message)
+        if envelope is not None and envelope.id is not None and envelope.method:
+            self.pending[envelope.id] = (envelope.method, envelope.session_id, time.time_ns())
+
+    def received(self, message: str):
+        if not self.pending:
+            return
+        envelope = parse_envelope(message)
+        if envelope is None or envelope.id is None or envelope.id not in self.pending:
+            return
+        method, session_id, start = self.pending.pop(envelope.id)
+        attributes = {"cdp.method": method, "cdp.error": envelope.error is not None}
+        if session_id:
+            attributes["cdp.session_id"] = session_id
+        cdp_span = _tracer.start_span(f"CDP {method}", context=self.parent, start_time=start, attributes=attributes)
+        cdp_span.end()
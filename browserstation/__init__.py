@@ -0,0 +1,19 @@
+# BrowserStation Python client
+from browserstation.client import AsyncBrowserStation, BrowserSession, BrowserSessions, BrowserStationError
+from browserstation.models import Health, ActorInfo, BrowserInfo, BrowserStatus, BrowserEntry, SnapshotInfo, JobInfo, DrainStatus, Usage
+
+__all__ = [
+    "AsyncBrowserStation",
+    "BrowserSession",
+    "BrowserSessions",
+    "BrowserStationError",
+    "Health",
+    "ActorInfo",
+    "BrowserInfo",
+    "BrowserStatus",
+    "BrowserEntry",
+    "SnapshotInfo",
+    "JobInfo",
+    "DrainStatus",
+    "Usage",
+]
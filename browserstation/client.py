@@ -0,0 +1,429 @@
+# client.py
+import os
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional
+
+import orjson
+
+import httpx
+
+from browserstation.models import Health, ActorInfo, BrowserInfo, BrowserStatus, BrowserEntry, BrowserList, SnapshotInfo, JobInfo, DrainStatus, Usage
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 503}
+
+# Server-side cap on a single readiness long-poll (see GET /browsers/{id}?wait=)
+MAX_WAIT = 60.0
+
+# Server-side cap on placing a new browser, including autoscaling a node up
+# (BROWSERSTATION_PLACEMENT_TIMEOUT on the server)
+PLACEMENT_TIMEOUT = 300.0
+
+
+class BrowserStationError(Exception):
+    """Raised when the API answers with an error status"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class AsyncBrowserStation:
+    """Async client for the BrowserStation API with pooled connections and retries"""
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8050",
+        api_key: Optional[str] = None,
+        timeout: float = 30.0,
+        max_connections: int = 100,
+        max_retries: int = 5,
+        backoff: float = 0.25,
+        max_backoff: float = 8.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Initialize client.
+
+        Args:
+            base_url: API endpoint
+            api_key: Value for X-API-Key, defaults to $BROWSERSTATION_API_KEY
+            timeout: Per-request timeout in seconds (readiness long-polls extend it)
+            max_connections: Size of the shared HTTP connection pool
+            max_retries: Retries on 429/503 and connection failures
+            backoff: Initial backoff in seconds, doubled per attempt with jitter
+            max_backoff: Upper bound for a single backoff
+            transport: Custom httpx transport, mainly for testing
+        """
+        api_key = api_key or os.getenv("BROWSERSTATION_API_KEY")
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"X-API-Key": api_key} if api_key else {}
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    def websocket_url(self, path: str) -> str:
+        """Absolute WebSocket URL for a proxy path returned by the API"""
+        return self.base_url.replace("http", "ws", 1) + path
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying on 429/503 and on connections that never reached the server"""
+        attempt = 0
+        while True:
+            try:
+                response = await self._http.request(method, path, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # Nothing was sent, so retrying is safe even for POST
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.debug(f"{method} {path} failed to connect ({e}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    if response.is_error:
+                        raise BrowserStationError(response.status_code, _detail(response))
+                    return response
+                delay = _retry_after(response) or self._backoff(attempt)
+                logger.debug(f"{method} {path} got {response.status_code}, retrying in {delay:.2f}s")
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps a burst of clients from retrying in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def health(self) -> Health:
+        response = await self._request("GET", "/")
+        return Health(**response.json())
+
+    async def create_browser(self, **options) -> ActorInfo:
+        """
+        Create a browser.
+
+        Args:
+            **options: Session options for POST /browsers, e.g. shared_cache=True
+        """
+        # The server holds the request until the browser is placed, so don't give up before it does
+        response = await self._request("POST", "/browsers", json=options or None, timeout=self.timeout + PLACEMENT_TIMEOUT)
+        return ActorInfo(**response.json())
+
+    async def get_browser(self, browser_id: str, wait: float = 0) -> BrowserInfo:
+        """
+        Get browser details.
+
+        Args:
+            browser_id: UUID of the browser instance
+            wait: Seconds the server may hold the request until Chrome is ready
+        """
+        params = {"wait": wait} if wait else None
+        response = await self._request("GET", f"/browsers/{browser_id}", params=params, timeout=self.timeout + wait)
+        return BrowserInfo(**response.json())
+
+    async def wait_until_ready(self, browser_id: str, timeout: float = 30.0) -> BrowserInfo:
+        """
+        Block until Chrome is ready using server-side long-polls.
+
+        Raises:
+            TimeoutError: If Chrome is not ready within `timeout` seconds
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            info = await self.get_browser(browser_id, wait=max(min(remaining, MAX_WAIT), 0))
+            if info.chrome_ready:
+                return info
+            if loop.time() >= deadline:
+                raise TimeoutError(f"Browser {browser_id} not ready after {timeout}s")
+
+    async def list_browsers(self, selector: Optional[str] = None, **filters) -> List[BrowserEntry]:
+        """
+        List browsers, optionally filtered.
+
+        Args:
+            selector: Label selector, e.g. "job=crawl-7,team in (a,b)"
+            **filters: state ("ALIVE" or "PENDING"), min_age, max_age (seconds)
+        """
+        params = {k: v for k, v in dict(filters, selector=selector).items() if v is not None}
+        response = await self._request("GET", "/browsers", params=params)
+        return BrowserList(**response.json()).browsers
+
+    async def delete_browser(self, browser_id: str, missing_ok: bool = True) -> Optional[BrowserStatus]:
+        """
+        Close and delete a browser.
+
+        Args:
+            browser_id: UUID of the browser instance
+            missing_ok: Return None instead of raising when the browser is already gone
+        """
+        try:
+            response = await self._request("DELETE", f"/browsers/{browser_id}")
+        except BrowserStationError as e:
+            if missing_ok and e.status_code == 404:
+                return None
+            raise
+        return BrowserStatus(**response.json())
+
+    async def delete_by_selector(self, selector: str, **filters) -> List[BrowserStatus]:
+        """
+        Close every browser matching a label selector in one call.
+
+        Args:
+            selector: Label selector, e.g. "job=crawl-7"
+            **filters: state, min_age, max_age, as for list_browsers
+        """
+        params = {k: v for k, v in dict(filters, selector=selector).items() if v is not None}
+        response = await self._request("DELETE", "/browsers", params=params)
+        return [BrowserStatus(**s) for s in response.json()["browsers"]]
+
+    async def snapshot_browser(self, browser_id: str) -> SnapshotInfo:
+        """
+        Capture a browser's cookies and site storage.
+
+        The returned snapshot_id can be passed as `from_snapshot` to create_browser.
+        """
+        response = await self._request("POST", f"/browsers/{browser_id}/snapshot")
+        return SnapshotInfo(**response.json())
+
+    async def list_snapshots(self) -> List[SnapshotInfo]:
+        response = await self._request("GET", "/snapshots")
+        return [SnapshotInfo(**s) for s in response.json()["snapshots"]]
+
+    async def delete_snapshot(self, snapshot_id: str):
+        await self._request("DELETE", f"/snapshots/{snapshot_id}")
+
+    async def create_job(self, urls: List[str], **options) -> JobInfo:
+        """
+        Start a server-side page-fetch job.
+
+        Args:
+            urls: Pages to fetch
+            **options: extract, concurrency, retries, timeout
+        """
+        response = await self._request("POST", "/jobs", json={"urls": urls, **options})
+        return JobInfo(**response.json())
+
+    async def get_job(self, job_id: str) -> JobInfo:
+        response = await self._request("GET", f"/jobs/{job_id}")
+        return JobInfo(**response.json())
+
+    async def cancel_job(self, job_id: str) -> JobInfo:
+        response = await self._request("DELETE", f"/jobs/{job_id}")
+        return JobInfo(**response.json())
+
+    async def job_results(self, job_id: str, offset: int = 0) -> AsyncIterator[dict]:
+        """
+        Iterate over job results as they are produced, until the job ends.
+
+        Dropped streams are resumed from the last result received.
+
+        Args:
+            job_id: ID returned by create_job
+            offset: Results to skip
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self._http.stream("GET", f"/jobs/{job_id}/results", params={"offset": offset}, timeout=None) as response:
+                    if response.is_error:
+                        await response.aread()
+                        raise BrowserStationError(response.status_code, _detail(response))
+                    async for line in response.aiter_lines():
+                        if line:
+                            offset += 1
+                            attempt = 0
+                            yield orjson.loads(line)
+                return
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.debug(f"Result stream for {job_id} dropped ({e}), resuming at {offset} in {delay:.2f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def extract(self, browser_id: str, target_id: Optional[str] = None, diff: bool = True, max_text: int = 20000) -> dict:
+        """
+        Interactive elements and visible text of a page in a browser.
+
+        Args:
+            browser_id: UUID of the browser instance
+            target_id: CDP target of the page, defaults to the first loaded page
+            diff: Only return changes since the last extract of the page
+            max_text: Characters of visible text to include
+        """
+        body = {"target_id": target_id, "diff": diff, "max_text": max_text}
+        response = await self._request("POST", f"/browsers/{browser_id}/extract", json=body)
+        return response.json()
+
+    async def render(self, url: str, **options) -> bytes:
+        """
+        Screenshot or PDF of a page.
+
+        Args:
+            url: Page to render
+            **options: format, width, height, full_page, quality, max_age, timeout
+        """
+        response = await self._request("POST", "/render", json={"url": url, **options})
+        return response.content
+
+    async def usage(self) -> List[Usage]:
+        """Sessions and CPUs in use against quota, for this key's tenant (every tenant for admin keys)"""
+        response = await self._request("GET", "/usage")
+        return [Usage(**u) for u in response.json()["tenants"]]
+
+    async def drain_node(self, node: str, timeout: float = 600.0) -> DrainStatus:
+        """
+        Stop placing browsers on a node and kill the ones left after `timeout` seconds.
+
+        Args:
+            node: Ray node ID or IP address
+        """
+        response = await self._request("POST", f"/nodes/{node}/drain", json={"timeout": timeout})
+        return DrainStatus(**response.json())
+
+    async def get_drain(self, node: str) -> DrainStatus:
+        response = await self._request("GET", f"/nodes/{node}/drain")
+        return DrainStatus(**response.json())
+
+    async def cancel_drain(self, node: str) -> DrainStatus:
+        response = await self._request("DELETE", f"/nodes/{node}/drain")
+        return DrainStatus(**response.json())
+
+    async def create_browsers(self, count: int, concurrency: int = 10, **options) -> List[ActorInfo]:
+        """
+        Create several browsers concurrently. If any creation fails the ones
+        already created are deleted before the error is raised.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def create():
+            async with semaphore:
+                return await self.create_browser(**options)
+
+        results = await asyncio.gather(*(create() for _ in range(count)), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            await self.delete_browsers([str(r.browser_id) for r in results if isinstance(r, ActorInfo)])
+            raise errors[0]
+        return results
+
+    async def delete_browsers(self, browser_ids: List[str], concurrency: int = 10) -> List[Optional[BrowserStatus]]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def delete(browser_id):
+            async with semaphore:
+                return await self.delete_browser(browser_id)
+
+        return await asyncio.gather(*(delete(browser_id) for browser_id in browser_ids))
+
+    def session(self, ready_timeout: float = 30.0, **options) -> "BrowserSession":
+        """Browser that is created on enter, ready when entered and always deleted on exit"""
+        return BrowserSession(self, ready_timeout, options=options)
+
+    def sessions(self, count: int, ready_timeout: float = 30.0, concurrency: int = 10, **options) -> "BrowserSessions":
+        """Like `session`, for `count` browsers created and deleted in bulk"""
+        return BrowserSessions(self, count, ready_timeout, concurrency, options)
+
+
+class BrowserSession:
+    """A ready browser bound to an `async with` block"""
+
+    def __init__(self, client: AsyncBrowserStation, ready_timeout: float = 30.0, actor: Optional[ActorInfo] = None, options: Optional[dict] = None):
+        self.client = client
+        self.ready_timeout = ready_timeout
+        self.actor = actor
+        self.options = options or {}
+        self.info: Optional[BrowserInfo] = None
+
+    @property
+    def browser_id(self) -> str:
+        return str(self.actor.browser_id)
+
+    @property
+    def ws_url(self) -> str:
+        """CDP endpoint to hand to Playwright, browser-use, etc."""
+        return self.client.websocket_url(self.info.websocket_url or self.actor.proxy_url)
+
+    async def __aenter__(self):
+        if self.actor is None:
+            self.actor = await self.client.create_browser(**self.options)
+        try:
+            self.info = await self.client.wait_until_ready(self.browser_id, self.ready_timeout)
+        except BaseException:
+            await asyncio.shield(self.close())
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.shield(self.close())
+
+    async def close(self):
+        if self.actor is not None:
+            await self.client.delete_browser(self.browser_id)
+
+
+class BrowserSessions:
+    """Several ready browsers bound to one `async with` block"""
+
+    def __init__(self, client: AsyncBrowserStation, count: int, ready_timeout: float, concurrency: int, options: Optional[dict] = None):
+        self.client = client
+        self.count = count
+        self.ready_timeout = ready_timeout
+        self.concurrency = concurrency
+        self.options = options or {}
+        self.sessions: List[BrowserSession] = []
+
+    async def __aenter__(self) -> List[BrowserSession]:
+        actors = await self.client.create_browsers(self.count, self.concurrency, **self.options)
+        self.sessions = [BrowserSession(self.client, self.ready_timeout, actor) for actor in actors]
+        try:
+            infos = await asyncio.gather(*(self.client.wait_until_ready(s.browser_id, self.ready_timeout) for s in self.sessions))
+            for session, info in zip(self.sessions, infos):
+                session.info = info
+        except BaseException:
+            await asyncio.shield(self.close())
+            raise
+        return self.sessions
+
+    async def __aexit__(self, *exc):
+        await asyncio.shield(self.close())
+
+    async def close(self):
+        await self.client.delete_browsers([s.browser_id for s in self.sessions], self.concurrency)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _detail(response: httpx.Response) -> str:
+    try:
+        return response.json().get("detail", response.text)
+    except ValueError:
+        return response.text
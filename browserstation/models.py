@@ -0,0 +1,73 @@
+# models.py
+from pydantic import BaseModel
+from typing import Optional, List
+from uuid import UUID
+
+class Health(BaseModel):
+    status: str
+    ray_status: bool
+    ray: Optional[str] = None
+    browsers: dict
+    cluster: dict
+    available: dict
+
+class BrowserInfo(BaseModel):
+    browser_id: UUID
+    pod_ip: str
+    websocket_url: Optional[str] = None
+    chrome_ready: bool
+    cache: Optional[dict] = None
+    blocked: Optional[dict] = None
+    node_id: Optional[str] = None
+    profile: Optional[str] = None
+    memory: Optional[int] = None  # Chrome resident memory in bytes
+    browser_context_id: Optional[str] = None  # the session's own context in the shared Chrome
+
+class ActorInfo(BaseModel):
+    browser_id: UUID
+    proxy_url: str
+
+class BrowserStatus(BaseModel):
+    browser_id: UUID
+    status: str
+
+class SnapshotInfo(BaseModel):
+    snapshot_id: str
+    size: int
+    cookies: int
+    origins: List[str]
+    created_at: float
+
+class JobInfo(BaseModel):
+    job_id: str
+    state: str
+    total: int
+    succeeded: int
+    failed: int
+    created_at: float
+    finished_at: Optional[float] = None
+
+class DrainStatus(BaseModel):
+    node_id: str
+    state: str
+    started_at: Optional[float] = None
+    deadline: Optional[float] = None
+    browsers: List[str] = []
+
+class Usage(BaseModel):
+    tenant: str
+    sessions: int
+    cpus: float
+    max_sessions: Optional[int] = None
+    max_cpus: Optional[float] = None
+
+class BrowserEntry(BaseModel):
+    browser_id: str
+    state: str
+    websocket_url: Optional[str] = None
+    labels: dict = {}
+    created_at: Optional[float] = None
+    node_id: Optional[str] = None
+
+class BrowserList(BaseModel):
+    browsers: List[BrowserEntry]
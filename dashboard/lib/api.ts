@@ -105,16 +105,13 @@ class APIClient {
   }
 
   getWebSocketUrl(browserId: string, websocketPath?: string): string {
-    // If we have the full websocket path from the API, use it
-    if (websocketPath) {
-      const wsProtocol = API_URL.startsWith('https') ? 'wss' : 'ws'
-      const baseUrl = API_URL.replace(/^https?/, wsProtocol)
-      return `${baseUrl}${websocketPath}`
-    }
-    // Otherwise construct a basic URL
     const wsProtocol = API_URL.startsWith('https') ? 'wss' : 'ws'
     const baseUrl = API_URL.replace(/^https?/, wsProtocol)
-    return `${baseUrl}/ws/browsers/${browserId}/devtools/browser`
+    // If we have the full websocket path from the API, use it
+    // Otherwise construct a basic URL
+    const url = `${baseUrl}${websocketPath || `/ws/browsers/${browserId}/devtools/browser`}`
+    // Browsers can't set headers on a WebSocket, so the key goes in the query
+    return API_KEY ? `${url}?api_key=${encodeURIComponent(API_KEY)}` : url
   }
 }
 
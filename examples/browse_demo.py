@@ -3,16 +3,17 @@
 # requires-python = ">=3.11"
 # dependencies = [
 #     "playwright>=1.40.0",
-#     "requests>=2.31.0",
+#     "browserstation",
 # ]
 # ///
 
 import asyncio
 import random
 import time
-import requests
 from playwright.async_api import async_playwright
 
+from browserstation import AsyncBrowserStation
+
 API_URL = "http://localhost:8050"
 NUM_BROWSERS = 5
 MAX_CONCURRENT_BROWSERS = 5  # browserstation might have a limit
@@ -304,150 +305,94 @@ async def keep_browser_alive(page, duration):
             pass
         await asyncio.sleep(5)
 
-async def browse_session(browser_num, start_delay):
+async def browse_session(client, browser_num, start_delay):
     """Run a single browser session"""
     # Wait for staggered start
     await asyncio.sleep(start_delay)
     
     session_start_time = time.time()  # Track overall session time
-    browser_id = None
-    playwright = None
-    browser = None
-    keep_alive_task = None
     
     try:
-        # Create a browser instance in browserstation
+        # Create a browser instance in browserstation; it is deleted when the block exits
         print(f"[Browser {browser_num}] Creating browser instance...")
-        resp = requests.post(f"{API_URL}/browsers", timeout=30)
-        resp.raise_for_status()
-        browser_id = resp.json()["browser_id"]
-        print(f"[Browser {browser_num}] Created with ID: {browser_id}")
-        
-        # Wait for browser to be ready
-        await asyncio.sleep(3)
-        
-        # Get browser details with retries
-        max_retries = 3
-        for retry in range(max_retries):
-            try:
-                details = requests.get(f"{API_URL}/browsers/{browser_id}", timeout=30).json()
-                if "websocket_url" in details:
-                    websocket_url = details["websocket_url"]
-                    break
-                else:
-                    print(f"[Browser {browser_num}] Waiting for websocket URL... (attempt {retry + 1})")
-                    await asyncio.sleep(2)
-            except Exception as e:
-                print(f"[Browser {browser_num}] Error getting browser details: {e}")
-                await asyncio.sleep(2)
-        else:
-            raise Exception("Could not get websocket URL after retries")
-        
-        if websocket_url.startswith("ws"):
-            ws_url = websocket_url
-        else:
-            ws_url = f"ws://localhost:8050{websocket_url}"
-        
-        print(f"[Browser {browser_num}] Connecting to: {ws_url}")
-        
-        # Connect to the browser via Playwright
-        playwright = await async_playwright().start()
-        browser = await playwright.chromium.connect_over_cdp(ws_url)
-        context = browser.contexts[0]  # Use existing context
-        page = context.pages[0] if context.pages else await context.new_page()
-        
-        # Start keep-alive task to prevent browser from being cleaned up
-        keep_alive_task = asyncio.create_task(keep_browser_alive(page, 95))
-        
-        browsing_start_time = time.time()  # Track actual browsing time
-        
-        try:
-            # Browse Wikipedia (approximately 35-40 seconds)
-            # Set up timing for each section
-            wiki_start = time.time()
-            await browse_wikipedia(page, browser_num)
-            wiki_elapsed = time.time() - wiki_start
+        async with client.session(ready_timeout=60) as session:
+            print(f"[Browser {browser_num}] Created with ID: {session.browser_id}")
+            print(f"[Browser {browser_num}] Connecting to: {session.ws_url}")
             
-            # Ensure we spend at least 40 seconds on Wikipedia section
-            if wiki_elapsed < 40:
-                wait_time = 40 - wiki_elapsed
-                print(f"[Browser {browser_num}] Waiting {wait_time:.1f}s to complete Wikipedia section...")
-                await asyncio.sleep(wait_time)
-            
-            # Browse Hacker News (approximately 45-50 seconds)
-            hn_start = time.time()
-            await browse_hackernews(page, browser_num)
-            hn_elapsed = time.time() - hn_start
-            
-            # Ensure we spend at least 40 seconds on HN section
-            if hn_elapsed < 40:
-                wait_time = 40 - hn_elapsed
-                print(f"[Browser {browser_num}] Waiting {wait_time:.1f}s to complete HN section...")
-                await asyncio.sleep(wait_time)
+            # Connect to the browser via Playwright
+            async with async_playwright() as playwright:
+                browser = await playwright.chromium.connect_over_cdp(session.ws_url, headers=client.headers)
+                context = browser.contexts[0]  # Use existing context
+                page = context.pages[0] if context.pages else await context.new_page()
+                
+                # Start keep-alive task to prevent browser from being cleaned up
+                keep_alive_task = asyncio.create_task(keep_browser_alive(page, 95))
+                
+                browsing_start_time = time.time()  # Track actual browsing time
+                
+                try:
+                    # Browse Wikipedia (approximately 35-40 seconds)
+                    # Set up timing for each section
+                    wiki_start = time.time()
+                    await browse_wikipedia(page, browser_num)
+                    wiki_elapsed = time.time() - wiki_start
+                    
+                    # Ensure we spend at least 40 seconds on Wikipedia section
+                    if wiki_elapsed < 40:
+                        wait_time = 40 - wiki_elapsed
+                        print(f"[Browser {browser_num}] Waiting {wait_time:.1f}s to complete Wikipedia section...")
+                        await asyncio.sleep(wait_time)
+                    
+                    # Browse Hacker News (approximately 45-50 seconds)
+                    hn_start = time.time()
+                    await browse_hackernews(page, browser_num)
+                    hn_elapsed = time.time() - hn_start
+                    
+                    # Ensure we spend at least 40 seconds on HN section
+                    if hn_elapsed < 40:
+                        wait_time = 40 - hn_elapsed
+                        print(f"[Browser {browser_num}] Waiting {wait_time:.1f}s to complete HN section...")
+                        await asyncio.sleep(wait_time)
+                    
+                    # Ensure each browser runs for ~90 seconds of actual browsing
+                    browsing_elapsed = time.time() - browsing_start_time
+                    if browsing_elapsed < 90:
+                        wait_time = 90 - browsing_elapsed
+                        print(f"[Browser {browser_num}] Waiting {wait_time:.1f} more seconds...")
+                        await asyncio.sleep(wait_time)
+                    
+                except Exception as e:
+                    print(f"[Browser {browser_num}] Error during browsing: {e}")
+                finally:
+                    keep_alive_task.cancel()
+                    try:
+                        await browser.close()
+                    except Exception:
+                        pass
             
-        except Exception as e:
-            print(f"[Browser {browser_num}] Error during browsing: {e}")
-        
-        # Ensure each browser runs for ~90 seconds of actual browsing
-        browsing_elapsed = time.time() - browsing_start_time
-        if browsing_elapsed < 90:
-            wait_time = 90 - browsing_elapsed
-            print(f"[Browser {browser_num}] Waiting {wait_time:.1f} more seconds...")
-            await asyncio.sleep(wait_time)
-        
-        total_elapsed = time.time() - session_start_time
-        print(f"[Browser {browser_num}] Total session time: {total_elapsed:.1f} seconds (browsing: 90.0s)")
-        
-        # Cancel keep-alive task
-        if keep_alive_task:
-            keep_alive_task.cancel()
-        
-        # NOW close the browser connection after we've waited the full time
-        try:
-            if browser:
-                await browser.close()
-        except:
-            pass
-        
-        try:
-            if playwright:
-                await playwright.stop()
-        except:
-            pass
+            total_elapsed = time.time() - session_start_time
+            print(f"[Browser {browser_num}] Total session time: {total_elapsed:.1f} seconds")
+            print(f"[Browser {browser_num}] Cleaning up browser {session.browser_id}...")
     
     except Exception as e:
         print(f"[Browser {browser_num}] Error in session: {e}")
-    
-    finally:
-        # Cancel keep-alive task if it exists
-        if keep_alive_task and not keep_alive_task.done():
-            keep_alive_task.cancel()
-        
-        # Wait a bit before cleanup to ensure browser had full time
-        await asyncio.sleep(2)
-        
-        # Clean up browser instance only
-        if browser_id:
-            try:
-                print(f"[Browser {browser_num}] Cleaning up browser {browser_id}...")
-                requests.delete(f"{API_URL}/browsers/{browser_id}", timeout=10)
-            except Exception as e:
-                print(f"[Browser {browser_num}] Error cleaning up: {e}")
 
 async def main():
     """Run multiple browser sessions concurrently with staggered starts"""
     print(f"Starting {NUM_BROWSERS} browser sessions with {STAGGER_DELAY} second delays...")
     print("Each browser will visit different Wikipedia topics and Hacker News stories.\n")
     
-    # Create tasks for all browser sessions
-    tasks = []
-    for i in range(NUM_BROWSERS):
-        start_delay = i * STAGGER_DELAY
-        task = asyncio.create_task(browse_session(i + 1, start_delay))
-        tasks.append(task)
-    
-    # Wait for all tasks to complete
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    # One pooled client shared by every session
+    async with AsyncBrowserStation(API_URL) as client:
+        # Create tasks for all browser sessions
+        tasks = []
+        for i in range(NUM_BROWSERS):
+            start_delay = i * STAGGER_DELAY
+            task = asyncio.create_task(browse_session(client, i + 1, start_delay))
+            tasks.append(task)
+        
+        # Wait for all tasks to complete
+        results = await asyncio.gather(*tasks, return_exceptions=True)
     
     # Print any exceptions that occurred
     for i, result in enumerate(results):
@@ -1,15 +1,16 @@
 
 import argparse
+import asyncio
 import json
-import time
 from typing import Optional
 
-import requests
 from pydantic import BaseModel, HttpUrl
 
 from crewai import Agent, Task, Crew
 from crewai.tools import BaseTool
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+
+from browserstation import AsyncBrowserStation
 
 API_URL = "http://localhost:8050"
 
@@ -25,58 +26,42 @@ class BrowserstationTool(BaseTool):
     args_schema = BrowserToolInput
 
     def _run(self, url: str, screenshot_path: Optional[str] = None) -> str:
-        browser_id = None
-        result = {"ok": False}
-
         try:
-            resp = requests.post(f"{API_URL}/browsers", timeout=30)
-            resp.raise_for_status()
-            browser_id = resp.json()["browser_id"]
-
-            time.sleep(5)
-
-            details = requests.get(
-                f"{API_URL}/browsers/{browser_id}", timeout=30
-            ).json()
-            websocket_url = details["websocket_url"]
+            result = asyncio.run(self._visit(url, screenshot_path))
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
 
-            if websocket_url.startswith("ws"):
-                ws_url = websocket_url
-            else:
-                ws_url = f"ws://localhost:8050{websocket_url}"
+        return json.dumps(result, indent=2)
 
-            with sync_playwright() as p:
-                browser = p.chromium.connect_over_cdp(ws_url)
-                context = browser.new_context()
-                page = context.new_page()
+    async def _visit(self, url: str, screenshot_path: Optional[str]) -> dict:
+        result = {"ok": False}
 
-                page.goto(url)
-                time.sleep(2)
+        async with AsyncBrowserStation(API_URL) as client:
+            # Deleted when the block exits, even if navigation fails
+            async with client.session() as session:
+                async with async_playwright() as p:
+                    browser = await p.chromium.connect_over_cdp(session.ws_url, headers=client.headers)
+                    context = await browser.new_context()
+                    page = await context.new_page()
 
-                result.update(
-                    {
-                        "ok": True,
-                        "title": page.title(),
-                        "final_url": page.url,
-                    }
-                )
+                    await page.goto(url)
+                    await page.wait_for_load_state("load")
 
-                if screenshot_path:
-                    page.screenshot(path=screenshot_path)
-                    result["screenshot_path"] = screenshot_path
+                    result.update(
+                        {
+                            "ok": True,
+                            "title": await page.title(),
+                            "final_url": page.url,
+                        }
+                    )
 
-                browser.close()
+                    if screenshot_path:
+                        await page.screenshot(path=screenshot_path)
+                        result["screenshot_path"] = screenshot_path
 
-        except Exception as e:
-            result["error"] = str(e)
-        finally:
-            if browser_id:
-                try:
-                    requests.delete(f"{API_URL}/browsers/{browser_id}", timeout=10)
-                except Exception:
-                    pass
+                    await browser.close()
 
-        return json.dumps(result, indent=2)
+        return result
 
 
 def main(url: str, screenshot_path: Optional[str] = None) -> None:
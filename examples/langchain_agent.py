@@ -1,11 +1,12 @@
+import asyncio
 import json
 import os
-import time
 import tempfile
-import requests
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 from pydantic import BaseModel, HttpUrl
 
+from browserstation import AsyncBrowserStation
+
 from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage
@@ -18,58 +19,55 @@ class BrowserInput(BaseModel):
     url: HttpUrl
     screenshot: bool = False
     html_chars: int = 0
+    elements: bool = False
 
 
-@tool("browserstation_tool", args_schema=BrowserInput)
-def browserstation_tool(
-    url: HttpUrl, screenshot: bool = False, html_chars: int = 0
-) -> str:
-    browser_id = None
+async def visit(url: str, screenshot: bool, html_chars: int, elements: bool) -> dict:
     result = {"ok": False}
 
-    try:
-        resp = requests.post(f"{API_URL}/browsers", timeout=30)
-        resp.raise_for_status()
-        browser_id = resp.json()["browser_id"]
+    async with AsyncBrowserStation(API_URL) as client:
+        # Deleted when the block exits, even if the page fails to load
+        async with client.session() as session:
+            async with async_playwright() as p:
+                remote_browser = await p.chromium.connect_over_cdp(session.ws_url, headers=client.headers)
+                context = await remote_browser.new_context()
+                page = await context.new_page()
+                await page.goto(url)
+                await page.wait_for_load_state("load")
 
-        time.sleep(5)
+                result["ok"] = True
+                result["title"] = await page.title()
+                result["final_url"] = page.url
 
-        details = requests.get(f"{API_URL}/browsers/{browser_id}", timeout=30).json()
-        ws_url = details["websocket_url"]
-        if not ws_url.startswith(("ws://", "wss://")):
-            ws_url = f"ws://localhost:8050{ws_url}"
+                if screenshot:
+                    fd, path = tempfile.mkstemp(suffix=".png")
+                    os.close(fd)
+                    await page.screenshot(path=path)
+                    result["screenshot_path"] = path
 
-        with sync_playwright() as p:
-            remote_browser = p.chromium.connect_over_cdp(ws_url)
-            context = remote_browser.new_context()
-            page = context.new_page()
-            page.goto(str(url))
-            page.wait_for_load_state("load")
+                if html_chars:
+                    result["html_snippet"] = (await page.content())[:html_chars]
 
-            result["ok"] = True
-            result["title"] = page.title()
-            result["final_url"] = page.url
+                if elements:
+                    # Links, buttons, inputs and visible text, computed next to Chrome
+                    page_view = await client.extract(session.browser_id, diff=False)
+                    result["elements"] = page_view["elements"]
+                    result["text"] = page_view["text"]
 
-            if screenshot:
-                fd, path = tempfile.mkstemp(suffix=".png")
-                os.close(fd)
-                page.screenshot(path=path)
-                result["screenshot_path"] = path
+                await context.close()
+                await remote_browser.close()
 
-            if html_chars:
-                result["html_snippet"] = page.content()[:html_chars]
+    return result
 
-            context.close()
-            remote_browser.close()
 
+@tool("browserstation_tool", args_schema=BrowserInput)
+def browserstation_tool(
+    url: HttpUrl, screenshot: bool = False, html_chars: int = 0, elements: bool = False
+) -> str:
+    try:
+        result = asyncio.run(visit(str(url), screenshot, html_chars, elements))
     except Exception as e:
-        result["error"] = repr(e)
-    finally:
-        if browser_id:
-            try:
-                requests.delete(f"{API_URL}/browsers/{browser_id}", timeout=10)
-            except Exception:
-                pass
+        result = {"ok": False, "error": repr(e)}
 
     return json.dumps(result, indent=2)
 
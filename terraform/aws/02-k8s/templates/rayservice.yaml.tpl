@@ -6,6 +6,10 @@ metadata:
 spec:
   rayClusterConfig:
     rayVersion: "${ray_version}"
+    enableInTreeAutoscaling: true
+    autoscalerOptions:
+      upscalingMode: Default
+      idleTimeoutSeconds: 60
     headGroupSpec:
       rayStartParams:
         dashboard-host: "0.0.0.0"
@@ -25,7 +29,7 @@ spec:
               ray start --head --port=6379 \
               --dashboard-host=0.0.0.0 --metrics-export-port=8080 \
               --num-cpus=0 --block & \
-              sleep 5 && uvicorn app.main:app --host 0.0.0.0 --port 8050%{ if api_key_secret != "" }
+              python -m app.shard --host 0.0.0.0 --port 8050 --workers 2%{ if api_key_secret != "" }
             envFrom:
             - secretRef:
                 name: ${api_key_secret}%{ endif }
@@ -42,12 +46,41 @@ spec:
       maxReplicas: 30
       rayStartParams:
         num-cpus: "4"
+        # `chrome-full` places POST /browsers {"profile": "full"} here (app/profiles.py)
+        resources: '"{\"browser\": 4, \"chrome-full\": 4}"'
       template:
         spec:
+          # Lets actors read Chrome's memory from /proc for GET /browsers/{id}
+          shareProcessNamespace: true
+          volumes:
+          - name: browser-cache
+            hostPath:
+              path: /var/cache/browserstation
+              type: DirectoryOrCreate
+          initContainers:
+          # hostPath directories are created root-owned, the Ray image runs as a regular user
+          - name: browser-cache-permissions
+            image: busybox:1.36
+            command: ["sh", "-c", "chmod 1777 /var/cache/browserstation"]
+            volumeMounts:
+            - name: browser-cache
+              mountPath: /var/cache/browserstation
           containers:
           - name: ray-worker
             image: ${image}
             imagePullPolicy: IfNotPresent
+            env:
+            - name: BROWSERSTATION_CHROME_PROFILE
+              value: "full"
+            # Chrome's RSS is held against its limit by the node's memory governor
+            - name: BROWSERSTATION_CHROME_MEMORY_LIMIT
+              valueFrom:
+                resourceFieldRef:
+                  containerName: chrome
+                  resource: limits.memory
+            volumeMounts:
+            - name: browser-cache
+              mountPath: /var/cache/browserstation
             resources:
               requests:
                 cpu: "500m"
@@ -70,4 +103,80 @@ spec:
                 memory: "500Mi"
               limits:
                 cpu: "500m"
-                memory: "500Mi"
\ No newline at end of file
+                memory: "500Mi"
+    - groupName: browser-workers-lite
+      minReplicas: 0
+      maxReplicas: 30
+      rayStartParams:
+        num-cpus: "4"
+        # Low-memory Chrome, for POST /browsers {"profile": "lite"}; args must match
+        # PROFILES["lite"] in app/profiles.py
+        resources: '"{\"browser\": 4, \"chrome-lite\": 4}"'
+      template:
+        spec:
+          # Lets actors read Chrome's memory from /proc for GET /browsers/{id}
+          shareProcessNamespace: true
+          volumes:
+          - name: browser-cache
+            hostPath:
+              path: /var/cache/browserstation
+              type: DirectoryOrCreate
+          initContainers:
+          # hostPath directories are created root-owned, the Ray image runs as a regular user
+          - name: browser-cache-permissions
+            image: busybox:1.36
+            command: ["sh", "-c", "chmod 1777 /var/cache/browserstation"]
+            volumeMounts:
+            - name: browser-cache
+              mountPath: /var/cache/browserstation
+          containers:
+          - name: ray-worker
+            image: ${image}
+            imagePullPolicy: IfNotPresent
+            env:
+            - name: BROWSERSTATION_CHROME_PROFILE
+              value: "lite"
+            # Chrome's RSS is held against its limit by the node's memory governor
+            - name: BROWSERSTATION_CHROME_MEMORY_LIMIT
+              valueFrom:
+                resourceFieldRef:
+                  containerName: chrome
+                  resource: limits.memory
+            volumeMounts:
+            - name: browser-cache
+              mountPath: /var/cache/browserstation
+            resources:
+              requests:
+                cpu: "500m"
+                memory: "500Mi"
+              limits:
+                cpu: "500m"
+                memory: "500Mi"
+          - name: chrome
+            image: zenika/alpine-chrome:100
+            args:
+            - "--no-sandbox"
+            - "--remote-debugging-address=0.0.0.0"
+            - "--remote-debugging-port=9222"
+            - "--disable-extensions"
+            - "--disable-site-isolation-trials"
+            - "--disable-features=site-per-process,IsolateOrigins,Translate,BackForwardCache,MediaRouter,OptimizationHints"
+            - "--renderer-process-limit=2"
+            - "--disk-cache-size=33554432"
+            - "--js-flags=--max-old-space-size=256"
+            - "--disable-background-networking"
+            - "--disable-component-update"
+            - "--disable-default-apps"
+            - "--disable-gpu"
+            - "--mute-audio"
+            - "--no-first-run"
+            ports:
+            - containerPort: 9222
+              name: devtools
+            resources:
+              requests:
+                cpu: "500m"
+                memory: "384Mi"
+              limits:
+                cpu: "500m"
+                memory: "384Mi"
\ No newline at end of file
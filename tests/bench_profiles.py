@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Startup time and memory of each Chrome launch profile in app/profiles.py,
+for sizing the Chrome sidecar requests of each worker group.
+
+Launches a local Chrome once per profile and round, measures how long
+DevTools takes to answer, then the resident memory of the whole process tree
+when idle and with --tabs pages loaded from --url.
+
+    python tests/bench_profiles.py --chrome /usr/bin/chromium --tabs 4 --url https://example.com
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cdp import CDPSession  # noqa: E402
+from app.pages import open_page, navigate  # noqa: E402
+from app.profiles import PROFILES, chrome_memory  # noqa: E402
+
+PORT = 9322  # clear of a Chrome sidecar already running on 9222
+START_TIMEOUT = 30
+# The zenika/alpine-chrome entrypoint adds these in the sidecar
+ENTRYPOINT_ARGS = ["--headless", "--disable-dev-shm-usage"]
+
+
+def launch(chrome: str, args: list, user_data_dir: str) -> subprocess.Popen:
+    args = [a.replace("--remote-debugging-port=9222", f"--remote-debugging-port={PORT}") for a in args]
+    command = [chrome, *ENTRYPOINT_ARGS, *args, f"--user-data-dir={user_data_dir}", "about:blank"]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_devtools(deadline: float) -> str:
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                response = await client.get(f"http://127.0.0.1:{PORT}/json/version", timeout=1)
+                return response.json()["webSocketDebuggerUrl"]
+            except (httpx.HTTPError, KeyError, ValueError):
+                await asyncio.sleep(0.02)
+    raise TimeoutError("Chrome did not answer on DevTools")
+
+
+async def settled_memory(settle: float) -> int:
+    """Memory once it stops growing, or after `settle` seconds"""
+    deadline = time.monotonic() + settle
+    last = chrome_memory(PORT) or 0
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        current = chrome_memory(PORT) or 0
+        if abs(current - last) < 1 << 20:
+            return current
+        last = current
+    return last
+
+
+async def run_once(chrome: str, profile: str, tabs: int, url: str, settle: float) -> dict:
+    user_data_dir = tempfile.mkdtemp(prefix=f"bench-{profile}-")
+    started = time.monotonic()
+    process = launch(chrome, PROFILES[profile].args, user_data_dir)
+    try:
+        ws_url = await wait_devtools(started + START_TIMEOUT)
+        startup = time.monotonic() - started
+        idle = await settled_memory(settle)
+
+        cdp = await CDPSession.connect(ws_url)
+        loaded = time.monotonic()
+        sessions = await asyncio.gather(*(open_page(cdp) for _ in range(tabs)))
+        await asyncio.gather(*(navigate(cdp, session_id, url, 30) for _, session_id in sessions))
+        load_time = time.monotonic() - loaded
+        busy = await settled_memory(settle)
+        await cdp.close()
+        return {"startup": startup, "idle": idle, "busy": busy, "load": load_time}
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chrome", default=os.getenv("CHROME", "chromium"), help="Chrome binary")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--tabs", type=int, default=4, help="pages open for the loaded measurement")
+    parser.add_argument("--url", default="https://example.com")
+    parser.add_argument("--settle", type=float, default=5.0, help="max seconds to wait for memory to settle")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if shutil.which(args.chrome) is None:
+        sys.exit(f"Chrome binary not found: {args.chrome}")
+    if not os.path.isdir("/proc"):
+        sys.exit("Memory is read from /proc, run this on Linux")
+
+    results = {}
+    for profile in args.profiles:
+        runs = [await run_once(args.chrome, profile, args.tabs, args.url, args.settle) for _ in range(args.rounds)]
+        results[profile] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'profile':<8} {'startup':>9} {'idle RSS':>10} {f'{args.tabs} tabs RSS':>12} {'load':>8}")
+    for profile, r in results.items():
+        print(f"{profile:<8} {r['startup']:>8.2f}s {r['idle'] / 2**20:>8.0f}Mi {r['busy'] / 2**20:>10.0f}Mi {r['load']:>7.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Fake Chrome DevTools endpoint for running BrowserStation without Chrome.
+
+Serves /json/version and a browser-level WebSocket on the Chrome port,
+keeps a target list, and answers the CDP methods the API and actors send
+(Target.* with browser contexts and target discovery, Page.navigate with
+its load events, Runtime.evaluate, Storage, Memory). Anything else gets an
+empty result. /stats reports the open
+WebSocket connections, so leaks of upstream connections show up.
+
+    python tests/fake_cdp.py --port 9222
+"""
+
+import json
+import uuid
+import base64
+import asyncio
+import argparse
+import itertools
+from typing import Dict
+
+import websockets
+from websockets.datastructures import Headers
+from websockets.http11 import Response
+
+
+class FakeChrome:
+    def __init__(self, port: int, latency: float = 0.0):
+        self.port = port
+        self.latency = latency  # seconds added to every command
+        self.browser_id = str(uuid.uuid4())
+        self.targets: Dict[str, dict] = {}
+        self.contexts: Dict[str, object] = {}  # browser context id -> connection disposing it on detach
+        self.discovering = set()  # connections with target discovery on
+        self.connections = 0
+        self.commands = 0
+        self._ids = itertools.count(1)
+
+    def _json(self, payload) -> Response:
+        body = json.dumps(payload).encode()
+        headers = Headers([("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+        return Response(200, "OK", headers, body)
+
+    def process_request(self, connection, request):
+        if request.path == "/json/version":
+            return self._json({
+                "Browser": "FakeChrome/1.0",
+                "Protocol-Version": "1.3",
+                "webSocketDebuggerUrl": f"ws://localhost:{self.port}/devtools/browser/{self.browser_id}",
+            })
+        if request.path in ("/json", "/json/list"):
+            return self._json([
+                {**target, "webSocketDebuggerUrl": f"ws://localhost:{self.port}/devtools/page/{target_id}"}
+                for target_id, target in self.targets.items()
+            ])
+        if request.path == "/stats":
+            return self._json({
+                "connections": self.connections, "commands": self.commands,
+                "targets": len(self.targets), "contexts": len(self.contexts),
+            })
+        return None  # WebSocket handshake
+
+    async def handler(self, ws):
+        self.connections += 1
+        try:
+            async for message in ws:
+                await self.dispatch(ws, json.loads(message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.connections -= 1
+            self.discovering.discard(ws)
+            for context_id, owner in list(self.contexts.items()):
+                if owner is ws:
+                    await self._dispose(context_id)
+
+    async def _broadcast(self, method: str, params: dict):
+        for ws in list(self.discovering):
+            try:
+                await ws.send(json.dumps({"method": method, "params": params}))
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+    async def _dispose(self, context_id: str):
+        self.contexts.pop(context_id, None)
+        for target_id, target in list(self.targets.items()):
+            if target["browserContextId"] == context_id:
+                del self.targets[target_id]
+                await self._broadcast("Target.targetDestroyed", {"targetId": target_id})
+
+    async def dispatch(self, ws, message: dict):
+        self.commands += 1
+        method, params = message.get("method"), message.get("params") or {}
+        session_id = message.get("sessionId")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        result = {}
+        events = []
+        if method == "Target.createTarget":
+            target_id = f"T{next(self._ids)}"
+            self.targets[target_id] = target = {
+                "targetId": target_id, "type": "page", "url": params.get("url", "about:blank"), "title": "",
+                "attached": False, "browserContextId": params.get("browserContextId", "DEFAULT"),
+            }
+            await self._broadcast("Target.targetCreated", {"targetInfo": target})
+            result = {"targetId": target_id}
+        elif method == "Target.createBrowserContext":
+            context_id = f"C{next(self._ids)}"
+            self.contexts[context_id] = ws if params.get("disposeOnDetach") else None
+            result = {"browserContextId": context_id}
+        elif method == "Target.disposeBrowserContext":
+            await self._dispose(params.get("browserContextId"))
+        elif method == "Target.getBrowserContexts":
+            result = {"browserContextIds": list(self.contexts)}
+        elif method == "Target.setDiscoverTargets":
+            if params.get("discover"):
+                self.discovering.add(ws)
+            else:
+                self.discovering.discard(ws)
+        elif method == "Target.setAutoAttach":
+            if params.get("autoAttach") and session_id is None:
+                for target in self.targets.values():
+                    events.append(("Target.attachedToTarget", {
+                        "sessionId": f"S{target['targetId']}", "targetInfo": target, "waitingForDebugger": False,
+                    }))
+        elif method == "Target.detachFromTarget":
+            events = [("Target.detachedFromTarget", {"sessionId": params.get("sessionId")})]
+        elif method == "Target.attachToTarget":
+            result = {"sessionId": f"S{params['targetId']}"}
+        elif method == "Target.closeTarget":
+            closed = self.targets.pop(params.get("targetId"), None) is not None
+            if closed:
+                await self._broadcast("Target.targetDestroyed", {"targetId": params["targetId"]})
+            result = {"success": closed}
+        elif method == "Target.getTargets":
+            result = {"targetInfos": list(self.targets.values())}
+        elif method == "Target.getTargetInfo":
+            target = self.targets.get(params.get("targetId"))
+            if target is None:
+                await ws.send(json.dumps({"id": message.get("id"), "error": {"code": -32602, "message": "No target with given id found"}}))
+                return
+            result = {"targetInfo": target}
+        elif method == "Page.createIsolatedWorld":
+            result = {"executionContextId": next(self._ids)}
+        elif method == "Page.navigate":
+            target = self.targets.get((session_id or "S")[1:])
+            if target is not None:
+                target["url"] = params["url"]
+            result = {"frameId": "F1", "loaderId": "L1"}
+            events = [
+                ("Network.responseReceived", {"type": "Document", "loaderId": "L1", "response": {"url": params["url"], "status": 200}}),
+                ("Page.loadEventFired", {"timestamp": 0}),
+            ]
+        elif method == "Runtime.evaluate":
+            result = {"result": {"type": "string", "value": ""}}
+        elif method == "Storage.getCookies":
+            result = {"cookies": []}
+        elif method in ("Page.captureScreenshot", "Page.printToPDF"):
+            result = {"data": base64.b64encode(b"fake").decode()}
+        elif method == "Page.getLayoutMetrics":
+            result = {"cssContentSize": {"width": 1280, "height": 720}}
+
+        response = {"id": message.get("id"), "result": result}
+        if session_id:
+            response["sessionId"] = session_id
+        await ws.send(json.dumps(response))
+        for event, event_params in events:
+            event_message = {"method": event, "params": event_params}
+            if session_id:
+                event_message["sessionId"] = session_id
+            await ws.send(json.dumps(event_message))
+
+    async def serve(self, host: str = "0.0.0.0"):
+        async with websockets.serve(self.handler, host, self.port, process_request=self.process_request, max_size=None):
+            await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Chrome DevTools endpoint")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9222)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every command")
+    args = parser.parse_args()
+    asyncio.run(FakeChrome(args.port, args.latency).serve(args.host))
+
+
+if __name__ == "__main__":
+    main()
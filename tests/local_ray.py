@@ -0,0 +1,119 @@
+"""
+A private Ray head for the scripts in tests/.
+
+It runs with its own temp dir, on free ports and in its own process group,
+so a script never attaches to a Ray cluster the developer already runs,
+and stopping it stops only this one.
+
+    with LocalRay(num_cpus=2, resources={"browser": 8}) as cluster:
+        ray.init(cluster.address)
+"""
+
+import os
+import json
+import time
+import shutil
+import signal
+import socket
+import tempfile
+import subprocess
+from typing import Dict, List, Optional
+
+import ray
+
+START_TIMEOUT = 60
+STOP_TIMEOUT = 30
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+
+class LocalRay:
+    def __init__(self, num_cpus: int = 1, resources: Optional[Dict[str, float]] = None, dashboard: bool = False,
+                 args: Optional[List[str]] = None, env: Optional[Dict[str, str]] = None):
+        """
+        Initialize cluster.
+
+        Args:
+            num_cpus: CPUs the head advertises
+            resources: Custom resources the head advertises
+            dashboard: Start the dashboard, which the state API (list_actors) needs
+            args: Extra `ray start` arguments
+            env: Extra environment for the head's processes
+        """
+        self.num_cpus = num_cpus
+        self.resources = resources or {}
+        self.dashboard = dashboard
+        self.args = args or []
+        self.env = env or {}
+        self.ip = ray._private.services.get_node_ip_address()
+        self.port = free_port()
+        self.temp_dir = None
+        self.process = None
+
+    @property
+    def address(self) -> str:
+        """GCS address, for ray.init and RAY_ADDRESS"""
+        return f"{self.ip}:{self.port}"
+
+    def start(self):
+        # Short path: Ray's unix sockets live under it
+        self.temp_dir = tempfile.mkdtemp(prefix="ray-", dir="/tmp")
+        command = [
+            "ray", "start", "--head", "--block", "--disable-usage-stats",
+            f"--temp-dir={self.temp_dir}",
+            f"--port={self.port}",
+            f"--ray-client-server-port={free_port()}",
+            f"--dashboard-agent-listen-port={free_port()}",
+            f"--num-cpus={self.num_cpus}",
+            f"--resources={json.dumps(self.resources)}",
+        ]
+        if self.dashboard:
+            command += ["--include-dashboard=true", f"--dashboard-port={free_port()}"]
+        else:
+            command += ["--include-dashboard=false"]
+        # Nodes started by the head (fake autoscaler workers) default to the temp dir too
+        env = dict(os.environ, RAY_TMPDIR=self.temp_dir, **self.env)
+        log = open(os.path.join(self.temp_dir, "ray-start.log"), "wb")
+        self.process = subprocess.Popen(command + self.args, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        log.close()
+
+        deadline = time.time() + START_TIMEOUT
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"ray start exited with {self.process.returncode}, see {self.temp_dir}/ray-start.log")
+            status = subprocess.run(["ray", "status", f"--address={self.address}"], capture_output=True)
+            if status.returncode == 0:
+                return self
+            time.sleep(1)
+        self.stop()
+        raise RuntimeError(f"Ray head at {self.address} did not come up in {START_TIMEOUT}s")
+
+    def stop(self):
+        """Stop the head and everything it started, and nothing else"""
+        if self.process is None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            self.process.wait(STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+        except ProcessLookupError:
+            pass
+        # Workers outside the group find their raylet gone and exit on their own
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process = None
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
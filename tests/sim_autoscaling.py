@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Replay a browser load curve against a local fake-multinode Ray cluster and
+check the scaling decisions made from the demand signal.
+
+Runs without Kubernetes or Chrome: each fake worker node advertises one
+`browser` slot, and browsers are plain BrowserActors whose Chrome never answers.
+The cluster is private to the run (see local_ray.py), so a Ray cluster
+already running on the machine is left alone.
+
+    python tests/sim_autoscaling.py
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import tempfile
+
+import ray
+from ray.autoscaler.sdk import request_resources
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.autoscale import BROWSER_RESOURCE, demand  # noqa: E402
+from app.models import BrowserOptions  # noqa: E402
+from app.service import BrowserActor  # noqa: E402
+from local_ray import LocalRay  # noqa: E402
+
+HEADROOM = 1
+MAX_NODES = 8
+SETTLE_TIMEOUT = 120
+
+# (seconds since start, live sessions wanted)
+LOAD_CURVE = [(0, 0), (5, 3), (40, 6), (80, 2), (120, 0)]
+
+
+def apply_demand():
+    """One iteration of app.autoscale.autoscale_loop"""
+    current = demand(HEADROOM)
+    request_resources(bundles=[{BROWSER_RESOURCE: 1}] * current.target)
+    return current
+
+
+def wait_for_capacity(minimum: int):
+    deadline = time.time() + SETTLE_TIMEOUT
+    while time.time() < deadline:
+        current = apply_demand()
+        if current.capacity >= minimum and current.pending == 0:
+            return current
+        time.sleep(2)
+    raise AssertionError(f"Capacity never reached {minimum}: {current}")
+
+
+def fake_cluster() -> LocalRay:
+    """
+    A head node whose autoscaler launches worker raylets locally.
+
+    Same setup as ray.cluster_utils.AutoscalingCluster, which depends on an
+    example config that isn't shipped in the Ray wheels.
+    """
+    cluster = LocalRay(num_cpus=1, dashboard=True, env={"AUTOSCALER_UPDATE_INTERVAL_S": "1", "RAY_FAKE_CLUSTER": "1"})
+    config = {
+        "cluster_name": "browserstation-autoscaling-sim",
+        "max_workers": MAX_NODES,
+        "provider": {
+            "type": "fake_multinode",
+            "gcs_address": cluster.address,
+            "use_node_id_as_ip": True,
+            "disable_node_updaters": True,
+            "disable_launch_config_check": True,
+        },
+        "available_node_types": {
+            "ray.head.default": {"resources": {"CPU": 1}, "node_config": {}, "max_workers": 0},
+            "browser-workers": {
+                "resources": {"CPU": 1, BROWSER_RESOURCE: 1},
+                "node_config": {},
+                "min_workers": 0,
+                "max_workers": MAX_NODES,
+            },
+        },
+        "head_node_type": "ray.head.default",
+        "upscaling_speed": 1.0,
+        "idle_timeout_minutes": 0.25,
+        "auth": {},
+        "docker": {},
+        "file_mounts": {},
+        "cluster_synced_files": [],
+        "file_mounts_sync_continuously": False,
+        "rsync_exclude": [],
+        "rsync_filter": [],
+        "initialization_commands": [],
+        "setup_commands": [],
+        "head_setup_commands": [],
+        "worker_setup_commands": [],
+        "head_start_ray_commands": [],
+        "worker_start_ray_commands": [],
+    }
+    _, path = tempfile.mkstemp(suffix=".json")
+    with open(path, "w") as f:
+        json.dump(config, f)
+
+    cluster.args = [f"--autoscaling-config={path}"]
+    return cluster
+
+
+def main():
+    with fake_cluster() as cluster:
+        ray.init(cluster.address)
+        try:
+            replay()
+        finally:
+            ray.shutdown()
+
+
+def replay():
+    browsers = {}
+    start = time.time()
+    try:
+        for at, wanted in LOAD_CURVE:
+            time.sleep(max(0, start + at - time.time()))
+
+            while len(browsers) < wanted:
+                browser_id = str(uuid.uuid4())
+                browsers[browser_id] = BrowserActor.options(name=browser_id, lifetime="detached").remote(browser_id)
+                browsers[browser_id].start.remote(BrowserOptions())
+            while len(browsers) > wanted:
+                _, actor = browsers.popitem()
+                ray.kill(actor)
+
+            current = wait_for_capacity(wanted + HEADROOM)
+            print(f"t={time.time() - start:5.0f}s wanted={wanted} live={current.live} "
+                  f"capacity={current.capacity} target={current.target} nodes={current.sessions_per_node}")
+
+            # Scale-down must never take a node that still hosts a session
+            ray.get([actor.get_info.remote() for actor in browsers.values()], timeout=30)
+            assert current.live == wanted, f"Expected {wanted} live browsers, got {current.live}"
+
+        # With no load, idle nodes drain back to the headroom once their
+        # probes have exited
+        deadline = time.time() + 2 * SETTLE_TIMEOUT
+        while apply_demand().capacity > HEADROOM and time.time() < deadline:
+            time.sleep(5)
+        final = apply_demand()
+        print(f"idle capacity={final.capacity}")
+        assert final.capacity <= HEADROOM + 1, f"Idle nodes were not removed: {final}"
+        print("✓ Scaling decisions followed the load curve")
+    finally:
+        for actor in browsers.values():
+            ray.kill(actor)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Soak the API's proxy and browser lifecycle paths for leaks.
+
+Starts a private Ray head (tests/local_ray.py), the fake CDP server (tests/fake_cdp.py) on the
+Chrome port and the sharded API, then runs create / connect / delete churn
+with randomized endings: clean closes, aborted TCP connections, disconnects
+with commands in flight, deletes while connected and browsers never
+connected to. Every sample records the API processes' RSS and open file
+descriptors, asyncio tasks and relays across shards, the fake Chrome's open
+connections, and create/connect/delete latencies.
+
+Fails if RSS, file descriptors, tasks or p50 latencies trend upward after
+the warmup, or if relays, tasks and upstream connections don't return to
+their idle baseline once the churn stops.
+
+    python tests/soak.py --duration 14400 --concurrency 16 --csv soak.csv
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+from local_ray import LocalRay
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_KEY = "soak"
+CHROME_PORT = 9222
+
+# Ways a cycle ends, with their weights
+ENDINGS = {
+    "close": 4,          # client closes the WebSocket, then deletes the browser
+    "abort": 2,          # client drops the TCP connection without a close frame
+    "in_flight": 2,      # client drops the connection with commands unanswered
+    "delete_first": 1,   # browser deleted while the client is still connected
+    "no_connect": 1,     # browser created and deleted without a connection
+}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def theil_sen(points: List[tuple]) -> float:
+    """Median of pairwise slopes: a trend that ignores spikes from in-flight churn"""
+    if len(points) > 200:
+        step = len(points) / 200
+        points = [points[int(i * step)] for i in range(200)]
+    slopes = [
+        (y2 - y1) / (x2 - x1)
+        for i, (x1, y1) in enumerate(points)
+        for x2, y2 in points[i + 1:]
+        if x2 > x1
+    ]
+    return statistics.median(slopes) if slopes else 0.0
+
+
+def process_tree(pid: int) -> List[int]:
+    """`pid` and its child processes, the API front process and its workers"""
+    pids = [pid]
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                ppid = int(f.read().rsplit(b")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            pids.append(int(entry))
+    return pids
+
+
+def rss_and_fds(pids: List[int]) -> tuple:
+    rss = fds = 0
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                rss += int(f.read().split()[1]) * page_size
+            fds += len(os.listdir(f"/proc/{pid}/fd"))
+        except OSError:
+            pass  # a worker being restarted
+    return rss, fds
+
+
+class Soak:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.base = f"http://127.0.0.1:{args.port}"
+        self.latencies: Dict[str, List[float]] = {"create": [], "connect": [], "delete": []}
+        self.cycles = 0
+        self.errors: Dict[str, int] = {}
+        self.samples: List[dict] = []
+        self.cluster: Optional[LocalRay] = None
+        self.api: Optional[subprocess.Popen] = None
+        self.chrome: Optional[subprocess.Popen] = None
+        self.api_log = None
+        self.started = time.time()
+
+    # Processes
+
+    def start(self):
+        # Its own cluster, so a Ray the developer already runs is left alone
+        self.cluster = LocalRay(num_cpus=2, resources={"browser": self.args.concurrency * 2}).start()
+        self.chrome = subprocess.Popen([sys.executable, os.path.join(ROOT, "tests", "fake_cdp.py"), "--port", str(CHROME_PORT)])
+        env = dict(
+            os.environ, BROWSERSTATION_ADMIN_KEY=ADMIN_KEY, PYTHONPATH=ROOT,
+            RAY_ADDRESS=self.cluster.address, BROWSERSTATION_GCS_ADDRESS=self.cluster.address,
+        )
+        self.api_log = open(self.args.api_log, "w")
+        self.api = subprocess.Popen(
+            [sys.executable, "-m", "app.shard", "--host", "127.0.0.1", "--port", str(self.args.port),
+             "--workers", str(self.args.workers), "--log-level", "warning"],
+            cwd=ROOT, env=env, stdout=self.api_log, stderr=subprocess.STDOUT,
+        )
+
+    def stop(self):
+        for process in (self.api, self.chrome):
+            if process is not None and process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+                try:
+                    process.wait(30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        if self.api_log is not None:
+            self.api_log.close()
+        if self.cluster is not None:
+            self.cluster.stop()
+
+    async def wait_ready(self):
+        deadline = time.time() + 120
+        async with httpx.AsyncClient() as client:
+            while time.time() < deadline:
+                try:
+                    response = await client.get(f"{self.base}/browsers", timeout=5)
+                    if response.status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(1)
+        raise RuntimeError("API did not come up")
+
+    # Churn
+
+    def _error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    async def cycle(self, client: httpx.AsyncClient):
+        started = time.monotonic()
+        response = await client.post("/browsers", timeout=60)
+        response.raise_for_status()
+        browser_id = response.json()["browser_id"]
+        self.latencies["create"].append(time.monotonic() - started)
+        deleted = False
+        try:
+            (await client.get(f"/browsers/{browser_id}", params={"wait": 10}, timeout=20)).raise_for_status()
+            ending = random.choices(list(ENDINGS), weights=list(ENDINGS.values()))[0]
+            if ending != "no_connect":
+                connections = random.randint(1, 3)
+                results = await asyncio.gather(
+                    *(self.session(client, browser_id, ending) for _ in range(connections)),
+                    return_exceptions=True,
+                )
+                for result in results:
+                    # Deleting the browser closes the other connections to it
+                    if ending == "delete_first" and isinstance(result, websockets.exceptions.ConnectionClosed):
+                        continue
+                    if isinstance(result, Exception):
+                        self._error(f"session:{type(result).__name__}")
+                deleted = ending == "delete_first"
+        finally:
+            if not deleted:
+                started = time.monotonic()
+                response = await client.delete(f"/browsers/{browser_id}", timeout=30)
+                if response.status_code == 200:
+                    self.latencies["delete"].append(time.monotonic() - started)
+                else:
+                    self._error(f"delete:{response.status_code}")
+        self.cycles += 1
+
+    async def session(self, client: httpx.AsyncClient, browser_id: str, ending: str):
+        started = time.monotonic()
+        ws = await websockets.connect(f"ws://127.0.0.1:{self.args.port}/ws/browsers/{browser_id}/devtools/browser/x", open_timeout=30)
+        try:
+            await ws.send(json.dumps({"id": 0, "method": "Target.getTargets"}))
+            await asyncio.wait_for(ws.recv(), 30)
+            self.latencies["connect"].append(time.monotonic() - started)
+
+            for i in range(1, random.randint(1, 20)):
+                await ws.send(json.dumps({"id": i, "method": "Target.createTarget", "params": {"url": "about:blank"}}))
+                await asyncio.wait_for(ws.recv(), 30)
+
+            if ending == "abort":
+                ws.transport.abort()
+            elif ending == "in_flight":
+                for i in range(100, 100 + random.randint(1, 10)):
+                    await ws.send(json.dumps({"id": i, "method": "Target.getTargets"}))
+                ws.transport.abort()
+            elif ending == "delete_first":
+                # Every connection of the browser tries; all but the first get 404
+                response = await client.delete(f"/browsers/{browser_id}", timeout=30)
+                if response.status_code not in (200, 404):
+                    self._error(f"delete:{response.status_code}")
+                await asyncio.sleep(random.random())
+        finally:
+            await ws.close()
+
+    async def churn(self, client: httpx.AsyncClient, deadline: float):
+        while time.time() < deadline:
+            try:
+                await self.cycle(client)
+            except Exception as e:
+                self._error(f"cycle:{type(e).__name__}")
+                await asyncio.sleep(1)
+
+    # Sampling
+
+    async def shard_stats(self) -> tuple:
+        tasks = relays = 0
+        for shard in range(self.args.workers):
+            # The API closes ?shard= connections, so each request is routed afresh
+            async with httpx.AsyncClient(base_url=self.base, headers={"X-Admin-Key": ADMIN_KEY}) as client:
+                dump = (await client.get("/admin/tasks", params={"shard": shard}, timeout=30)).json()
+            tasks += len(dump["tasks"])
+            relays += len(dump["relays"])
+        return tasks, relays
+
+    async def sample(self) -> dict:
+        rss, fds = rss_and_fds(process_tree(self.api.pid))
+        tasks, relays = await self.shard_stats()
+        async with httpx.AsyncClient() as client:
+            chrome = (await client.get(f"http://127.0.0.1:{CHROME_PORT}/stats", timeout=10)).json()
+        latencies, self.latencies = self.latencies, {key: [] for key in self.latencies}
+        sample = {
+            "t": round(time.time() - self.started, 1),
+            "cycles": self.cycles,
+            "errors": sum(self.errors.values()),
+            "rss_mib": round(rss / 2**20, 1),
+            "fds": fds,
+            "tasks": tasks,
+            "relays": relays,
+            "chrome_connections": chrome["connections"],
+        }
+        for key, values in latencies.items():
+            sample[f"{key}_p50"] = percentile(values, 0.5)
+            sample[f"{key}_p99"] = percentile(values, 0.99)
+        self.samples.append(sample)
+        print(" ".join(f"{k}={v:.3f}" if isinstance(v, float) and k.endswith(("p50", "p99")) else f"{k}={v}" for k, v in sample.items()), flush=True)
+        return sample
+
+    async def sampler(self, deadline: float):
+        while time.time() < deadline:
+            await asyncio.sleep(self.args.sample_interval)
+            try:
+                await self.sample()
+            except Exception as e:
+                print(f"sample failed: {e}", flush=True)
+
+    # Verdict
+
+    def trends(self) -> List[str]:
+        """Metrics whose growth over the post-warmup window exceeds their tolerance"""
+        window = [s for s in self.samples if s["t"] >= self.args.warmup]
+        if len(window) < 10:
+            return [f"only {len(window)} samples after warmup, run longer"]
+        span = window[-1]["t"] - window[0]["t"]
+        failures = []
+        baseline_rss = statistics.median(s["rss_mib"] for s in window[:5])
+        tolerances = {
+            "rss_mib": max(self.args.rss_tolerance, 0.1 * baseline_rss),
+            "fds": self.args.fd_tolerance,
+            "tasks": self.args.task_tolerance,
+        }
+        for key, tolerance in tolerances.items():
+            growth = theil_sen([(s["t"], s[key]) for s in window]) * span
+            print(f"trend {key}: {growth:+.1f} over {span:.0f}s (tolerance {tolerance:.1f})")
+            if growth > tolerance:
+                failures.append(f"{key} grew {growth:+.1f} over {span:.0f}s")
+        for key in ("create_p50", "connect_p50", "delete_p50"):
+            points = [(s["t"], s[key]) for s in window if s[key] is not None]
+            if len(points) < 10:
+                continue
+            first = statistics.median(v for _, v in points[:5])
+            growth = theil_sen(points) * span
+            print(f"trend {key}: {growth:+.3f}s over {span:.0f}s (from {first:.3f}s)")
+            if growth > self.args.latency_tolerance * first:
+                failures.append(f"{key} grew {growth:+.3f}s from {first:.3f}s")
+        return failures
+
+    def settled(self, idle: dict, final: dict) -> List[str]:
+        """Resources that didn't return to the idle baseline once the churn stopped"""
+        failures = []
+        if final["relays"]:
+            failures.append(f"{final['relays']} relays still open")
+        if final["chrome_connections"] > idle["chrome_connections"]:
+            failures.append(f"{final['chrome_connections'] - idle['chrome_connections']} upstream connections left open")
+        if final["tasks"] > idle["tasks"] + self.args.task_tolerance:
+            failures.append(f"tasks went from {idle['tasks']} to {final['tasks']}")
+        if final["fds"] > idle["fds"] + self.args.fd_tolerance:
+            failures.append(f"file descriptors went from {idle['fds']} to {final['fds']}")
+        return failures
+
+    async def run(self) -> List[str]:
+        await self.wait_ready()
+        # Let the background loops reach steady state before the baseline
+        await asyncio.sleep(self.args.sample_interval)
+        idle = await self.sample()
+
+        deadline = time.time() + self.args.duration
+        limits = httpx.Limits(max_connections=self.args.concurrency * 4)
+        async with httpx.AsyncClient(base_url=self.base, limits=limits) as client:
+            await asyncio.gather(
+                self.sampler(deadline),
+                *(self.churn(client, deadline) for _ in range(self.args.concurrency)),
+            )
+
+        # Relays close and probes notice deletes within a few intervals
+        await asyncio.sleep(max(15, self.args.sample_interval))
+        final = await self.sample()
+        print(f"cycles={self.cycles} errors={self.errors}")
+        return self.trends() + self.settled(idle, final)
+
+    def write_csv(self, path: str):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.samples[0]))
+            writer.writeheader()
+            writer.writerows(self.samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=3600, help="seconds of churn")
+    parser.add_argument("--warmup", type=float, default=120, help="seconds excluded from trends")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent create/connect/delete loops")
+    parser.add_argument("--workers", type=int, default=2, help="API worker processes")
+    parser.add_argument("--port", type=int, default=8060)
+    parser.add_argument("--sample-interval", type=float, default=10)
+    parser.add_argument("--rss-tolerance", type=float, default=32, help="MiB of RSS growth allowed")
+    parser.add_argument("--fd-tolerance", type=float, default=16)
+    parser.add_argument("--task-tolerance", type=float, default=16)
+    parser.add_argument("--latency-tolerance", type=float, default=1.0, help="p50 growth allowed, relative to its start")
+    parser.add_argument("--csv", help="write every sample to this file")
+    parser.add_argument("--api-log", default="soak-api.log", help="file the API's output goes to")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    soak = Soak(args)
+    soak.start()
+    try:
+        failures = asyncio.run(soak.run())
+    finally:
+        soak.stop()
+        if args.csv and soak.samples:
+            soak.write_csv(args.csv)
+
+    if failures:
+        for failure in failures:
+            print(f"✗ {failure}")
+        sys.exit(1)
+    print("✓ No resource growth across the soak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Tests for the lazy CDP envelope parser.
+
+Run with: python -m pytest tests/test_cdp.py
+"""
+
+import orjson
+import pytest
+
+from app.cdp import parse_envelope, encode, _skip_value
+
+
+def test_response_fields():
+    envelope = parse_envelope('{"id": 7, "result": {"data": "aGk=", "nested": [1, {"a": "}"}]}, "sessionId": "S1"}')
+    assert envelope.id == 7
+    assert envelope.method is None
+    assert envelope.session_id == "S1"
+    assert envelope.is_response
+    assert envelope.result == {"data": "aGk=", "nested": [1, {"a": "}"}]}
+    assert envelope.raw("result") == '{"data": "aGk=", "nested": [1, {"a": "}"}]}'
+
+
+def test_event_fields():
+    envelope = parse_envelope('{"method":"Page.frameNavigated","params":{"frame":{"id":"F"}}}')
+    assert envelope.method == "Page.frameNavigated"
+    assert envelope.id is None
+    assert not envelope.is_response
+    assert envelope.params == {"frame": {"id": "F"}}
+    assert envelope.raw("result") is None
+
+
+def test_bodies_are_decoded_on_access_only():
+    # A malformed body doesn't matter until it is read
+    envelope = parse_envelope('{"id": 1, "result": {"x": 01}}')
+    assert envelope.id == 1
+    with pytest.raises(orjson.JSONDecodeError):
+        envelope.result
+
+
+def test_escaped_quotes_and_brackets_in_strings():
+    message = encode({"id": 3, "result": {"value": 'say "hi" \\ {[}]'}, "sessionId": "S"})
+    envelope = parse_envelope(message)
+    assert envelope.result == {"value": 'say "hi" \\ {[}]'}
+    assert envelope.session_id == "S"
+
+
+def test_bytes_and_empty_objects():
+    assert parse_envelope(b'{"id": 2, "result": {}}').result == {}
+    assert parse_envelope("{}").id is None
+
+
+@pytest.mark.parametrize("message", ["[1, 2]", '"text"', '{"id": 1', '{"id" 1}', "", '{"a": "open}'])
+def test_not_an_object(message):
+    assert parse_envelope(message) is None
+
+
+@pytest.mark.parametrize("value, rest", [
+    ('"a\\"b"', ", x"),
+    ('{"k": [1, "]"]}', "}"),
+    ("[[], {}]", "]"),
+    ("-1.5e3", " }"),
+    ("true", ","),
+    ("null", "]"),
+])
+def test_skip_value(value, rest):
+    assert _skip_value(value + rest, 0) == len(value)
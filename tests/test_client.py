@@ -0,0 +1,292 @@
+"""
+Tests for the async client against an in-process httpx.MockTransport.
+
+Run with: python -m pytest tests/test_client.py
+"""
+
+import asyncio
+import uuid
+
+import httpx
+import pytest
+
+from browserstation import AsyncBrowserStation, BrowserStationError
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def client(handler, **options) -> AsyncBrowserStation:
+    # No real waiting between retries
+    options = {"backoff": 0, "max_backoff": 0, **options}
+    return AsyncBrowserStation("http://test", transport=httpx.MockTransport(handler), **options)
+
+
+def health():
+    return httpx.Response(200, json={
+        "status": "Healthy", "ray_status": True, "ray": "connected for 1s",
+        "browsers": {}, "cluster": {}, "available": {},
+    })
+
+
+class FakeAPI:
+    """Just enough of the browser routes to drive sessions"""
+
+    def __init__(self, ready_after: int = 0, fail_create: int = 0):
+        self.browsers = {}
+        self.deleted = []
+        self.polls = 0
+        self.ready_after = ready_after
+        self.fail_create = fail_create
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+        if request.method == "POST" and path == "/browsers":
+            if self.fail_create:
+                self.fail_create -= 1
+                return httpx.Response(429, json={"detail": "Quota exceeded"})
+            browser_id = str(uuid.uuid4())
+            self.browsers[browser_id] = True
+            return httpx.Response(200, json={"browser_id": browser_id, "proxy_url": f"/ws/browsers/{browser_id}/devtools/browser"})
+        browser_id = path.rsplit("/", 1)[-1]
+        if browser_id not in self.browsers:
+            return httpx.Response(404, json={"detail": "Browser not found"})
+        if request.method == "GET":
+            self.polls += 1
+            ready = self.polls > self.ready_after
+            return httpx.Response(200, json={
+                "browser_id": browser_id,
+                "pod_ip": "10.0.0.7",
+                "chrome_ready": ready,
+                "websocket_url": f"/ws/browsers/{browser_id}/devtools/browser" if ready else None,
+            })
+        if request.method == "DELETE":
+            del self.browsers[browser_id]
+            self.deleted.append(browser_id)
+            return httpx.Response(200, json={"browser_id": browser_id, "status": "deleted"})
+        return httpx.Response(405)
+
+
+def test_retries_429_and_503_until_success():
+    statuses = [429, 503, 200]
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        status = statuses[len(calls) - 1]
+        return health() if status == 200 else httpx.Response(status, json={"detail": "busy"})
+
+    async def main():
+        async with client(handler) as api:
+            return await api.health()
+
+    assert run(main()).status == "Healthy"
+    assert len(calls) == 3
+
+
+def test_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503, json={"detail": "Ray unavailable"})
+
+    async def main():
+        async with client(handler, max_retries=2) as api:
+            await api.health()
+
+    with pytest.raises(BrowserStationError) as e:
+        run(main())
+    assert e.value.status_code == 503
+    assert e.value.detail == "Ray unavailable"
+    assert len(calls) == 3
+
+
+def test_honors_retry_after(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr("browserstation.client.asyncio.sleep", sleep)
+    responses = [httpx.Response(429, headers={"Retry-After": "3"}), health()]
+
+    async def main():
+        async with client(lambda request: responses.pop(0)) as api:
+            await api.health()
+
+    run(main())
+    assert delays == [3.0]
+
+
+def test_retries_connect_errors_but_not_other_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            raise httpx.ConnectError("refused", request=request)
+        return health()
+
+    async def main():
+        async with client(handler) as api:
+            await api.health()
+
+    run(main())
+    assert len(calls) == 3
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    calls.clear()
+    with pytest.raises(httpx.ReadTimeout):
+        run(main())
+    # The request may have reached the server, so it isn't sent again
+    assert len(calls) == 1
+
+
+def test_connect_errors_raise_after_max_retries():
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    async def main():
+        async with client(handler, max_retries=1) as api:
+            await api.health()
+
+    with pytest.raises(httpx.ConnectError):
+        run(main())
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(401, json={"detail": "Invalid or missing API key"})
+
+    async def main():
+        async with client(handler) as api:
+            await api.create_browser()
+
+    with pytest.raises(BrowserStationError) as e:
+        run(main())
+    assert e.value.status_code == 401
+    assert len(calls) == 1
+
+
+def test_sends_api_key():
+    api = FakeAPI()
+
+    async def main():
+        async with client(api, api_key="secret") as station:
+            await station.create_browser()
+
+    run(main())
+    assert api.requests[0].headers["X-API-Key"] == "secret"
+
+
+def test_session_waits_until_ready_and_deletes_on_exit():
+    api = FakeAPI(ready_after=2)
+
+    async def main():
+        async with client(api) as station:
+            async with station.session() as session:
+                assert session.info.chrome_ready
+                assert session.ws_url == f"ws://test/ws/browsers/{session.browser_id}/devtools/browser"
+                return session.browser_id
+
+    browser_id = run(main())
+    assert api.polls == 3
+    assert api.deleted == [browser_id]
+    assert api.browsers == {}
+
+
+def test_session_deletes_on_error():
+    api = FakeAPI()
+
+    async def main():
+        async with client(api) as station:
+            async with station.session():
+                raise RuntimeError("task failed")
+
+    with pytest.raises(RuntimeError):
+        run(main())
+    assert len(api.deleted) == 1
+    assert api.browsers == {}
+
+
+def test_session_deletes_when_never_ready():
+    api = FakeAPI(ready_after=10 ** 6)
+
+    async def main():
+        async with client(api) as station:
+            async with station.session(ready_timeout=0):
+                pass
+
+    with pytest.raises(TimeoutError):
+        run(main())
+    assert len(api.deleted) == 1
+
+
+def test_session_retries_create_on_quota():
+    api = FakeAPI(fail_create=2)
+
+    async def main():
+        async with client(api) as station:
+            async with station.session():
+                pass
+
+    run(main())
+    assert len(api.deleted) == 1
+
+
+def test_delete_missing_browser():
+    api = FakeAPI()
+
+    async def main():
+        async with client(api) as station:
+            assert await station.delete_browser(str(uuid.uuid4())) is None
+            with pytest.raises(BrowserStationError):
+                await station.delete_browser(str(uuid.uuid4()), missing_ok=False)
+
+    run(main())
+
+
+def test_sessions_delete_all_on_exit():
+    api = FakeAPI()
+
+    async def main():
+        async with client(api) as station:
+            async with station.sessions(4) as sessions:
+                assert len({s.browser_id for s in sessions}) == 4
+                assert all(s.info.chrome_ready for s in sessions)
+
+    run(main())
+    assert len(api.deleted) == 4
+    assert api.browsers == {}
+
+
+def test_create_browsers_cleans_up_on_partial_failure():
+    api = FakeAPI()
+    created = []
+
+    def handler(request):
+        if request.method == "POST" and len(created) >= 2:
+            return httpx.Response(400, json={"detail": "bad options"})
+        response = api(request)
+        if request.method == "POST":
+            created.append(response)
+        return response
+
+    async def main():
+        async with client(handler) as station:
+            await station.create_browsers(4, concurrency=1)
+
+    with pytest.raises(BrowserStationError):
+        run(main())
+    assert len(api.deleted) == 2
+    assert api.browsers == {}
@@ -0,0 +1,104 @@
+"""
+Tests for label selectors and the indexed browser registry.
+
+Run with: python -m pytest tests/test_registry.py
+"""
+
+import time
+
+import pytest
+
+from app.registry import ALIVE, PENDING, BrowserRegistry, Requirement, parse_selector
+
+
+def test_parse_selector_terms():
+    assert parse_selector("team=search, env!=prod, tier in (a, b), zone notin (x), gpu, !spot") == [
+        Requirement("team", "in", ("search",)),
+        Requirement("env", "notin", ("prod",)),
+        Requirement("tier", "in", ("a", "b")),
+        Requirement("zone", "notin", ("x",)),
+        Requirement("gpu", "exists"),
+        Requirement("spot", "!exists"),
+    ]
+    assert parse_selector("team==search") == [Requirement("team", "in", ("search",))]
+    # An empty value is allowed, as in Kubernetes
+    assert parse_selector("team=") == [Requirement("team", "in", ("",))]
+    assert parse_selector("") == []
+
+
+@pytest.mark.parametrize("selector", ["=search", "a b", "tier in a", "tier in (a", "!"])
+def test_parse_selector_rejects(selector):
+    with pytest.raises(ValueError):
+        parse_selector(selector)
+
+
+def registry():
+    now = time.time()
+    registry = BrowserRegistry()
+    registry.add("a", {"team": "search", "env": "prod"}, ALIVE, created_at=now - 300)
+    registry.add("b", {"team": "search"}, PENDING, created_at=now - 200)
+    registry.add("c", {"team": "ads", "env": "dev"}, ALIVE, created_at=now - 100, tenant="acme")
+    registry.add("d", {}, ALIVE, created_at=now - 10)
+    return registry
+
+
+def ids(entries):
+    return [entry.browser_id for entry in entries]
+
+
+def test_query_by_labels_state_and_tenant():
+    r = registry()
+    assert ids(r.query(parse_selector("team=search"))) == ["a", "b"]
+    assert ids(r.query(parse_selector("team in (search, ads), env"))) == ["a", "c"]
+    assert ids(r.query(parse_selector("!env"))) == ["b", "d"]
+    assert ids(r.query(parse_selector("env!=prod"))) == ["b", "c", "d"]
+    assert ids(r.query(state=PENDING)) == ["b"]
+    assert ids(r.query(tenant="acme")) == ["c"]
+    assert ids(r.query(parse_selector("team=search"), tenant="acme")) == []
+    assert r.count("default") == 3
+
+
+def test_query_by_age():
+    r = registry()
+    assert ids(r.query()) == ["a", "b", "c", "d"]
+    assert ids(r.query(min_age=150)) == ["a", "b"]
+    assert ids(r.query(max_age=150)) == ["c", "d"]
+    assert ids(r.query(min_age=50, max_age=250)) == ["b", "c"]
+    # Age bounds also apply to candidates found through an index
+    assert ids(r.query(parse_selector("team=search"), min_age=250)) == ["a"]
+
+
+def test_remove_and_set_alive_update_indexes():
+    r = registry()
+    r.set_alive("b", "node-1")
+    assert ids(r.query(state=ALIVE)) == ["a", "b", "c", "d"]
+    assert r.entries["b"].node_id == "node-1"
+    r.remove("a")
+    r.remove("missing")
+    assert ids(r.query(parse_selector("env"))) == ["c"]
+    assert ids(r.query(min_age=150)) == ["b"]
+    assert len(r) == 3
+    # Re-adding replaces the old labels instead of merging them
+    r.add("c", {"team": "search"}, ALIVE, tenant="acme")
+    assert ids(r.query(parse_selector("team=ads"))) == []
+    assert ids(r.query(parse_selector("team=search"))) == ["b", "c"]
+
+
+def test_sync_adds_and_prunes(monkeypatch):
+    monkeypatch.setattr("app.registry.PRUNE_GRACE", 0)
+    r = BrowserRegistry()
+    r.add("gone", {}, ALIVE, node_id="n1")
+    r.add("unread", {}, ALIVE, node_id="n2")
+    r.add("pending", {}, PENDING)
+    r.entries["gone"].alive_since = r.entries["unread"].alive_since = time.time() - 1
+    r.sync([
+        {"node_id": "n1", "browsers": {
+            "pending": {},
+            "restored": {"labels": {"team": "search"}, "namespace": "browserstation-acme", "registered_at": 5.0},
+            "pool-1": {},
+        }},
+    ], unread={"n2"})
+    assert sorted(r.entries) == ["pending", "restored", "unread"]
+    assert r.entries["pending"].state == ALIVE and r.entries["pending"].node_id == "n1"
+    assert r.entries["restored"].tenant == "acme"
+    assert ids(r.query(parse_selector("team=search"))) == ["restored"]
@@ -0,0 +1,115 @@
+"""
+Tests for the proxy's per-connection CDP response cache.
+
+Run with: python -m pytest tests/test_relaycache.py
+"""
+
+import json
+
+from app import relaycache
+from app.relaycache import RelayCache
+
+METHODS = frozenset({"DOM.getDocument", "Runtime.evaluate"})
+
+
+def command(id, method, params=None, session_id=None):
+    message = {"id": id, "method": method, "params": params or {}}
+    if session_id:
+        message["sessionId"] = session_id
+    return json.dumps(message)
+
+
+def respond(cache, id, result, session_id=None):
+    message = {"id": id, "result": result}
+    if session_id:
+        message["sessionId"] = session_id
+    cache.response(json.dumps(message))
+
+
+def test_repeat_is_answered_with_the_clients_id():
+    cache = RelayCache(METHODS)
+    assert cache.request(command(1, "DOM.getDocument", {"depth": 1}, "S")) is None
+    respond(cache, 1, {"root": {"nodeId": 1}}, "S")
+
+    reply = cache.request(command(9, "DOM.getDocument", {"depth": 1}, "S"))
+    assert json.loads(reply) == {"id": 9, "result": {"root": {"nodeId": 1}}, "sessionId": "S"}
+    # Other params or another session miss
+    assert cache.request(command(10, "DOM.getDocument", {"depth": 2}, "S")) is None
+    assert cache.request(command(11, "DOM.getDocument", {"depth": 1}, "T")) is None
+    assert cache.stats() == {"hits": 1, "misses": 3, "entries": 1}
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(relaycache.time, "monotonic", lambda: now[0])
+    cache = RelayCache(METHODS, ttl=5)
+    cache.request(command(1, "DOM.getDocument"))
+    respond(cache, 1, {"root": {}})
+    now[0] = 104.0
+    assert cache.request(command(2, "DOM.getDocument")) is not None
+    now[0] = 105.0
+    assert cache.request(command(3, "DOM.getDocument")) is None
+
+
+def test_events_and_other_commands_invalidate():
+    cache = RelayCache(METHODS)
+    cache.request(command(1, "DOM.getDocument"))
+    respond(cache, 1, {"root": {}})
+    cache.response(json.dumps({"method": "Page.frameNavigated", "params": {}}))
+    assert cache.request(command(2, "DOM.getDocument")) is None
+    respond(cache, 2, {"root": {}})
+
+    # Events that don't change the page keep entries
+    cache.response(json.dumps({"method": "Network.dataReceived", "params": {}}))
+    assert cache.request(command(3, "DOM.getDocument")) is not None
+
+    cache.request(command(4, "Input.dispatchMouseEvent", {"type": "mousePressed"}))
+    assert cache.request(command(5, "DOM.getDocument")) is None
+
+
+def test_response_sent_before_an_invalidation_is_not_stored():
+    cache = RelayCache(METHODS)
+    cache.request(command(1, "DOM.getDocument"))
+    cache.response(json.dumps({"method": "DOM.documentUpdated", "params": {}}))
+    respond(cache, 1, {"root": {"stale": True}})
+    assert cache.request(command(2, "DOM.getDocument")) is None
+
+
+def test_errors_are_not_stored():
+    cache = RelayCache(METHODS)
+    cache.request(command(1, "DOM.getDocument"))
+    cache.response(json.dumps({"id": 1, "error": {"code": -32000, "message": "No node"}}))
+    assert cache.request(command(2, "DOM.getDocument")) is None
+
+
+def test_evaluate_needs_throw_on_side_effect():
+    cache = RelayCache(METHODS)
+    cache.request(command(1, "Runtime.evaluate", {"expression": "x++"}))
+    respond(cache, 1, {"result": {"type": "number", "value": 1}})
+    assert cache.request(command(2, "Runtime.evaluate", {"expression": "x++"})) is None
+    assert cache.stats()["entries"] == 0
+
+    params = {"expression": "document.title", "throwOnSideEffect": True}
+    cache.request(command(3, "Runtime.evaluate", params))
+    respond(cache, 3, {"result": {"type": "string", "value": "t"}})
+    assert cache.request(command(4, "Runtime.evaluate", params)) is not None
+
+
+def test_raw_result_is_spliced_unchanged():
+    cache = RelayCache(METHODS)
+    cache.request(command(1, "DOM.getDocument"))
+    raw = '{"root": {"nodeName": "say \\"}\\" ", "children": [ ]}}'
+    cache.response('{"id": 1, "result": ' + raw + '}')
+    reply = cache.request(command(2, "DOM.getDocument"))
+    assert reply == '{"id":2,"result":' + raw + '}'
+    assert json.loads(reply)["result"]["root"]["nodeName"] == 'say "}" '
+
+
+def test_size_bound_drops_least_recently_used():
+    cache = RelayCache(METHODS, size=2)
+    for id, depth in enumerate([1, 2, 3], 1):
+        cache.request(command(id, "DOM.getDocument", {"depth": depth}))
+        respond(cache, id, {"depth": depth})
+    assert cache.stats()["entries"] == 2
+    assert cache.request(command(10, "DOM.getDocument", {"depth": 1})) is None
+    assert cache.request(command(11, "DOM.getDocument", {"depth": 3})) is not None
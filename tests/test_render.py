@@ -0,0 +1,91 @@
+"""
+Tests for the render cache, its keys and the merging of identical renders.
+
+Run with: python -m pytest tests/test_render.py
+"""
+
+import asyncio
+
+from app import render
+from app.models import RenderRequest
+from app.render import RenderCache, Renderer, render_key
+
+
+def test_key_covers_output_options_only():
+    request = RenderRequest(url="https://example.com")
+    assert render_key(request, "default") == render_key(RenderRequest(url="https://example.com", max_age=0, timeout=90), "default")
+    assert render_key(request, "default") != render_key(RenderRequest(url="https://example.com", full_page=True), "default")
+    assert render_key(request, "default") != render_key(RenderRequest(url="https://example.org"), "default")
+    # Tenants never share renders
+    assert render_key(request, "default") != render_key(request, "acme")
+
+
+def test_cache_max_age(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(render.time, "time", lambda: now[0])
+    cache = RenderCache()
+    cache.put("k", b"png")
+    now[0] = 1030.0
+    assert cache.get("k", 60) == b"png"
+    assert cache.get("k", 10) is None
+    assert cache.get("missing", 60) is None
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = RenderCache(max_size=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get("a", 60)  # a is now the most recently used
+    cache.put("c", b"1234")
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.size == 8
+    # Replacing an entry frees its old size, oversized bodies aren't kept
+    cache.put("a", b"12")
+    assert cache.size == 6
+    cache.put("big", b"x" * 11)
+    assert "big" not in cache.entries and cache.size == 6
+
+
+class FakeActor:
+    def __init__(self):
+        self.renders = 0
+        self.render = self
+
+    def remote(self, url, options):
+        self.renders += 1
+
+        async def run():
+            await asyncio.sleep(0.01)
+            return f"{url} {options['format']}".encode()
+        return run()
+
+
+class FakePool:
+    def __init__(self):
+        self.actor = FakeActor()
+        self.leases = []
+
+    async def acquire(self, owner):
+        self.leases.append(owner)
+        return "pool-1", self.actor
+
+    async def release(self, member, owner, healthy=True):
+        pass
+
+
+def test_identical_renders_are_merged_then_cached():
+    pool = FakePool()
+    renderer = Renderer(pool)
+    request = RenderRequest(url="https://example.com")
+
+    async def main():
+        first = await asyncio.gather(*(renderer.render(request, "default") for _ in range(3)))
+        return first, await renderer.render(request, "default"), await renderer.render(request, "acme")
+
+    first, cached, other_tenant = asyncio.run(main())
+    assert [how for _, how in first] == ["miss", "merged", "merged"]
+    assert cached == (b"https://example.com png", "hit")
+    assert other_tenant[1] == "miss"
+    assert pool.actor.renders == 2
+    assert pool.leases == ["default", "acme"]
+    assert renderer.inflight == {}
@@ -60,7 +60,7 @@ def main():
         ws_url = f"ws://localhost:8050{ws_path}"
         print(f"Connecting to: {ws_url}")
         
-        browser = p.chromium.connect_over_cdp(ws_url)
+        browser = p.chromium.connect_over_cdp(ws_url, headers=headers)
         page = browser.new_page()
         
         # Navigate to a site